@@ -1,4 +1,9 @@
 from django.contrib import admin
+from django.db import transaction
+from django.utils import timezone
+from .catalog_cache import incrementar_geracao_apos_commit
+from .counters import recalcular_contadores
+from . import read_model
 from .models import (
     Cliente, PessoaFisica, PessoaJuridica,
     Categoria, Produto, ImagemProduto
@@ -107,22 +112,40 @@ class ProdutoAdmin(admin.ModelAdmin):
     actions = ['ativar_produtos', 'desativar_produtos', 'marcar_destaque', 'desmarcar_destaque']
 
     def ativar_produtos(self, request, queryset):
-        updated = queryset.update(ativo=True)
+        updated = self._atualizar_ativo(queryset, True)
         self.message_user(request, f'{updated} produto(s) ativado(s) com sucesso.')
     ativar_produtos.short_description = "Ativar produtos selecionados"
 
     def desativar_produtos(self, request, queryset):
-        updated = queryset.update(ativo=False)
+        updated = self._atualizar_ativo(queryset, False)
         self.message_user(request, f'{updated} produto(s) desativado(s) com sucesso.')
     desativar_produtos.short_description = "Desativar produtos selecionados"
 
+    def _atualizar_ativo(self, queryset, ativo):
+        # update() não dispara signals: recalcula os contadores, o catálogo e invalida o cache
+        with transaction.atomic():
+            produtos = list(queryset.values_list('id', 'categoria_id'))
+            updated = queryset.update(ativo=ativo, atualizado_em=timezone.now())
+            recalcular_contadores({categoria_id for _, categoria_id in produtos})
+            read_model.sincronizar(produto_id for produto_id, _ in produtos)
+            incrementar_geracao_apos_commit()
+        return updated
+
+    def _atualizar_destaque(self, queryset, em_destaque):
+        with transaction.atomic():
+            ids = list(queryset.values_list('id', flat=True))
+            updated = queryset.update(em_destaque=em_destaque, atualizado_em=timezone.now())
+            read_model.sincronizar(ids)
+            incrementar_geracao_apos_commit()
+        return updated
+
     def marcar_destaque(self, request, queryset):
-        updated = queryset.update(em_destaque=True)
+        updated = self._atualizar_destaque(queryset, True)
         self.message_user(request, f'{updated} produto(s) marcado(s) como destaque.')
     marcar_destaque.short_description = "Marcar como destaque"
 
     def desmarcar_destaque(self, request, queryset):
-        updated = queryset.update(em_destaque=False)
+        updated = self._atualizar_destaque(queryset, False)
         self.message_user(request, f'{updated} produto(s) desmarcado(s) como destaque.')
     desmarcar_destaque.short_description = "Desmarcar destaque"
 
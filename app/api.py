@@ -0,0 +1,194 @@
+"""
+API JSON somente leitura do catálogo.
+
+    GET /api/produtos/?categoria=<id>&busca=<texto>&ordem=menor_preco&fields=id,nome,preco_final&limite=100&cursor=<cursor>
+    GET /api/categorias/
+    GET /api/autocompletar/?q=<prefixo>&limite=8
+
+Os produtos vêm da tabela plana ``ProdutoCatalogo`` (sem joins) e
+``fields`` escolhe os campos devolvidos: apenas as colunas necessárias
+são selecionadas. A resposta é serializada em streaming a partir de
+``.iterator()``, então mesmo páginas grandes não ficam inteiras em memória.
+A paginação é por cursor (``proximo_cursor`` na resposta). Com ``busca``
+os resultados vêm por relevância.
+"""
+
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.views.decorators.http import require_GET
+
+from . import autocomplete, catalog_cache, facets, search_cache
+from .models import Categoria, ProdutoCatalogo
+from .pagination import PaginadorKeyset, CursorInvalido
+from .search import ordenar_por_relevancia
+from .views import ORDENACAO_BUSCA, ORDENACAO_CATALOGO, ORDENACOES
+
+LIMITE_PADRAO = 100
+LIMITE_MAXIMO = 10000
+LINHAS_POR_BLOCO = 200
+
+
+# campo da API -> (colunas de ProdutoCatalogo selecionadas, extrator)
+CAMPOS_PRODUTO = {
+    'id': (('id',), lambda l: l['id']),
+    'nome': (('nome',), lambda l: l['nome']),
+    'resumo': (('resumo',), lambda l: l['resumo']),
+    'categoria': (('categoria_id',), lambda l: l['categoria_id']),
+    'categoria_nome': (('categoria_nome',), lambda l: l['categoria_nome']),
+    'preco': (('preco',), lambda l: l['preco']),
+    'preco_promocional': (('preco_promocional',), lambda l: l['preco_promocional']),
+    'preco_final': (('preco_efetivo',), lambda l: l['preco_efetivo']),
+    'desconto_pct': (('desconto_pct',), lambda l: l['desconto_pct']),
+    'estoque': (('estoque',), lambda l: l['estoque']),
+    'em_estoque': (('situacao_estoque',), lambda l: l['situacao_estoque'] != 'esgotado'),
+    'situacao_estoque': (('situacao_estoque',), lambda l: l['situacao_estoque']),
+    'em_destaque': (('em_destaque',), lambda l: l['em_destaque']),
+    'forma_pagamento': (('forma_pagamento',), lambda l: l['forma_pagamento']),
+    'foto': (('foto_url',), lambda l: l['foto_url'] or None),
+    'url': (('id',), lambda l: reverse('detalhe_produto', args=[l['id']])),
+    'criado_em': (('criado_em',), lambda l: l['criado_em']),
+    'atualizado_em': (('atualizado_em',), lambda l: l['atualizado_em']),
+}
+
+CAMPOS_PADRAO = ('id', 'nome', 'categoria', 'categoria_nome', 'preco', 'preco_final', 'em_estoque', 'url')
+
+
+def _erro(mensagem, status=400):
+    return JsonResponse({'error': mensagem, 'status': status}, status=status)
+
+
+def _campos_solicitados(parametro):
+    """Lista de campos pedidos em ``fields`` ou ValueError se algum não existir"""
+    if not parametro:
+        return list(CAMPOS_PADRAO)
+    campos = [c.strip() for c in parametro.split(',') if c.strip()]
+    desconhecidos = [c for c in campos if c not in CAMPOS_PRODUTO]
+    if desconhecidos:
+        raise ValueError(f"Campo(s) desconhecido(s): {', '.join(desconhecidos)}")
+    return list(dict.fromkeys(campos))
+
+
+def _serializar(linhas, campos, limite, paginador):
+    """Gera o JSON da página em blocos, sem materializar as linhas"""
+    extratores = [(nome, CAMPOS_PRODUTO[nome][1]) for nome in campos]
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+
+    yield '{"resultados": ['
+    bloco = []
+    ultima = None
+    proximo_cursor = None
+    for posicao, linha in enumerate(linhas):
+        if posicao == limite:
+            # Linha extra: só indica que existe próxima página
+            proximo_cursor = paginador.codificar(ultima)
+            break
+        objeto = {nome: extrair(linha) for nome, extrair in extratores}
+        bloco.append((',' if posicao else '') + encoder.encode(objeto))
+        ultima = linha
+        if len(bloco) >= LINHAS_POR_BLOCO:
+            yield ''.join(bloco)
+            bloco = []
+    if bloco:
+        yield ''.join(bloco)
+    yield '], "proximo_cursor": ' + json.dumps(proximo_cursor) + '}'
+
+
+@require_GET
+def api_produtos(request):
+    """
+    Produtos ativos em JSON, com os mesmos filtros do catálogo.
+
+    Parâmetros:
+        - categoria (ID)
+        - busca (texto)
+        - preco, pagamento, estoque, promocao, destaque (facetas)
+        - ordem (menor_preco, maior_preco, maior_desconto)
+        - fields (lista separada por vírgula)
+        - limite (padrão 100, máximo 10000)
+        - cursor (paginação)
+    """
+    try:
+        campos = _campos_solicitados(request.GET.get('fields', ''))
+    except ValueError as e:
+        return _erro(str(e))
+
+    try:
+        limite = int(request.GET.get('limite', LIMITE_PADRAO))
+    except ValueError:
+        return _erro('Limite deve ser um número inteiro.')
+    if not 1 <= limite <= LIMITE_MAXIMO:
+        return _erro(f'Limite deve estar entre 1 e {LIMITE_MAXIMO}.')
+
+    produtos = ProdutoCatalogo.visiveis()
+
+    categoria_id = request.GET.get('categoria')
+    if categoria_id:
+        if not categoria_id.isdigit():
+            return _erro('Categoria inválida.')
+        produtos = produtos.filter(categoria_id=categoria_id)
+
+    busca = request.GET.get('busca', '').strip()
+    ordenacao = ORDENACAO_CATALOGO
+    if busca:
+        produtos, _ = search_cache.filtrar(produtos, busca, int(categoria_id) if categoria_id else None)
+
+    produtos = facets.aplicar_facetas(produtos, facets.facetas_selecionadas(request.GET))
+    ordem = request.GET.get('ordem')
+    if ordem:
+        if ordem not in ORDENACOES:
+            return _erro(f"Ordem inválida. Use: {', '.join(ORDENACOES)}.")
+        ordenacao = ORDENACOES[ordem][1]
+    elif busca:
+        produtos = ordenar_por_relevancia(produtos, busca)
+        ordenacao = ORDENACAO_BUSCA
+
+    # Colunas dos campos pedidos + as da ordenação (necessárias para o cursor)
+    colunas = {coluna for nome in campos for coluna in CAMPOS_PRODUTO[nome][0]}
+    colunas.update(campo.lstrip('-') for campo in ordenacao)
+
+    paginador = PaginadorKeyset(produtos, ordenacao, tamanho=limite)
+    try:
+        queryset = paginador.apos(request.GET.get('cursor'))
+    except CursorInvalido as e:
+        return _erro(str(e))
+
+    linhas = queryset.values(*sorted(colunas))[:limite + 1].iterator(chunk_size=min(limite + 1, 2000))
+    return StreamingHttpResponse(
+        _serializar(linhas, campos, limite, paginador),
+        content_type='application/json; charset=utf-8',
+    )
+
+
+@require_GET
+def api_categorias(request):
+    """Categorias ativas com os contadores de produtos"""
+    categorias = catalog_cache.obter_ou_calcular(
+        'api_categorias',
+        lambda: [
+            {
+                'id': c.id,
+                'nome': c.nome,
+                'total_produtos': c.qtd_produtos_ativos,
+                'produtos_em_estoque': c.qtd_produtos_em_estoque,
+            }
+            for c in Categoria.objects.filter(ativa=True).order_by('ordem', 'nome')
+        ],
+    )
+    return JsonResponse({'resultados': categorias})
+
+
+@require_GET
+def api_autocompletar(request):
+    """Sugestões para a caixa de busca, servidas do índice de prefixos em memória"""
+    try:
+        limite = min(int(request.GET.get('limite', autocomplete.LIMITE_PADRAO)), 20)
+    except ValueError:
+        return _erro('Limite deve ser um número inteiro.')
+
+    sugestoes = autocomplete.indice.sugerir(request.GET.get('q', ''), limite=max(limite, 1))
+    for sugestao in sugestoes:
+        sugestao['url'] = reverse('detalhe_produto', args=[sugestao['id']])
+    return JsonResponse({'resultados': sugestoes})
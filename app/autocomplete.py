@@ -0,0 +1,218 @@
+"""
+Índice de prefixos em memória para o autocompletar da busca.
+
+Cada palavra normalizada (sem acentos, minúscula) dos nomes dos produtos
+visíveis no catálogo (``ProdutoCatalogo.visiveis()``: ativos e de
+categoria ativa) entra num array ordenado de ``(palavra, produto_id)``. Os
+resultados são ordenados por destaque e vendas, sem tocar no banco.
+
+Prefixos comuns (mais de ``TOPO_POR_PREFIXO`` produtos) têm os melhores
+produtos já ordenados, calculados na construção: a consulta é uma busca
+num dict mais ``limite`` itens, não importa quantos produtos casem. Nos
+demais, a consulta faz ``bisect`` até o prefixo e percorre a faixa, que
+é curta. Uma escrita descarta as listas dos prefixos das palavras do
+produto, recalculadas na próxima consulta.
+
+O índice é construído na primeira consulta e atualizado de forma
+incremental pelos signals de ``Produto`` deste processo. Uma escrita em
+``Categoria`` faz a próxima consulta reconstruí-lo. Ele também é
+reconstruído quando fica mais velho que ``IDADE_MAXIMA`` e a geração do
+catálogo mudou (escritas feitas por outros processos, vendas novas).
+"""
+
+import heapq
+import threading
+import time
+from bisect import bisect_left, insort
+
+from django.db.models import Sum
+
+from . import catalog_cache
+from .search import normalizar_texto
+
+IDADE_MAXIMA = 300  # segundos
+LIMITE_PADRAO = 8
+TOPO_POR_PREFIXO = 20  # mesmo máximo de ``limite`` da API
+
+_MAIOR_CARACTERE = '\U0010ffff'  # prefixo + isto fica depois de toda palavra com o prefixo
+
+
+def _palavras(nome):
+    return sorted(set(normalizar_texto(nome).split()))
+
+
+def _prefixos(palavras):
+    return {palavra[:tamanho] for palavra in palavras for tamanho in range(1, len(palavra) + 1)}
+
+
+def _ranking(dados, produto_id):
+    """Chave de ordenação (maior primeiro): destaque, vendas e, no empate, o id menor"""
+    _, _, em_destaque, vendas = dados
+    return (em_destaque, vendas, -produto_id)
+
+
+class IndicePrefixos:
+    """Array ordenado de (palavra, produto_id) com os dados de ranking por produto"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entradas = []
+        self._produtos = {}  # id -> (nome, palavras, em_destaque, vendas)
+        self._topo = {}  # prefixo comum -> ids dos TOPO_POR_PREFIXO melhores, em ordem
+        self._construido_em = None
+        self._geracao = None
+
+    # ------------------------------------------------------------------
+    # Construção e manutenção
+    # ------------------------------------------------------------------
+
+    def construir(self):
+        """Reconstrói o índice inteiro a partir dos produtos visíveis no catálogo"""
+        from .models import Produto, ProdutoCatalogo
+
+        geracao = catalog_cache.obter_geracao()
+        vendas = dict(
+            Produto.objects.filter(order_items__order__paid=True)
+            .annotate(vendas=Sum('order_items__quantity'))
+            .values_list('id', 'vendas')
+        )
+        linhas = ProdutoCatalogo.visiveis().values_list('id', 'nome', 'em_destaque')
+
+        produtos = {}
+        entradas = []
+        for produto_id, nome, em_destaque in linhas.iterator():
+            palavras = _palavras(nome)
+            produtos[produto_id] = (nome, palavras, em_destaque, vendas.get(produto_id, 0))
+            entradas.extend((palavra, produto_id) for palavra in palavras)
+        entradas.sort()
+
+        # Produtos do melhor para o pior: cada prefixo guarda os primeiros que aparecem
+        topo = {}
+        for produto_id in sorted(produtos, key=lambda i: _ranking(produtos[i], i), reverse=True):
+            for prefixo in _prefixos(produtos[produto_id][1]):
+                ids = topo.setdefault(prefixo, [])
+                if len(ids) <= TOPO_POR_PREFIXO:
+                    ids.append(produto_id)
+        topo = {prefixo: ids[:TOPO_POR_PREFIXO] for prefixo, ids in topo.items() if len(ids) > TOPO_POR_PREFIXO}
+
+        with self._lock:
+            self._produtos = produtos
+            self._entradas = entradas
+            self._topo = topo
+            self._construido_em = time.monotonic()
+            self._geracao = geracao
+
+    def _descartar_topo_sem_lock(self, palavras):
+        for prefixo in _prefixos(palavras):
+            self._topo.pop(prefixo, None)
+
+    def _remover_sem_lock(self, produto_id):
+        dados = self._produtos.pop(produto_id, None)
+        if dados is None:
+            return
+        self._descartar_topo_sem_lock(dados[1])
+        for palavra in dados[1]:
+            posicao = bisect_left(self._entradas, (palavra, produto_id))
+            if posicao < len(self._entradas) and self._entradas[posicao] == (palavra, produto_id):
+                del self._entradas[posicao]
+
+    def atualizar(self, produto):
+        """Reflete um produto salvo (inclui, altera ou remove se não estiver visível)"""
+        from .models import ProdutoCatalogo
+
+        if self._construido_em is None:
+            return
+        visivel = produto.ativo and ProdutoCatalogo.visiveis().filter(id=produto.id).exists()
+        with self._lock:
+            if self._construido_em is None:
+                return
+            anterior = self._produtos.get(produto.id)
+            self._remover_sem_lock(produto.id)
+            if not visivel:
+                return
+            vendas = anterior[3] if anterior else 0
+            palavras = _palavras(produto.nome)
+            self._produtos[produto.id] = (produto.nome, palavras, produto.em_destaque, vendas)
+            self._descartar_topo_sem_lock(palavras)
+            for palavra in palavras:
+                insort(self._entradas, (palavra, produto.id))
+
+    def remover(self, produto_id):
+        """Retira um produto excluído"""
+        with self._lock:
+            self._remover_sem_lock(produto_id)
+
+    def descartar(self):
+        """Força a reconstrução na próxima consulta (ex.: categoria desativada)"""
+        with self._lock:
+            self._construido_em = None
+
+    def _garantir_atualizado(self):
+        construido_em = self._construido_em
+        if construido_em is None:
+            self.construir()
+        elif time.monotonic() - construido_em > IDADE_MAXIMA and catalog_cache.obter_geracao() != self._geracao:
+            self.construir()
+
+    # ------------------------------------------------------------------
+    # Consulta
+    # ------------------------------------------------------------------
+
+    def sugerir(self, termo, limite=LIMITE_PADRAO):
+        """
+        Até ``limite`` produtos cujo nome tem palavras começando com cada
+        palavra de ``termo``, ordenados por destaque e vendas.
+
+        Returns:
+            Lista de dicts com id e nome
+        """
+        consulta = normalizar_texto(termo).split()
+        if not consulta:
+            return []
+        self._garantir_atualizado()
+
+        with self._lock:
+            # Parte da palavra com menos produtos (tamanho da faixa por bisect)
+            faixas = {palavra: self._faixa_sem_lock(palavra) for palavra in consulta}
+            principal = min(consulta, key=lambda palavra: faixas[palavra][1] - faixas[palavra][0])
+            inicio, fim = faixas[principal]
+            topo = self._topo.get(principal)
+            if topo is None:
+                candidatos = self._ids_sem_lock(inicio, fim)
+                if len(candidatos) <= TOPO_POR_PREFIXO:
+                    return self._melhores_sem_lock(candidatos, consulta, limite)
+                topo = self._topo[principal] = heapq.nlargest(
+                    TOPO_POR_PREFIXO, candidatos, key=lambda i: _ranking(self._produtos[i], i)
+                )
+
+            # Os que casam com as outras palavras entre os melhores do prefixo
+            # são os melhores da consulta, se forem ao menos ``limite``
+            ids = [i for i in topo if self._casa_sem_lock(i, consulta)][:limite]
+            if len(ids) < limite:
+                return self._melhores_sem_lock(self._ids_sem_lock(inicio, fim), consulta, limite)
+            return [{'id': produto_id, 'nome': self._produtos[produto_id][0]} for produto_id in ids]
+
+    def _faixa_sem_lock(self, prefixo):
+        """Posições (início, fim) das entradas com palavra começando com ``prefixo``"""
+        return (
+            bisect_left(self._entradas, (prefixo,)),
+            bisect_left(self._entradas, (prefixo + _MAIOR_CARACTERE,)),
+        )
+
+    def _ids_sem_lock(self, inicio, fim):
+        return {produto_id for _, produto_id in self._entradas[inicio:fim]}
+
+    def _casa_sem_lock(self, produto_id, consulta):
+        palavras = self._produtos[produto_id][1]
+        return all(any(p.startswith(q) for p in palavras) for q in consulta)
+
+    def _melhores_sem_lock(self, candidatos, consulta, limite):
+        melhores = heapq.nlargest(
+            limite,
+            (i for i in candidatos if self._casa_sem_lock(i, consulta)),
+            key=lambda i: _ranking(self._produtos[i], i),
+        )
+        return [{'id': produto_id, 'nome': self._produtos[produto_id][0]} for produto_id in melhores]
+
+
+indice = IndicePrefixos()
@@ -0,0 +1,107 @@
+"""
+Normalização das fotos de perfil, fora da thread da requisição.
+
+O upload é gravado como veio e, depois do commit, uma thread de fundo:
+
+    1. decodifica a imagem, aplica a orientação do EXIF e reduz para no
+       máximo ``LADO_MAXIMO`` pixels;
+    2. regrava como JPEG sem metadados (EXIF, GPS, ICC) no lugar do
+       arquivo enviado, em ``perfil/<cliente>-<hash>.jpg``;
+    3. gera os avatares quadrados (conjunto ``avatar`` de app.images);
+    4. apaga a foto anterior e os avatares dela, se nenhum cliente os usa.
+
+Enquanto isso não termina, ``Cliente.obter_foto_perfil`` serve o arquivo
+enviado. Com ``AVATAR_EM_SEGUNDO_PLANO = False`` o trabalho roda
+no próprio commit (útil em testes e scripts).
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+from . import images
+from .models import Cliente
+
+logger = logging.getLogger(__name__)
+
+LADO_MAXIMO = 1024
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='avatares')
+
+
+def agendar_normalizacao(cliente_id, nome, anteriores=()):
+    """
+    Normaliza ``nome`` (foto enviada por ``cliente_id``) após o commit atual
+    e apaga ``anteriores`` (arquivos da foto que ela substituiu).
+    """
+    def executar():
+        if getattr(settings, 'AVATAR_EM_SEGUNDO_PLANO', True):
+            _executor.submit(_em_segundo_plano, cliente_id, nome, anteriores)
+        else:
+            normalizar(cliente_id, nome, anteriores)
+    transaction.on_commit(executar)
+
+
+def apagar_sem_uso(nomes):
+    """Apaga as fotos de perfil e os avatares da lista que nenhum cliente usa"""
+    hashes_em_uso = {}
+    for nome in set(nomes):
+        if nome.startswith(f'{images.DIRETORIO}/'):
+            # derivados/ab/<hash>/v1/medio.jpg: a mesma foto pode ser de outro cliente
+            hash_original = nome.split('/')[2]
+            if hash_original not in hashes_em_uso:
+                hashes_em_uso[hash_original] = Cliente.objects.filter(
+                    foto_perfil_derivados__hash=hash_original
+                ).exists()
+            em_uso = hashes_em_uso[hash_original]
+        else:
+            em_uso = Cliente.objects.filter(foto_perfil=nome).exists()
+        if not em_uso:
+            default_storage.delete(nome)
+
+
+def _em_segundo_plano(cliente_id, nome, anteriores):
+    close_old_connections()
+    try:
+        normalizar(cliente_id, nome, anteriores)
+    except Exception:
+        logger.exception(f"Falha ao normalizar a foto de perfil {nome} (cliente {cliente_id})")
+    finally:
+        close_old_connections()
+
+
+def normalizar(cliente_id, nome, anteriores=()):
+    """
+    Regrava a foto enviada sem metadados, gera os avatares e apaga os
+    arquivos que deixaram de ser usados.
+
+    Returns:
+        True se a foto do cliente foi substituída; False se ele já tinha
+        enviado outra nesse meio tempo
+    """
+    with default_storage.open(nome, 'rb') as arquivo, Image.open(arquivo) as imagem:
+        imagem = ImageOps.exif_transpose(imagem)
+        imagem.thumbnail((LADO_MAXIMO, LADO_MAXIMO), Image.Resampling.LANCZOS)
+        normalizada = ContentFile(images.codificar(imagem, 'jpeg'))
+
+    hash_original = images.hash_conteudo(normalizada)
+    novo = f'perfil/{cliente_id}-{hash_original[:16]}.jpg'
+    if not default_storage.exists(novo):  # a mesma foto enviada de novo reaproveita o arquivo
+        novo = default_storage.save(novo, normalizada)
+    derivados = images.gerar_derivados(normalizada, default_storage, 'avatar', hash_original=hash_original)
+
+    substituida = Cliente.objects.filter(pk=cliente_id, foto_perfil=nome).update(
+        foto_perfil=novo, foto_perfil_derivados=derivados,
+    )
+    # O enviado e a foto anterior; ou, se chegou outra foto, também o que foi gerado aqui
+    descartados = [nome, *anteriores]
+    if not substituida:
+        descartados += [novo, *images.nomes_derivados(derivados)]
+    apagar_sem_uso(descartados)
+    logger.info(f"Foto de perfil do cliente {cliente_id} normalizada: {novo}")
+    return bool(substituida)
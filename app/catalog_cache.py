@@ -0,0 +1,189 @@
+"""
+Cache do catálogo versionado por geração.
+
+Toda chave inclui a geração guardada em ``EstadoCatalogo`` (uma linha no
+banco, a mesma para todos os workers e comandos). Qualquer escrita em
+``Produto``, ``Categoria`` ou ``ImagemProduto`` incrementa a geração (ver
+``app.signals``), o que torna todas as chaves antigas inalcançáveis.
+Assim os valores podem ter TTL longo sem ficarem desatualizados.
+
+Cada processo relê a geração no máximo a cada
+``CATALOGO_GERACAO_INTERVALO`` segundos; escritas feitas em outro processo
+aparecem depois desse intervalo. Com vários workers o backend de cache
+também precisa ser compartilhado (Redis, ver ``settings.CACHES``).
+
+Os valores guardados devem ser listas, dicts ou HTML já renderizado,
+nunca querysets.
+
+``pagina_compartilhada`` guarda a página inteira, a mesma para todos os
+usuários: as partes pessoais são buscadas pelo navegador em
+``fragmento_usuario`` (ver ``fragmento_usuario.html``).
+"""
+
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.db.models.query import QuerySet
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .models import EstadoCatalogo
+
+TTL_CATALOGO = 60 * 60 * 24  # 24 horas
+
+# (geração, time.monotonic() da leitura) deste processo
+_ultima_leitura = (None, 0.0)
+
+
+def _agora():
+    # Em microssegundos: uma geração nova nunca repete uma anterior, mesmo
+    # com a linha recriada ou um incremento desfeito por rollback
+    return time.time_ns() // 1000
+
+
+def _ler_geracao():
+    """Lê a geração do banco (criando a linha se preciso) e guarda a leitura"""
+    global _ultima_leitura
+    geracao = EstadoCatalogo.objects.filter(pk=1).values_list('geracao', flat=True).first()
+    if geracao is None:
+        estado, _ = EstadoCatalogo.objects.get_or_create(pk=1, defaults={'geracao': _agora()})
+        geracao = estado.geracao
+    _ultima_leitura = (geracao, time.monotonic())
+    return geracao
+
+
+def obter_geracao():
+    """Geração atual do catálogo"""
+    geracao, lida_em = _ultima_leitura
+    if geracao is None or time.monotonic() - lida_em >= getattr(settings, 'CATALOGO_GERACAO_INTERVALO', 1):
+        geracao = _ler_geracao()
+    return geracao
+
+
+def incrementar_geracao():
+    """Invalida todo o cache do catálogo, em todos os processos"""
+    EstadoCatalogo.objects.filter(pk=1).update(geracao=Greatest(F('geracao') + 1, Value(_agora())))
+    return _ler_geracao()
+
+
+def cache_compartilhado():
+    """Se o cache padrão é visto por todos os processos (não é memória local nem dummy)"""
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def incrementar_geracao_apos_commit():
+    """
+    Incrementa a geração quando a transação atual for confirmada, para que
+    nenhuma requisição concorrente recoloque no cache dados anteriores à escrita.
+    """
+    transaction.on_commit(incrementar_geracao)
+
+
+def chave(nome, *partes):
+    """Chave de cache da geração atual"""
+    # Partes podem conter texto livre da busca: hash mantém a chave segura
+    sufixo = hashlib.md5(repr(partes).encode('utf-8')).hexdigest()
+    return f'catalogo:{obter_geracao()}:{nome}:{sufixo}'
+
+
+def obter_ou_calcular(nome, calcular, *partes, timeout=TTL_CATALOGO):
+    """
+    Retorna o valor em cache ou calcula, guarda e retorna.
+
+    Args:
+        nome: nome lógico do valor (ex.: 'categorias')
+        calcular: função sem argumentos que produz o valor
+        partes: componentes adicionais da chave (filtros etc.)
+    """
+    chave_cache = chave(nome, *partes)
+    valor = cache.get(chave_cache)
+    if valor is None:
+        valor = calcular()
+        if isinstance(valor, QuerySet):
+            raise TypeError('Querysets não podem ser guardados no cache do catálogo.')
+        cache.set(chave_cache, valor, timeout)
+    return valor
+
+
+# ==========================
+# FRAGMENTOS DOS CARDS
+# ==========================
+
+VERSAO_CARD = 4  # Incrementar ao alterar produto_card.html
+TTL_CARD = 60 * 60 * 24 * 7  # 7 dias
+
+
+def chave_card(produto):
+    """
+    Chave do card de um ``ProdutoCatalogo``: muda sempre que a linha é
+    regravada (escrita no produto ou na sua categoria)
+    """
+    return f'catalogo:card:v{VERSAO_CARD}:{produto.id}:{produto.atualizado_em.timestamp()}'
+
+
+def renderizar_cards(produtos):
+    """
+    HTML dos cards dos produtos (linhas de ``ProdutoCatalogo``), na mesma ordem.
+
+    Busca todos os cards com um único ``get_many`` e renderiza (e guarda)
+    apenas os que faltarem.
+    """
+    chaves = [chave_card(p) for p in produtos]
+    encontrados = cache.get_many(chaves)
+
+    faltantes = {}
+    cards = []
+    for produto, chave_produto in zip(produtos, chaves):
+        html = encontrados.get(chave_produto)
+        if html is None:
+            html = render_to_string('produto_card.html', {'produto': produto})
+            faltantes[chave_produto] = str(html)
+        cards.append(mark_safe(html))
+
+    if faltantes:
+        cache.set_many(faltantes, TTL_CARD)
+    return cards
+
+
+# ==========================
+# PÁGINAS INTEIRAS
+# ==========================
+
+VERSAO_PAGINA = 2  # Incrementar ao mudar o formato do valor guardado
+
+
+def pagina_compartilhada(view):
+    """
+    Cache da página inteira por caminho e query string, na geração atual.
+
+    O HTML guardado é servido a qualquer usuário autenticado, então o
+    template não pode conter nada pessoal (e-mail, carrinho, mensagens,
+    token CSRF). Só respostas 200 a GET/HEAD são guardadas, e apenas o
+    corpo e os cabeçalhos definidos pela view (nunca cookies).
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return view(request, *args, **kwargs)
+
+        # Chave calculada antes da view: o HTML nunca é mais antigo que a geração
+        chave_cache = chave('pagina', VERSAO_PAGINA, request.path, sorted(request.GET.lists()))
+        guardada = cache.get(chave_cache)
+        if guardada is not None:
+            cabecalhos, conteudo = guardada
+            return HttpResponse(conteudo, headers=cabecalhos)
+
+        resposta = view(request, *args, **kwargs)
+        if resposta.status_code == 200 and not resposta.streaming:
+            cache.set(chave_cache, (dict(resposta.items()), resposta.content), TTL_CATALOGO)
+        return resposta
+    return wrapper
@@ -0,0 +1,90 @@
+"""
+Contadores desnormalizados de produtos por categoria.
+
+``Categoria.qtd_produtos_ativos`` e ``Categoria.qtd_produtos_em_estoque``
+são atualizados por variação (``F()``) a cada escrita em ``Produto`` e
+podem ser recalculados em lote com ``recalcular_contadores``.
+"""
+
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def contribuicao(ativo, estoque):
+    """Quanto um produto soma em (ativos, em estoque) na sua categoria"""
+    if not ativo:
+        return (0, 0)
+    return (1, 1 if estoque > 0 else 0)
+
+
+def aplicar_variacao(categoria_id, ativos, em_estoque):
+    """Soma a variação informada aos contadores de uma categoria"""
+    from .models import Categoria
+
+    if not categoria_id or (ativos == 0 and em_estoque == 0):
+        return
+    Categoria.objects.filter(id=categoria_id).update(
+        qtd_produtos_ativos=F('qtd_produtos_ativos') + ativos,
+        qtd_produtos_em_estoque=F('qtd_produtos_em_estoque') + em_estoque,
+    )
+
+
+def registrar_escrita(estado_anterior, produto):
+    """
+    Atualiza os contadores após salvar um produto.
+
+    Args:
+        estado_anterior: tupla (categoria_id, ativo, estoque) antes do save,
+            ou None para produto novo
+        produto: instância já salva
+    """
+    antes = (0, 0)
+    if estado_anterior is not None:
+        categoria_anterior, ativo, estoque = estado_anterior
+        antes = contribuicao(ativo, estoque)
+    else:
+        categoria_anterior = None
+    depois = contribuicao(produto.ativo, produto.estoque)
+
+    if categoria_anterior is not None and categoria_anterior != produto.categoria_id:
+        aplicar_variacao(categoria_anterior, -antes[0], -antes[1])
+        aplicar_variacao(produto.categoria_id, depois[0], depois[1])
+    else:
+        aplicar_variacao(produto.categoria_id, depois[0] - antes[0], depois[1] - antes[1])
+
+
+def registrar_remocao(produto):
+    """Atualiza os contadores após excluir um produto"""
+    ativos, em_estoque = contribuicao(produto.ativo, produto.estoque)
+    aplicar_variacao(produto.categoria_id, -ativos, -em_estoque)
+
+
+def recalcular_contadores(categoria_ids=None):
+    """
+    Recalcula os contadores a partir da tabela de produtos num único UPDATE.
+
+    Args:
+        categoria_ids: restringe às categorias informadas (padrão: todas)
+
+    Returns:
+        Quantidade de categorias atualizadas
+    """
+    from .models import Categoria, Produto
+
+    def _contagem(**filtros):
+        subquery = (
+            Produto.objects.filter(categoria=OuterRef('pk'), ativo=True, **filtros)
+            .order_by()
+            .values('categoria')
+            .annotate(total=Count('id'))
+            .values('total')
+        )
+        return Coalesce(Subquery(subquery, output_field=IntegerField()), Value(0))
+
+    categorias = Categoria.objects.all()
+    if categoria_ids is not None:
+        categorias = categorias.filter(id__in=list(categoria_ids))
+    return categorias.update(
+        qtd_produtos_ativos=_contagem(),
+        qtd_produtos_em_estoque=_contagem(estoque__gt=0),
+    )
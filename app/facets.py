@@ -0,0 +1,135 @@
+"""
+Facetas do catálogo: faixa de preço (sobre a coluna ``preco_efetivo``),
+forma de pagamento, em estoque, em promoção e em destaque.
+
+Todas as contagens saem de uma única query de agregação condicional.
+Cada faceta é contada sobre o resultado atual com as *outras* facetas
+selecionadas aplicadas, então as opções da mesma faceta continuam
+mostrando quantos produtos trariam se fossem escolhidas.
+"""
+
+from decimal import Decimal
+
+from django.db.models import Count, Q
+
+
+def _faixa(minimo, maximo):
+    filtro = Q()
+    if minimo is not None:
+        filtro &= Q(preco_efetivo__gte=Decimal(minimo))
+    if maximo is not None:
+        filtro &= Q(preco_efetivo__lt=Decimal(maximo))
+    return filtro
+
+
+# faceta -> (rótulo, [(valor, rótulo da opção, filtro)])
+FACETAS = {
+    'preco': ('Preço', [
+        ('0-50', 'Até R$ 50', _faixa(None, 50)),
+        ('50-100', 'R$ 50 a R$ 100', _faixa(50, 100)),
+        ('100-250', 'R$ 100 a R$ 250', _faixa(100, 250)),
+        ('250-500', 'R$ 250 a R$ 500', _faixa(250, 500)),
+        ('500-1000', 'R$ 500 a R$ 1.000', _faixa(500, 1000)),
+        ('1000+', 'Acima de R$ 1.000', _faixa(1000, None)),
+    ]),
+    'pagamento': ('Forma de Pagamento', [
+        ('vista', 'À Vista', Q(forma_pagamento__in=['vista', 'ambos'])),
+        ('parcelado', 'Parcelado', Q(forma_pagamento__in=['parcelado', 'ambos'])),
+    ]),
+    'estoque': ('Disponibilidade', [
+        ('1', 'Em estoque', Q(estoque__gt=0)),
+    ]),
+    'promocao': ('Promoção', [
+        ('1', 'Em promoção', Q(preco_promocional__isnull=False)),
+    ]),
+    'destaque': ('Destaque', [
+        ('1', 'Em destaque', Q(em_destaque=True)),
+    ]),
+}
+
+
+def _filtro(faceta, valor):
+    for valor_opcao, _, filtro in FACETAS[faceta][1]:
+        if valor_opcao == valor:
+            return filtro
+    return None
+
+
+def facetas_selecionadas(params):
+    """Facetas válidas presentes nos parâmetros da requisição: {faceta: valor}"""
+    selecionadas = {}
+    for faceta in FACETAS:
+        valor = params.get(faceta)
+        if valor and _filtro(faceta, valor) is not None:
+            selecionadas[faceta] = valor
+    return selecionadas
+
+
+def _filtros_exceto(selecionadas, excluida=None):
+    filtro = Q()
+    for faceta, valor in selecionadas.items():
+        if faceta != excluida:
+            filtro &= _filtro(faceta, valor)
+    return filtro
+
+
+def aplicar_facetas(queryset, selecionadas):
+    """Restringe o queryset às facetas selecionadas"""
+    if not selecionadas:
+        return queryset
+    return queryset.filter(_filtros_exceto(selecionadas))
+
+
+def contar_facetas(queryset, selecionadas):
+    """
+    Contagem de cada opção de faceta numa única query.
+
+    Args:
+        queryset: produtos já filtrados por categoria e busca, sem facetas
+        selecionadas: resultado de ``facetas_selecionadas``
+
+    Returns:
+        {faceta: {valor: quantidade}}
+    """
+    agregacoes = {}
+    for faceta, (_, opcoes) in FACETAS.items():
+        outras = _filtros_exceto(selecionadas, excluida=faceta)
+        for indice, (_, _, filtro) in enumerate(opcoes):
+            agregacoes[f'{faceta}_{indice}'] = Count('id', filter=outras & filtro)
+
+    totais = queryset.order_by().aggregate(**agregacoes)
+    return {
+        faceta: {valor: totais[f'{faceta}_{indice}'] for indice, (valor, _, _) in enumerate(opcoes)}
+        for faceta, (_, opcoes) in FACETAS.items()
+    }
+
+
+def montar_facetas(contagens, selecionadas, params):
+    """
+    Estrutura para o template, com o link que liga/desliga cada opção.
+
+    Args:
+        contagens: resultado de ``contar_facetas``
+        selecionadas: facetas ativas
+        params: QueryDict da requisição
+    """
+    resultado = []
+    for faceta, (rotulo, opcoes) in FACETAS.items():
+        itens = []
+        for valor, rotulo_opcao, _ in opcoes:
+            query = params.copy()
+            query.pop('cursor', None)
+            selecionada = selecionadas.get(faceta) == valor
+            if selecionada:
+                query.pop(faceta, None)
+            else:
+                query[faceta] = valor
+            itens.append({
+                'valor': valor,
+                'rotulo': rotulo_opcao,
+                'quantidade': contagens[faceta][valor],
+                'selecionada': selecionada,
+                'url': f'?{query.urlencode()}',
+            })
+        resultado.append({'nome': faceta, 'rotulo': rotulo, 'opcoes': itens})
+    return resultado
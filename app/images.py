@@ -0,0 +1,252 @@
+"""
+Derivados das fotos de produtos (miniatura, card, detalhe e zoom).
+
+Cada imagem enviada gera uma versão por tamanho em WebP e em JPEG,
+redimensionada para caber em ``TAMANHOS`` (nunca ampliada). Os arquivos
+ficam em ``derivados/<xx>/<hash do original>/v<VERSAO>/`` no storage
+padrão, e a descrição deles (nomes e dimensões) é guardada num JSONField
+do próprio modelo, então as listagens não precisam abrir arquivo nenhum:
+
+    {
+        "versao": 1,
+        "hash": "<sha1 do original>",
+        "largura": 2400, "altura": 1800,
+        "tamanhos": {
+            "card": {"largura": 400, "altura": 300,
+                     "webp": "derivados/ab/ab12.../v1/card.webp",
+                     "jpeg": "derivados/ab/ab12.../v1/card.jpg"},
+            ...
+        }
+    }
+
+Nos templates, use ``objeto.fotos.card.webp`` / ``.jpeg`` / ``.largura``
+(ver ``Derivados``). Sem derivados, as URLs caem no arquivo original.
+
+Fotos de perfil usam o conjunto ``avatar`` (quadrados, recortados no
+centro). O comando ``processar_imagens`` reprocessa a biblioteca inteira
+em paralelo (ver ``processar_arquivo``).
+"""
+
+import hashlib
+import io
+import logging
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+VERSAO = 1  # Incrementar ao mudar tamanhos, formatos ou qualidade
+
+# Maior lado de cada derivado, em pixels
+TAMANHOS = {
+    'miniatura': 150,
+    'card': 400,
+    'detalhe': 800,
+    'zoom': 1600,
+}
+
+# Lado de cada avatar (quadrado), em pixels
+TAMANHOS_AVATAR = {
+    'pequeno': 64,
+    'medio': 128,
+    'grande': 256,
+}
+
+# Conjunto -> (tamanhos, recortar em quadrado)
+CONJUNTOS = {
+    'produto': (TAMANHOS, False),
+    'avatar': (TAMANHOS_AVATAR, True),
+}
+
+FORMATOS = {
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+DIRETORIO = 'derivados'
+
+
+def hash_conteudo(arquivo):
+    """SHA-1 do conteúdo de um arquivo (lido em blocos)"""
+    sha1 = hashlib.sha1()
+    arquivo.seek(0)
+    for bloco in iter(lambda: arquivo.read(1024 * 1024), b''):
+        sha1.update(bloco)
+    arquivo.seek(0)
+    return sha1.hexdigest()
+
+
+def _para_jpeg(imagem):
+    """JPEG não tem transparência: aplica o canal alfa sobre fundo branco"""
+    if imagem.mode in ('RGBA', 'LA', 'P'):
+        imagem = imagem.convert('RGBA')
+        fundo = Image.new('RGB', imagem.size, (255, 255, 255))
+        fundo.paste(imagem, mask=imagem.getchannel('A'))
+        return fundo
+    return imagem.convert('RGB')
+
+
+def codificar(imagem, formato):
+    nome_pil, _, opcoes = FORMATOS[formato]
+    if formato == 'jpeg':
+        imagem = _para_jpeg(imagem)
+    elif imagem.mode not in ('RGB', 'RGBA'):
+        imagem = imagem.convert('RGBA' if imagem.mode in ('LA', 'P', 'PA') else 'RGB')
+    saida = io.BytesIO()
+    imagem.save(saida, nome_pil, **opcoes)
+    return saida.getvalue()
+
+
+def _redimensionar(original, lado, recortar):
+    if recortar:
+        lado = min(lado, *original.size)
+        return ImageOps.fit(original, (lado, lado), Image.Resampling.LANCZOS)
+    imagem = original.copy()
+    imagem.thumbnail((lado, lado), Image.Resampling.LANCZOS)
+    return imagem
+
+
+def gerar_derivados(arquivo, storage, conjunto='produto', forcar=False, hash_original=None):
+    """
+    Gera e grava os derivados de um arquivo de imagem.
+
+    Args:
+        arquivo: arquivo aberto (upload ou ``FieldFile``), lido desde o início
+        storage: storage onde os derivados são gravados
+        conjunto: chave de ``CONJUNTOS``
+        forcar: regrava derivados que já existem no storage
+
+    Returns:
+        dict no formato descrito no módulo
+    """
+    tamanhos, recortar = CONJUNTOS[conjunto]
+    hash_original = hash_original or hash_conteudo(arquivo)
+    pasta = f'{DIRETORIO}/{hash_original[:2]}/{hash_original}/v{VERSAO}'
+
+    with Image.open(arquivo) as original:
+        original = ImageOps.exif_transpose(original)
+        original.load()
+    largura, altura = original.size
+
+    gerados = {}
+    for tamanho, lado in tamanhos.items():
+        imagem = _redimensionar(original, lado, recortar)
+        dados = {'largura': imagem.width, 'altura': imagem.height}
+        for formato, (_, extensao, _) in FORMATOS.items():
+            nome = f'{pasta}/{tamanho}.{extensao}'
+            if forcar:
+                storage.delete(nome)
+            # Mesmo original, mesmo derivado: não regrava
+            if not storage.exists(nome):
+                nome = storage.save(nome, ContentFile(codificar(imagem, formato)))
+            dados[formato] = nome
+        gerados[tamanho] = dados
+
+    return {
+        'versao': VERSAO,
+        'hash': hash_original,
+        'largura': largura,
+        'altura': altura,
+        'tamanhos': gerados,
+    }
+
+
+def nomes_derivados(dados):
+    """Nomes no storage de todos os arquivos descritos em ``dados``"""
+    return [
+        derivado[formato] for derivado in (dados or {}).get('tamanhos', {}).values() for formato in FORMATOS
+    ]
+
+
+def esta_atualizado(dados, hash_original, storage, conjunto='produto'):
+    """Os derivados descritos em ``dados`` são do original e da versão atuais e existem?"""
+    tamanhos, _ = CONJUNTOS[conjunto]
+    if not dados or dados.get('versao') != VERSAO or dados.get('hash') != hash_original:
+        return False
+    gerados = dados.get('tamanhos', {})
+    return set(gerados) == set(tamanhos) and all(
+        storage.exists(derivado[formato]) for derivado in gerados.values() for formato in FORMATOS
+    )
+
+
+def processar_arquivo(nome, conjunto, atuais=(), forcar=False):
+    """
+    Reprocessa um arquivo do storage padrão; roda nos processos do comando
+    ``processar_imagens`` e por isso não acessa o banco.
+
+    Args:
+        atuais: derivados gravados hoje em cada registro que usa o arquivo
+
+    Returns:
+        (dados, bytes lidos); ``dados`` é None se os derivados de todos os
+        registros já estavam em dia
+    """
+    with default_storage.open(nome, 'rb') as arquivo:
+        hash_original = hash_conteudo(arquivo)
+        tamanho = arquivo.size
+        if not forcar:
+            em_dia = [dados for dados in atuais if esta_atualizado(dados, hash_original, default_storage, conjunto)]
+            if em_dia and len(em_dia) == len(atuais):
+                return None, tamanho
+            if em_dia:
+                # Outro registro do mesmo arquivo já tem os derivados: basta copiá-los
+                return em_dia[0], tamanho
+        return gerar_derivados(arquivo, default_storage, conjunto, forcar, hash_original), tamanho
+
+
+def atualizar_derivados(arquivo, atuais, conjunto='produto'):
+    """
+    Derivados de um ``FieldFile`` prestes a ser salvo.
+
+    Só gera quando há um upload novo (arquivo ainda não gravado); sem
+    imagem, devolve ``{}``. Se a imagem não puder ser lida, também devolve
+    ``{}`` e o original continua sendo servido.
+    """
+    if not arquivo:
+        return {}
+    if arquivo._committed:
+        return atuais
+    try:
+        return gerar_derivados(arquivo, default_storage, conjunto)
+    except (OSError, Image.DecompressionBombError, SyntaxError):
+        logger.exception(f"Não foi possível gerar os derivados de {arquivo.name}")
+        return {}
+
+
+class Derivados:
+    """
+    Acesso aos derivados nos templates: ``fotos.card.webp``,
+    ``fotos.card.jpeg``, ``fotos.card.largura``, ``fotos.card.altura``.
+    Sem derivados, ``webp`` e ``jpeg`` apontam para o original.
+    """
+
+    def __init__(self, dados, storage=None, url_original='', conjunto='produto'):
+        self.dados = dados or {}
+        self.storage = storage
+        self.url_original = url_original
+        self.tamanhos, _ = CONJUNTOS[conjunto]
+
+    def __bool__(self):
+        return bool(self.dados.get('tamanhos') or self.url_original)
+
+    def variantes(self, formato):
+        """(URL, largura) de cada derivado no formato, sem larguras repetidas, da menor à maior"""
+        por_largura = {}
+        for derivado in self.dados.get('tamanhos', {}).values():
+            por_largura.setdefault(derivado['largura'], derivado[formato])
+        return [(self.storage.url(nome), largura) for largura, nome in sorted(por_largura.items())]
+
+    def __getitem__(self, tamanho):
+        if tamanho not in self.tamanhos:
+            raise KeyError(tamanho)
+        derivado = self.dados.get('tamanhos', {}).get(tamanho)
+        if not derivado:
+            return {'webp': self.url_original, 'jpeg': self.url_original, 'largura': None, 'altura': None}
+        return {
+            'webp': self.storage.url(derivado['webp']),
+            'jpeg': self.storage.url(derivado['jpeg']),
+            'largura': derivado['largura'],
+            'altura': derivado['altura'],
+        }
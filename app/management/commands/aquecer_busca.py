@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app import catalog_cache, search_cache, search_log
+
+
+class Command(BaseCommand):
+    help = (
+        'Pré-calcula no cache compartilhado os resultados das buscas mais populares '
+        '(rodar depois de um deploy; exige um cache compartilhado entre processos, como o Redis)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limite', type=int, default=500,
+            help='Quantidade de buscas aquecidas (padrão: 500)'
+        )
+        parser.add_argument(
+            '--dias', type=int, default=7,
+            help='Janela do histórico considerada, em dias (padrão: 7)'
+        )
+
+    def handle(self, *args, **options):
+        if not catalog_cache.cache_compartilhado():
+            # Aqueceria só a memória deste processo, descartada ao terminar
+            raise CommandError(
+                'O cache padrão não é compartilhado entre processos; configure REDIS_URL.'
+            )
+        inicio = time.monotonic()
+        search_log.consolidar()
+        populares = search_cache.consultas_populares(options['limite'], options['dias'])
+        calculadas = sum(search_cache.aquecer(termo, categoria_id) for termo, categoria_id, _ in populares)
+        self.stdout.write(self.style.SUCCESS(
+            f'{calculadas} busca(s) calculada(s), {len(populares) - calculadas} já em cache '
+            f'em {time.monotonic() - inicio:.1f}s.'
+        ))
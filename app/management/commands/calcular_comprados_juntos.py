@@ -0,0 +1,46 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from app.catalog_cache import incrementar_geracao
+from app.recommendations import (
+    ATRASO_PAGAMENTO, ITENS_POR_LOTE, MINIMO_PEDIDOS, VIZINHOS_PADRAO, calcular_comprados_juntos,
+)
+
+
+class Command(BaseCommand):
+    help = 'Atualiza os produtos "comprados juntos" a partir dos pedidos pagos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--completo', action='store_true',
+            help="Reprocessa todos os pedidos, ignorando a marca d'água"
+        )
+        parser.add_argument(
+            '--vizinhos', type=int, default=VIZINHOS_PADRAO,
+            help=f'Recomendações guardadas por produto (padrão: {VIZINHOS_PADRAO})'
+        )
+        parser.add_argument(
+            '--minimo-pedidos', type=int, default=MINIMO_PEDIDOS,
+            help=f'Pedidos em comum para um par ser recomendado (padrão: {MINIMO_PEDIDOS})'
+        )
+        parser.add_argument(
+            '--atraso-horas', type=float, default=ATRASO_PAGAMENTO.total_seconds() / 3600,
+            help='Só considera pedidos criados há mais tempo que isso (padrão: 24)'
+        )
+        parser.add_argument(
+            '--lote', type=int, default=ITENS_POR_LOTE,
+            help=f'Itens de pedido lidos por vez (padrão: {ITENS_POR_LOTE})'
+        )
+
+    def handle(self, *args, **options):
+        total = calcular_comprados_juntos(
+            completo=options['completo'],
+            vizinhos=options['vizinhos'],
+            minimo_pedidos=options['minimo_pedidos'],
+            atraso=timedelta(hours=options['atraso_horas']),
+            itens_por_lote=options['lote'],
+        )
+        if total or options['completo']:
+            incrementar_geracao()
+        self.stdout.write(self.style.SUCCESS(f'{total} pedido(s) processado(s).'))
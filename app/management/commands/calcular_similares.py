@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from app.catalog_cache import incrementar_geracao
+from app.similarity import LINHAS_POR_BLOCO, VIZINHOS_PADRAO, calcular_similares
+
+
+class Command(BaseCommand):
+    help = 'Pré-calcula os produtos similares (TF-IDF de nome e descrição)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--completo', action='store_true',
+            help='Recalcula todos os produtos, não só os que tiveram o texto alterado'
+        )
+        parser.add_argument(
+            '--vizinhos', type=int, default=VIZINHOS_PADRAO,
+            help=f'Similares guardados por produto (padrão: {VIZINHOS_PADRAO})'
+        )
+        parser.add_argument(
+            '--lote', type=int, default=LINHAS_POR_BLOCO,
+            help=f'Produtos comparados por bloco de multiplicação (padrão: {LINHAS_POR_BLOCO})'
+        )
+
+    def handle(self, *args, **options):
+        total = calcular_similares(
+            completo=options['completo'],
+            vizinhos=options['vizinhos'],
+            linhas_por_bloco=options['lote'],
+        )
+        if total:
+            incrementar_geracao()
+        self.stdout.write(self.style.SUCCESS(f'Similares recalculados para {total} produto(s).'))
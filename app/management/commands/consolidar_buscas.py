@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from app import search_log
+
+
+class Command(BaseCommand):
+    help = (
+        'Soma as buscas registradas no resumo diário (BuscaDiaria) e apaga as antigas '
+        'já consolidadas (rodar periodicamente, ex.: a cada hora pelo cron)'
+    )
+
+    def handle(self, *args, **options):
+        total = search_log.consolidar()
+        self.stdout.write(self.style.SUCCESS(f'{total} busca(s) consolidada(s).'))
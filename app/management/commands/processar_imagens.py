@@ -0,0 +1,169 @@
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from app import images, read_model
+from app.catalog_cache import incrementar_geracao
+from app.models import Cliente, ImagemProduto, Produto
+
+# Pasta do MEDIA_ROOT -> conjunto de tamanhos e (modelo, campo da imagem, campo dos derivados)
+PASTAS = {
+    'produtos': ('produto', [(Produto, 'foto', 'foto_derivados'), (ImagemProduto, 'imagem', 'derivados')]),
+    'perfil': ('avatar', [(Cliente, 'foto_perfil', 'foto_perfil_derivados')]),
+}
+
+PRODUTOS_POR_SINCRONIZACAO = 500
+PROGRESSO_A_CADA = 100
+
+
+def _iniciar_processo():
+    # Processos criados por spawn/forkserver não herdam o Django configurado
+    import django
+    django.setup()
+
+
+def _listar(pasta):
+    """Arquivos de uma pasta do storage padrão, recursivamente, em ordem"""
+    if not default_storage.exists(pasta):
+        return
+    subpastas, arquivos = default_storage.listdir(pasta)
+    for nome in sorted(arquivos):
+        yield f'{pasta}/{nome}'
+    for subpasta in sorted(subpastas):
+        yield from _listar(f'{pasta}/{subpasta}')
+
+
+class Command(BaseCommand):
+    help = (
+        'Reprocessa em paralelo os derivados das imagens de produtos/ e perfil/. '
+        'Arquivos já em dia (mesmo hash e mesma versão) são pulados; '
+        'pode ser interrompido e executado de novo para continuar.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processos', type=int, default=os.cpu_count() or 1,
+            help='Processos que decodificam e redimensionam (padrão: número de CPUs)'
+        )
+        parser.add_argument(
+            '--pasta', choices=sorted(PASTAS), action='append',
+            help='Processa só esta pasta (pode repetir; padrão: todas)'
+        )
+        parser.add_argument(
+            '--forcar', action='store_true',
+            help='Regrava os derivados mesmo que estejam em dia'
+        )
+
+    def handle(self, *args, **options):
+        self.forcar = options['forcar']
+        self.totais = defaultdict(int)
+        self.produtos_alterados = set()
+        self.inicio = time.monotonic()
+
+        tarefas = []
+        for pasta in options['pasta'] or sorted(PASTAS):
+            conjunto, registros = PASTAS[pasta]
+            por_nome = self._registros_por_nome(registros)
+            for nome in _listar(pasta):
+                if nome in por_nome:
+                    tarefas.append((nome, conjunto, por_nome[nome]))
+                else:
+                    self.totais['sem_registro'] += 1
+
+        self.stdout.write(f'{len(tarefas)} arquivo(s) a verificar com {options["processos"]} processo(s).')
+        try:
+            self._executar(tarefas, options['processos'])
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('Interrompido: execute de novo para continuar.'))
+        finally:
+            self._sincronizar_catalogo()
+        self._relatorio()
+
+    def _registros_por_nome(self, registros):
+        """Nome do arquivo -> [(modelo, pk, campo dos derivados, derivados atuais)]"""
+        por_nome = defaultdict(list)
+        for modelo, campo, campo_derivados in registros:
+            linhas = modelo.objects.exclude(**{campo: ''}).exclude(**{f'{campo}__isnull': True})
+            for pk, nome, derivados in linhas.values_list('pk', campo, campo_derivados).iterator():
+                por_nome[nome].append((modelo, pk, campo_derivados, derivados))
+        return por_nome
+
+    def _executar(self, tarefas, processos):
+        janela = max(processos, 1) * 4  # limita os arquivos em voo
+        with ProcessPoolExecutor(max_workers=processos, initializer=_iniciar_processo) as executor:
+            pendentes = {}
+            try:
+                for nome, conjunto, registros in tarefas:
+                    if len(pendentes) >= janela:
+                        self._colher(pendentes)
+                    # Cada registro tem os seus derivados: um só em dia não basta
+                    atuais = []
+                    for _, _, _, derivados in registros:
+                        if derivados not in atuais:
+                            atuais.append(derivados)
+                    futuro = executor.submit(images.processar_arquivo, nome, conjunto, atuais, self.forcar)
+                    pendentes[futuro] = (nome, registros)
+                while pendentes:
+                    self._colher(pendentes)
+            except BaseException:
+                executor.shutdown(wait=True, cancel_futures=True)
+                raise
+
+    def _colher(self, pendentes):
+        """Grava os resultados prontos (cada um na hora: a execução pode ser retomada)"""
+        prontos, _ = wait(pendentes, return_when=FIRST_COMPLETED)
+        for futuro in prontos:
+            nome, registros = pendentes.pop(futuro)
+            try:
+                dados, tamanho = futuro.result()
+            except Exception as erro:
+                self.totais['falhas'] += 1
+                self.stderr.write(f'{nome}: {erro}')
+                continue
+
+            self.totais['arquivos'] += 1
+            self.totais['bytes'] += tamanho
+            if dados is None:
+                self.totais['em_dia'] += 1
+            else:
+                self.totais['processados'] += 1
+                self._gravar(registros, dados)
+            if self.totais['arquivos'] % PROGRESSO_A_CADA == 0:
+                self._progresso()
+
+    def _gravar(self, registros, dados):
+        for modelo, pk, campo_derivados, derivados in registros:
+            if derivados == dados:
+                continue
+            modelo.objects.filter(pk=pk).update(**{campo_derivados: dados})
+            if modelo is Produto:
+                self.produtos_alterados.add(pk)
+        if len(self.produtos_alterados) >= PRODUTOS_POR_SINCRONIZACAO:
+            self._sincronizar_catalogo()
+
+    def _sincronizar_catalogo(self):
+        if self.produtos_alterados:
+            read_model.sincronizar(self.produtos_alterados)
+            incrementar_geracao()
+            self.produtos_alterados = set()
+
+    def _progresso(self):
+        decorrido = time.monotonic() - self.inicio
+        self.stdout.write(
+            f'{self.totais["arquivos"]} arquivo(s), {self.totais["processados"]} processado(s), '
+            f'{self.totais["arquivos"] / decorrido:.1f} arquivo(s)/s'
+        )
+
+    def _relatorio(self):
+        decorrido = max(time.monotonic() - self.inicio, 1e-6)
+        megabytes = self.totais['bytes'] / (1024 * 1024)
+        self.stdout.write(self.style.SUCCESS(
+            f'{self.totais["processados"]} processado(s), {self.totais["em_dia"]} já em dia, '
+            f'{self.totais["falhas"]} falha(s), {self.totais["sem_registro"]} sem registro no banco '
+            f'em {decorrido:.1f}s ({self.totais["arquivos"] / decorrido:.1f} arquivo(s)/s, '
+            f'{megabytes / decorrido:.1f} MB/s).'
+        ))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from app.catalog_cache import incrementar_geracao
+from app.counters import recalcular_contadores
+
+
+class Command(BaseCommand):
+    help = 'Recalcula em lote os contadores de produtos de cada categoria'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'categorias', nargs='*', type=int,
+            help='IDs das categorias (padrão: todas)'
+        )
+
+    def handle(self, *args, **options):
+        total = recalcular_contadores(options['categorias'] or None)
+        incrementar_geracao()
+        self.stdout.write(self.style.SUCCESS(f'{total} categoria(s) recalculada(s).'))
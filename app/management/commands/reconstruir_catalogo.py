@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from app.catalog_cache import incrementar_geracao
+from app.read_model import reconstruir
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói do zero a tabela de leitura do catálogo (ProdutoCatalogo)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lote', type=int, default=1000,
+            help='Quantidade de produtos gravados por lote (padrão: 1000)'
+        )
+
+    def handle(self, *args, **options):
+        total = reconstruir(tamanho_lote=options['lote'])
+        incrementar_geracao()
+        self.stdout.write(self.style.SUCCESS(f'{total} produto(s) gravado(s) no catálogo.'))
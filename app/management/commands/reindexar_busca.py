@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from app.catalog_cache import incrementar_geracao
+from app.search import obter_backend, reconstruir_indice
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói do zero o índice de busca textual dos produtos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lote', type=int, default=1000,
+            help='Quantidade de produtos indexados por lote (padrão: 1000)'
+        )
+
+    def handle(self, *args, **options):
+        if obter_backend() is None:
+            self.stdout.write(self.style.WARNING(
+                'Banco de dados sem suporte a busca textual; nada a fazer.'
+            ))
+            return
+
+        total = reconstruir_indice(tamanho_lote=options['lote'])
+        # Resultados de busca em cache (por geração) foram calculados com o índice antigo
+        incrementar_geracao()
+        self.stdout.write(self.style.SUCCESS(f'{total} produto(s) indexado(s).'))
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+
+from app import search_log
+
+
+class Command(BaseCommand):
+    help = 'Mostra as buscas mais feitas, as sem resultado e as mais lentas do catálogo'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias', type=int, default=7,
+            help='Período do relatório, em dias (padrão: 7)'
+        )
+        parser.add_argument(
+            '--limite', type=int, default=20,
+            help='Termos por seção (padrão: 20)'
+        )
+
+    def handle(self, *args, **options):
+        search_log.consolidar()
+        dias, limite = options['dias'], options['limite']
+
+        self._secao(f'Mais buscadas ({dias} dia(s))', [
+            f'{linha["total"]:>7}  {linha["termo"]}  ({linha["zeradas"]} sem resultado, '
+            f'{linha["latencia_media_ms"]:.0f} ms em média)'
+            for linha in search_log.mais_buscadas(dias, limite)
+        ])
+        self._secao('Sem resultado', [
+            f'{linha["zeradas"]:>7}  {linha["termo"]}  (de {linha["total"]} busca(s))'
+            for linha in search_log.sem_resultado(dias, limite)
+        ])
+        self._secao('Mais lentas', [
+            f'{linha["latencia_media_ms"]:>7.0f}  {linha["termo"]}  (máxima {linha["latencia_maxima_ms"]} ms, '
+            f'{linha["lentas"]} de {linha["total"]} acima do limite)'
+            for linha in search_log.mais_lentas(dias, limite)
+        ])
+
+    def _secao(self, titulo, linhas):
+        self.stdout.write(self.style.MIGRATE_HEADING(titulo))
+        for linha in linhas or ['      -  nenhuma busca no período']:
+            self.stdout.write(linha)
+        self.stdout.write('')
@@ -0,0 +1,35 @@
+from django.db import migrations
+
+
+def criar_indice(apps, schema_editor):
+    from app.search import obter_backend, indexar_produtos
+
+    backend = obter_backend(schema_editor.connection)
+    if backend is None:
+        return
+    with schema_editor.connection.cursor() as cursor:
+        backend.criar(cursor)
+
+    Produto = apps.get_model('app', 'Produto')
+    indexar_produtos(Produto.objects.only('id', 'nome', 'descricao'))
+
+
+def remover_indice(apps, schema_editor):
+    from app.search import obter_backend
+
+    backend = obter_backend(schema_editor.connection)
+    if backend is None:
+        return
+    with schema_editor.connection.cursor() as cursor:
+        backend.remover_tabela(cursor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0005_cliente_atualizado_em_cliente_criado_em_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(criar_indice, remover_indice),
+    ]
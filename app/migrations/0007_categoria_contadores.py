@@ -0,0 +1,44 @@
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def preencher_contadores(apps, schema_editor):
+    Categoria = apps.get_model('app', 'Categoria')
+    Produto = apps.get_model('app', 'Produto')
+
+    def contagem(**filtros):
+        subquery = (
+            Produto.objects.filter(categoria=OuterRef('pk'), ativo=True, **filtros)
+            .order_by()
+            .values('categoria')
+            .annotate(total=Count('id'))
+            .values('total')
+        )
+        return Coalesce(Subquery(subquery, output_field=IntegerField()), Value(0))
+
+    Categoria.objects.update(
+        qtd_produtos_ativos=contagem(),
+        qtd_produtos_em_estoque=contagem(estoque__gt=0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0006_indice_busca_produto'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='categoria',
+            name='qtd_produtos_ativos',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='categoria',
+            name='qtd_produtos_em_estoque',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(preencher_contadores, migrations.RunPython.noop),
+    ]
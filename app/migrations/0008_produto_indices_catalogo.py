@@ -0,0 +1,21 @@
+# Generated by Django 5.2.8 on 2026-10-18 08:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0007_categoria_contadores'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='produto',
+            index=models.Index(fields=['ativo', '-em_destaque', '-criado_em', 'id'], name='produto_catalogo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='produto',
+            index=models.Index(fields=['categoria', 'ativo', '-em_destaque', '-criado_em', 'id'], name='produto_cat_catalogo_idx'),
+        ),
+    ]
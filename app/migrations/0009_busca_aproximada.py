@@ -0,0 +1,32 @@
+from django.db import migrations
+
+
+def criar_busca_aproximada(apps, schema_editor):
+    from app.search import obter_backend
+
+    backend = obter_backend(schema_editor.connection)
+    if backend is None:
+        return
+    with schema_editor.connection.cursor() as cursor:
+        backend.criar_aproximada(cursor)
+
+
+def remover_busca_aproximada(apps, schema_editor):
+    from app.search import obter_backend
+
+    backend = obter_backend(schema_editor.connection)
+    if backend is None:
+        return
+    with schema_editor.connection.cursor() as cursor:
+        backend.remover_aproximada(cursor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0008_produto_indices_catalogo'),
+    ]
+
+    operations = [
+        migrations.RunPython(criar_busca_aproximada, remover_busca_aproximada),
+    ]
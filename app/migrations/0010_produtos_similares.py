@@ -0,0 +1,42 @@
+# Generated by Django 5.2.8 on 2026-10-18 08:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0009_busca_aproximada'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstadoSimilaridade',
+            fields=[
+                ('produto', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='estado_similaridade', serialize=False, to='app.produto')),
+                ('hash_texto', models.CharField(max_length=32)),
+                ('calculado_em', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Estado de Similaridade',
+                'verbose_name_plural': 'Estados de Similaridade',
+            },
+        ),
+        migrations.CreateModel(
+            name='ProdutoSimilar',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pontuacao', models.FloatField()),
+                ('produto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similares', to='app.produto')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_de', to='app.produto')),
+            ],
+            options={
+                'verbose_name': 'Produto Similar',
+                'verbose_name_plural': 'Produtos Similares',
+                'ordering': ['produto', '-pontuacao'],
+                'indexes': [models.Index(fields=['produto', '-pontuacao'], name='produto_similar_idx')],
+                'unique_together': {('produto', 'similar')},
+            },
+        ),
+    ]
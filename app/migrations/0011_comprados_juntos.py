@@ -0,0 +1,57 @@
+# Generated by Django 5.2.8 on 2026-10-18 08:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0010_produtos_similares'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstadoCompradosJuntos',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('processado_ate', models.DateTimeField(blank=True, null=True)),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Estado de Comprados Juntos',
+                'verbose_name_plural': 'Estado de Comprados Juntos',
+            },
+        ),
+        migrations.CreateModel(
+            name='CoocorrenciaProduto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pedidos', models.PositiveIntegerField(default=0)),
+                ('produto_a', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app.produto')),
+                ('produto_b', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app.produto')),
+            ],
+            options={
+                'verbose_name': 'Coocorrência de Produtos',
+                'verbose_name_plural': 'Coocorrências de Produtos',
+                'unique_together': {('produto_a', 'produto_b')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ProdutoCompradoJunto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pontuacao', models.FloatField()),
+                ('pedidos', models.PositiveIntegerField()),
+                ('produto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='comprados_juntos', to='app.produto')),
+                ('recomendado', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='comprado_junto_de', to='app.produto')),
+            ],
+            options={
+                'verbose_name': 'Produto Comprado Junto',
+                'verbose_name_plural': 'Produtos Comprados Juntos',
+                'ordering': ['produto', '-pontuacao'],
+                'indexes': [models.Index(fields=['produto', '-pontuacao'], name='produto_comprado_junto_idx')],
+                'unique_together': {('produto', 'recomendado')},
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.8 on 2026-10-18 08:57
+
+import django.db.models.expressions
+import django.db.models.functions.comparison
+import django.db.models.functions.math
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0011_comprados_juntos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='produto',
+            name='desconto_pct',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(preco_promocional__gt=0, preco_promocional__lt=models.F('preco'), then=django.db.models.functions.comparison.Cast(django.db.models.functions.math.Round(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Cast(django.db.models.expressions.CombinedExpression(models.F('preco'), '-', models.F('preco_promocional')), models.FloatField()), '*', models.Value(100)), '/', django.db.models.functions.comparison.Cast('preco', models.FloatField()))), models.IntegerField())), default=models.Value(0)), output_field=models.IntegerField()),
+        ),
+        migrations.AddField(
+            model_name='produto',
+            name='preco_efetivo',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(preco_promocional__gt=0, then=models.F('preco_promocional')), default=models.F('preco')), output_field=models.DecimalField(decimal_places=2, max_digits=10)),
+        ),
+        migrations.AddIndex(
+            model_name='produto',
+            index=models.Index(fields=['ativo', 'preco_efetivo', 'id'], name='produto_preco_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='produto',
+            index=models.Index(fields=['categoria', 'ativo', 'preco_efetivo', 'id'], name='produto_cat_preco_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='produto',
+            index=models.Index(fields=['ativo', 'desconto_pct', 'id'], name='produto_desconto_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='produto',
+            index=models.Index(fields=['categoria', 'ativo', 'desconto_pct', 'id'], name='produto_cat_desconto_idx'),
+        ),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 5.2.8 on 2026-10-18 08:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+from django.utils.text import Truncator
+
+
+def preencher_catalogo(apps, schema_editor):
+    Produto = apps.get_model('app', 'Produto')
+    ProdutoCatalogo = apps.get_model('app', 'ProdutoCatalogo')
+
+    agora = timezone.now()
+    lote = []
+    for p in Produto.objects.select_related('categoria').order_by('id').iterator(chunk_size=1000):
+        if p.estoque <= 0:
+            situacao = 'esgotado'
+        elif p.estoque <= p.estoque_minimo:
+            situacao = 'baixo'
+        else:
+            situacao = 'disponivel'
+        lote.append(ProdutoCatalogo(
+            id=p.id,
+            categoria_id=p.categoria_id,
+            categoria_nome=p.categoria.nome,
+            categoria_ativa=p.categoria.ativa,
+            nome=p.nome,
+            resumo=Truncator(' '.join((p.descricao or '').split())).chars(160),
+            preco=p.preco,
+            preco_promocional=p.preco_promocional,
+            preco_efetivo=p.preco_efetivo,  # colunas geradas (0012): mesmo arredondamento
+            desconto_pct=p.desconto_pct,
+            estoque=p.estoque,
+            situacao_estoque=situacao,
+            foto_url=p.foto.url if p.foto else '',
+            em_destaque=p.em_destaque,
+            forma_pagamento=p.forma_pagamento,
+            ativo=p.ativo,
+            criado_em=p.criado_em,
+            atualizado_em=agora,
+        ))
+        if len(lote) >= 1000:
+            ProdutoCatalogo.objects.bulk_create(lote)
+            lote = []
+    ProdutoCatalogo.objects.bulk_create(lote)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0012_produto_preco_efetivo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProdutoCatalogo',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('categoria_nome', models.CharField(max_length=100)),
+                ('categoria_ativa', models.BooleanField(default=True)),
+                ('nome', models.CharField(max_length=200)),
+                ('resumo', models.CharField(blank=True, max_length=200)),
+                ('preco', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('preco_promocional', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('preco_efetivo', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('desconto_pct', models.IntegerField(default=0)),
+                ('estoque', models.IntegerField(default=0)),
+                ('situacao_estoque', models.CharField(choices=[('disponivel', 'Disponível'), ('baixo', 'Estoque baixo'), ('esgotado', 'Esgotado')], max_length=10)),
+                ('foto_url', models.CharField(blank=True, max_length=500)),
+                ('em_destaque', models.BooleanField(default=False)),
+                ('forma_pagamento', models.CharField(choices=[('vista', 'À Vista'), ('parcelado', 'Parcelado'), ('ambos', 'Ambos')], max_length=10)),
+                ('ativo', models.BooleanField(default=True)),
+                ('criado_em', models.DateTimeField()),
+                ('atualizado_em', models.DateTimeField()),
+                ('categoria', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='app.categoria')),
+            ],
+            options={
+                'verbose_name': 'Produto (catálogo)',
+                'verbose_name_plural': 'Produtos (catálogo)',
+                'indexes': [models.Index(fields=['ativo', '-em_destaque', '-criado_em', 'id'], name='catalogo_destaque_idx'), models.Index(fields=['categoria', 'ativo', '-em_destaque', '-criado_em', 'id'], name='catalogo_cat_destaque_idx'), models.Index(fields=['ativo', 'preco_efetivo', 'id'], name='catalogo_preco_idx'), models.Index(fields=['categoria', 'ativo', 'preco_efetivo', 'id'], name='catalogo_cat_preco_idx'), models.Index(fields=['ativo', 'desconto_pct', 'id'], name='catalogo_desconto_idx'), models.Index(fields=['categoria', 'ativo', 'desconto_pct', 'id'], name='catalogo_cat_desconto_idx')],
+            },
+        ),
+        migrations.RunPython(preencher_catalogo, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:05
+
+import html
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.utils.html import strip_tags
+from django.utils.text import Truncator
+
+
+def preencher_resumos(apps, schema_editor):
+    Produto = apps.get_model('app', 'Produto')
+    ProdutoCatalogo = apps.get_model('app', 'ProdutoCatalogo')
+
+    lote = []
+    for produto in Produto.objects.only('id', 'descricao').order_by('id').iterator(chunk_size=1000):
+        texto = html.unescape(strip_tags(produto.descricao or ''))
+        produto.resumo = Truncator(' '.join(texto.split())).chars(160)
+        lote.append(produto)
+        if len(lote) >= 1000:
+            Produto.objects.bulk_update(lote, ['resumo'])
+            lote = []
+    Produto.objects.bulk_update(lote, ['resumo'])
+
+    # Modelo de leitura passa a copiar o resumo do produto
+    ProdutoCatalogo.objects.update(
+        resumo=Subquery(Produto.objects.filter(id=OuterRef('id')).values('resumo')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0013_produto_catalogo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='produto',
+            name='resumo',
+            field=models.CharField(blank=True, editable=False, max_length=200),
+        ),
+        migrations.RunPython(preencher_resumos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0014_produto_resumo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imagemproduto',
+            name='derivados',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='produto',
+            name='foto_derivados',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='produtocatalogo',
+            name='foto_derivados',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
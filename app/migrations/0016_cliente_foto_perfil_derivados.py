@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0015_derivados_imagens'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cliente',
+            name='foto_perfil_derivados',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:14
+
+import app.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0016_cliente_foto_perfil_derivados'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='imagemproduto',
+            name='imagem',
+            field=models.ImageField(storage=app.storage.ArmazenamentoPorConteudo(), upload_to='produtos/'),
+        ),
+        migrations.AlterField(
+            model_name='produto',
+            name='foto',
+            field=models.ImageField(blank=True, null=True, storage=app.storage.ArmazenamentoPorConteudo(), upload_to='produtos/'),
+        ),
+    ]
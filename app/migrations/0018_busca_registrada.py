@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0017_armazenamento_por_conteudo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BuscaRegistrada',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('termo', models.CharField(max_length=200)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('categoria', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='app.categoria')),
+            ],
+            options={
+                'verbose_name': 'Busca Registrada',
+                'verbose_name_plural': 'Buscas Registradas',
+                'indexes': [models.Index(fields=['criado_em', 'termo'], name='busca_registrada_idx')],
+            },
+        ),
+    ]
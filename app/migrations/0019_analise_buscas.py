@@ -0,0 +1,73 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:25
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0018_busca_registrada'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstadoBuscas',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('consolidado_ate', models.BigIntegerField(default=0)),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Estado das Buscas',
+                'verbose_name_plural': 'Estado das Buscas',
+            },
+        ),
+        migrations.AddField(
+            model_name='buscaregistrada',
+            name='filtros',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='buscaregistrada',
+            name='latencia_ms',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='buscaregistrada',
+            name='resultados',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='buscaregistrada',
+            name='categoria',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='app.categoria'),
+        ),
+        migrations.AlterField(
+            model_name='buscaregistrada',
+            name='criado_em',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.CreateModel(
+            name='BuscaDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField()),
+                ('termo', models.CharField(max_length=200)),
+                ('categoria_id', models.BigIntegerField(blank=True, null=True)),
+                ('buscas', models.PositiveIntegerField(default=0)),
+                ('sem_resultado', models.PositiveIntegerField(default=0)),
+                ('lentas', models.PositiveIntegerField(default=0)),
+                ('latencia_total_ms', models.PositiveBigIntegerField(default=0)),
+                ('latencia_maxima_ms', models.PositiveIntegerField(default=0)),
+                ('resultados', models.PositiveIntegerField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Buscas do Dia',
+                'verbose_name_plural': 'Buscas por Dia',
+                'indexes': [models.Index(fields=['dia', 'termo'], name='busca_diaria_idx')],
+                'unique_together': {('dia', 'termo', 'categoria_id')},
+            },
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0019_analise_buscas'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='produtocatalogo',
+            name='catalogo_destaque_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='produtocatalogo',
+            name='catalogo_cat_destaque_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='produtocatalogo',
+            name='catalogo_preco_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='produtocatalogo',
+            name='catalogo_cat_preco_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='produtocatalogo',
+            name='catalogo_desconto_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='produtocatalogo',
+            name='catalogo_cat_desconto_idx',
+        ),
+        migrations.AddIndex(
+            model_name='produtocatalogo',
+            index=models.Index(condition=models.Q(('ativo', True), ('categoria_ativa', True)), fields=['-em_destaque', '-criado_em', 'id'], name='catalogo_destaque_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='produtocatalogo',
+            index=models.Index(condition=models.Q(('ativo', True), ('categoria_ativa', True)), fields=['categoria', '-em_destaque', '-criado_em', 'id'], name='catalogo_cat_destaque_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='produtocatalogo',
+            index=models.Index(condition=models.Q(('ativo', True), ('categoria_ativa', True)), fields=['preco_efetivo', 'id'], name='catalogo_preco_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='produtocatalogo',
+            index=models.Index(condition=models.Q(('ativo', True), ('categoria_ativa', True)), fields=['categoria', 'preco_efetivo', 'id'], name='catalogo_cat_preco_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='produtocatalogo',
+            index=models.Index(condition=models.Q(('ativo', True), ('categoria_ativa', True)), fields=['-desconto_pct', '-id'], name='catalogo_desconto_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='produtocatalogo',
+            index=models.Index(condition=models.Q(('ativo', True), ('categoria_ativa', True)), fields=['categoria', '-desconto_pct', '-id'], name='catalogo_cat_desconto_idx'),
+        ),
+    ]
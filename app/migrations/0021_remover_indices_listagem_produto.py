@@ -0,0 +1,37 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:45
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0020_indices_parciais_catalogo'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='produto',
+            name='produto_catalogo_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='produto',
+            name='produto_cat_catalogo_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='produto',
+            name='produto_preco_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='produto',
+            name='produto_cat_preco_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='produto',
+            name='produto_desconto_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='produto',
+            name='produto_cat_desconto_idx',
+        ),
+    ]
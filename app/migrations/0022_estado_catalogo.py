@@ -0,0 +1,25 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0021_remover_indices_listagem_produto'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstadoCatalogo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('geracao', models.BigIntegerField(default=0)),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Estado do Catálogo',
+                'verbose_name_plural': 'Estado do Catálogo',
+            },
+        ),
+    ]
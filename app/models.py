@@ -1,5 +1,17 @@
-from django.db import models
+import html
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import models, transaction
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.functions import Cast, Round
 from django.contrib.auth.models import AbstractUser
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from django.utils.html import strip_tags
+from django.utils.text import Truncator
+
+from . import images
+from .storage import ArmazenamentoPorConteudo
 
 # ==========================
 # MODELOS DE USUÁRIO
@@ -12,17 +24,61 @@ class Cliente(AbstractUser):
     )
     tipo_cliente = models.CharField(max_length=2, choices=TIPO_CLIENTE, default='pf')
     foto_perfil = models.ImageField(upload_to='perfil/', blank=True, null=True, help_text='Foto de perfil do usuário (máx 5MB)')
+    # Avatares quadrados (conjunto 'avatar' de app.images)
+    foto_perfil_derivados = models.JSONField(default=dict, blank=True, editable=False)
     criado_em = models.DateTimeField(auto_now_add=True, null=True)
     atualizado_em = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.username} ({self.get_tipo_cliente_display()})"
 
-    def obter_foto_perfil(self):
-        """Retorna URL da foto de perfil ou imagem padrão"""
-        if self.foto_perfil:
-            return self.foto_perfil.url
-        return '/static/images/default_avatar.png'
+    @property
+    def fotos(self):
+        """Avatares para os templates (``usuario.fotos.medio.webp``)"""
+        return images.Derivados(
+            self.foto_perfil_derivados, default_storage,
+            self.foto_perfil.url if self.foto_perfil else '', conjunto='avatar',
+        )
+
+    def save(self, *args, **kwargs):
+        nova_foto = bool(self.foto_perfil) and not self.foto_perfil._committed
+        removida = not self.foto_perfil and bool(self.foto_perfil_derivados)
+        # Arquivos da foto que está no banco, apagados depois do commit
+        anteriores = self._arquivos_da_foto_gravada() if (nova_foto or removida) and self.pk else []
+        if nova_foto or not self.foto_perfil:
+            self.foto_perfil_derivados = {}
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'foto_perfil' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'foto_perfil_derivados'}
+        super().save(*args, **kwargs)
+        if nova_foto:
+            from .avatars import agendar_normalizacao
+            agendar_normalizacao(self.pk, self.foto_perfil.name, anteriores)
+        elif anteriores:
+            from .avatars import apagar_sem_uso
+            transaction.on_commit(lambda: apagar_sem_uso(anteriores))
+
+    def _arquivos_da_foto_gravada(self):
+        gravada = Cliente.objects.filter(pk=self.pk).values_list('foto_perfil', 'foto_perfil_derivados').first()
+        if not gravada or not gravada[0]:
+            return []
+        nome, derivados = gravada
+        return [nome, *images.nomes_derivados(derivados)]
+
+    def obter_foto_perfil(self, tamanho='medio'):
+        """
+        URL do avatar no tamanho pedido, ou imagem padrão.
+
+        Args:
+            tamanho: nome em ``images.TAMANHOS_AVATAR`` ou lado em pixels
+                (usa o menor avatar que o cubra)
+        """
+        if not self.foto_perfil:
+            return '/static/images/default_avatar.png'
+        if not isinstance(tamanho, str):
+            lados = sorted(images.TAMANHOS_AVATAR.items(), key=lambda item: item[1])
+            tamanho = next((nome for nome, lado in lados if lado >= tamanho), lados[-1][0])
+        return self.fotos[tamanho]['jpeg']
 
 
 class PessoaFisica(models.Model):
@@ -80,6 +136,9 @@ class Categoria(models.Model):
     descricao = models.TextField(blank=True, null=True)
     ativa = models.BooleanField(default=True, db_index=True)
     ordem = models.IntegerField(default=0)  # Para ordenar as categorias
+    # Contadores desnormalizados, mantidos por app.counters
+    qtd_produtos_ativos = models.IntegerField(default=0, editable=False)
+    qtd_produtos_em_estoque = models.IntegerField(default=0, editable=False)
     criado_em = models.DateTimeField(auto_now_add=True)
     atualizado_em = models.DateTimeField(auto_now=True)
 
@@ -91,11 +150,23 @@ class Categoria(models.Model):
     def __str__(self):
         return self.nome
 
+    CAMPOS_CONTADORES = ('qtd_produtos_ativos', 'qtd_produtos_em_estoque')
+
+    def save(self, *args, **kwargs):
+        # Os contadores só mudam por F() (app.counters): o save() de uma instância
+        # carregada antes de uma escrita em Produto não pode voltá-los ao valor antigo
+        if not self._state.adding and not kwargs.get('force_insert') and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                campo.name for campo in self._meta.concrete_fields
+                if not campo.primary_key and campo.name not in self.CAMPOS_CONTADORES
+            ]
+        super().save(*args, **kwargs)
+
     def total_produtos(self):
-        return self.produtos.filter(ativo=True).count()
+        return self.qtd_produtos_ativos
 
     def produtos_em_estoque(self):
-        return self.produtos.filter(ativo=True, estoque__gt=0).count()
+        return self.qtd_produtos_em_estoque
 
 
 class Produto(models.Model):
@@ -112,14 +183,46 @@ class Produto(models.Model):
     preco_promocional = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
     estoque = models.IntegerField(default=0)
     estoque_minimo = models.IntegerField(default=5)
-    foto = models.ImageField(upload_to='produtos/', blank=True, null=True)
+    foto = models.ImageField(upload_to='produtos/', storage=ArmazenamentoPorConteudo(), blank=True, null=True)
+    # Tamanhos redimensionados da foto (ver app.images), gerados no save()
+    foto_derivados = models.JSONField(default=dict, blank=True, editable=False)
     em_destaque = models.BooleanField(default=False, db_index=True)
     forma_pagamento = models.CharField(max_length=10, choices=FORMA_PAGAMENTO, default='ambos')
     ativo = models.BooleanField(default=True, db_index=True)
+    # Início da descrição em texto puro, gerado no save(); listagens leem só ele
+    resumo = models.CharField(max_length=200, blank=True, editable=False)
     criado_em = models.DateTimeField(auto_now_add=True)
     atualizado_em = models.DateTimeField(auto_now=True)
+    # Colunas geradas pelo banco (mesmas regras de preco_final e porcentagem_desconto),
+    # sempre em sincronia, inclusive em queryset.update(). Após save(), use refresh_from_db().
+    preco_efetivo = models.GeneratedField(
+        expression=Case(
+            When(preco_promocional__gt=0, then=F('preco_promocional')),
+            default=F('preco'),
+        ),
+        output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        db_persist=True,
+    )
+    desconto_pct = models.GeneratedField(
+        expression=Case(
+            When(
+                preco_promocional__gt=0, preco_promocional__lt=F('preco'),
+                then=Cast(
+                    Round(
+                        Cast(F('preco') - F('preco_promocional'), models.FloatField()) * 100
+                        / Cast('preco', models.FloatField())
+                    ),
+                    models.IntegerField(),
+                ),
+            ),
+            default=Value(0),
+        ),
+        output_field=models.IntegerField(),
+        db_persist=True,
+    )
 
     class Meta:
+        # Sem índices de listagem: o catálogo e a API leem ProdutoCatalogo
         ordering = ['-em_destaque', '-criado_em']
         verbose_name = 'Produto'
         verbose_name_plural = 'Produtos'
@@ -127,6 +230,38 @@ class Produto(models.Model):
     def __str__(self):
         return f"{self.nome} - {self.categoria.nome}"
 
+    TAMANHO_RESUMO = 160
+
+    # Colunas carregadas por listagens (cards, relacionados, recomendações)
+    CAMPOS_LISTAGEM = (
+        'id', 'categoria', 'nome', 'resumo', 'preco', 'preco_promocional',
+        'estoque', 'estoque_minimo', 'em_destaque', 'foto', 'foto_derivados', 'ativo',
+    )
+
+    def save(self, *args, **kwargs):
+        self.resumo = self.gerar_resumo(self.descricao)
+        self.foto_derivados = images.atualizar_derivados(self.foto, self.foto_derivados)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            derivados = {'descricao': 'resumo', 'foto': 'foto_derivados'}
+            kwargs['update_fields'] = set(update_fields) | {
+                derivado for campo, derivado in derivados.items() if campo in update_fields
+            }
+        # Produto e contadores da categoria (signals) na mesma transação
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    @classmethod
+    def gerar_resumo(cls, descricao):
+        """Texto puro (sem tags nem entidades) numa linha, cortado em ``TAMANHO_RESUMO``"""
+        texto = html.unescape(strip_tags(descricao or ''))
+        return Truncator(' '.join(texto.split())).chars(cls.TAMANHO_RESUMO)
+
+    @property
+    def fotos(self):
+        """Derivados da foto para os templates (``produto.fotos.card.webp``)"""
+        return images.Derivados(self.foto_derivados, default_storage, self.foto.url if self.foto else '')
+
     def tem_estoque(self):
         return self.estoque > 0
 
@@ -141,7 +276,8 @@ class Produto(models.Model):
     def porcentagem_desconto(self):
         if self.preco_promocional and self.preco_promocional < self.preco:
             desconto = ((self.preco - self.preco_promocional) / self.preco) * 100
-            return round(desconto, 0)
+            # Metade para cima, como o ROUND da coluna gerada desconto_pct
+            return Decimal(str(desconto)).quantize(Decimal('1'), rounding=ROUND_HALF_UP)
         return 0
 
     def disponivel(self):
@@ -150,7 +286,9 @@ class Produto(models.Model):
 
 class ImagemProduto(models.Model):
     produto = models.ForeignKey(Produto, on_delete=models.CASCADE, related_name='imagens_adicionais')
-    imagem = models.ImageField(upload_to='produtos/galeria/')
+    # Mesma pasta de Produto.foto: a mesma foto na galeria e no produto é um arquivo só
+    imagem = models.ImageField(upload_to='produtos/', storage=ArmazenamentoPorConteudo())
+    derivados = models.JSONField(default=dict, blank=True, editable=False)
     ordem = models.IntegerField(default=0)
     criado_em = models.DateTimeField(auto_now_add=True)
 
@@ -162,6 +300,266 @@ class ImagemProduto(models.Model):
     def __str__(self):
         return f"Imagem {self.ordem} - {self.produto.nome}"
 
+    def save(self, *args, **kwargs):
+        self.derivados = images.atualizar_derivados(self.imagem, self.derivados)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'imagem' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'derivados'}
+        super().save(*args, **kwargs)
+
+    @property
+    def fotos(self):
+        return images.Derivados(self.derivados, default_storage, self.imagem.url if self.imagem else '')
+
+
+# Condição de ProdutoCatalogo.visiveis() e dos índices parciais do catálogo
+VISIVEL = Q(ativo=True, categoria_ativa=True)
+
+
+class ProdutoCatalogo(models.Model):
+    """
+    Modelo de leitura do catálogo: uma linha plana por produto com tudo o
+    que o card e a API usam, sem joins. Mantido por app.read_model a partir
+    dos signals de Produto e Categoria; ``reconstruir_catalogo`` refaz tudo.
+    """
+    SITUACAO_ESTOQUE = (
+        ('disponivel', 'Disponível'),
+        ('baixo', 'Estoque baixo'),
+        ('esgotado', 'Esgotado'),
+    )
+
+    id = models.BigIntegerField(primary_key=True)  # mesmo id do Produto
+    categoria = models.ForeignKey(
+        Categoria, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+'
+    )
+    categoria_nome = models.CharField(max_length=100)
+    categoria_ativa = models.BooleanField(default=True)
+    nome = models.CharField(max_length=200)
+    resumo = models.CharField(max_length=200, blank=True)
+    preco = models.DecimalField(max_digits=10, decimal_places=2)
+    preco_promocional = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    preco_efetivo = models.DecimalField(max_digits=10, decimal_places=2)
+    desconto_pct = models.IntegerField(default=0)
+    estoque = models.IntegerField(default=0)
+    situacao_estoque = models.CharField(max_length=10, choices=SITUACAO_ESTOQUE)
+    foto_url = models.CharField(max_length=500, blank=True)
+    foto_derivados = models.JSONField(default=dict, blank=True)
+    em_destaque = models.BooleanField(default=False)
+    forma_pagamento = models.CharField(max_length=10, choices=Produto.FORMA_PAGAMENTO)
+    ativo = models.BooleanField(default=True)
+    criado_em = models.DateTimeField()
+    atualizado_em = models.DateTimeField()  # última vez que a linha foi regravada
+
+    class Meta:
+        # Paginação por cursor (app.views.ORDENACAO_CATALOGO e ORDENACOES): índices
+        # parciais só com as linhas de ``visiveis()``, na direção de cada ordenação.
+        # 'maior_preco' (-preco_efetivo, -id) lê o índice de preço de trás para frente.
+        indexes = [
+            models.Index(
+                fields=['-em_destaque', '-criado_em', 'id'], condition=VISIVEL, name='catalogo_destaque_idx'
+            ),
+            models.Index(
+                fields=['categoria', '-em_destaque', '-criado_em', 'id'], condition=VISIVEL,
+                name='catalogo_cat_destaque_idx',
+            ),
+            models.Index(fields=['preco_efetivo', 'id'], condition=VISIVEL, name='catalogo_preco_idx'),
+            models.Index(
+                fields=['categoria', 'preco_efetivo', 'id'], condition=VISIVEL, name='catalogo_cat_preco_idx'
+            ),
+            models.Index(fields=['-desconto_pct', '-id'], condition=VISIVEL, name='catalogo_desconto_idx'),
+            models.Index(
+                fields=['categoria', '-desconto_pct', '-id'], condition=VISIVEL, name='catalogo_cat_desconto_idx'
+            ),
+        ]
+        verbose_name = 'Produto (catálogo)'
+        verbose_name_plural = 'Produtos (catálogo)'
+
+    def __str__(self):
+        return f"{self.nome} - {self.categoria_nome}"
+
+    @classmethod
+    def visiveis(cls):
+        """Produtos que aparecem no catálogo e na API: ativos e de categoria ativa"""
+        return cls.objects.filter(VISIVEL)
+
+    @property
+    def em_estoque(self):
+        return self.situacao_estoque != 'esgotado'
+
+    @property
+    def fotos(self):
+        return images.Derivados(self.foto_derivados, default_storage, self.foto_url)
+
+
+class EstadoCatalogo(models.Model):
+    """Geração do cache do catálogo (linha única, compartilhada entre processos; ver app.catalog_cache)"""
+    geracao = models.BigIntegerField(default=0)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Estado do Catálogo'
+        verbose_name_plural = 'Estado do Catálogo'
+
+    def __str__(self):
+        return f"Geração {self.geracao}"
+
+
+class ProdutoSimilar(models.Model):
+    """Vizinhos mais próximos de cada produto por TF-IDF (calculado por app.similarity)"""
+    produto = models.ForeignKey(Produto, on_delete=models.CASCADE, related_name='similares')
+    similar = models.ForeignKey(Produto, on_delete=models.CASCADE, related_name='similar_de')
+    pontuacao = models.FloatField()
+
+    class Meta:
+        ordering = ['produto', '-pontuacao']
+        unique_together = ['produto', 'similar']
+        indexes = [
+            models.Index(fields=['produto', '-pontuacao'], name='produto_similar_idx'),
+        ]
+        verbose_name = 'Produto Similar'
+        verbose_name_plural = 'Produtos Similares'
+
+    def __str__(self):
+        return f"{self.produto_id} ~ {self.similar_id} ({self.pontuacao:.3f})"
+
+
+class EstadoSimilaridade(models.Model):
+    """Hash do texto usado no último cálculo de similares, para o cálculo incremental"""
+    produto = models.OneToOneField(Produto, on_delete=models.CASCADE, primary_key=True, related_name='estado_similaridade')
+    hash_texto = models.CharField(max_length=32)
+    calculado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Estado de Similaridade'
+        verbose_name_plural = 'Estados de Similaridade'
+
+    def __str__(self):
+        return f"{self.produto_id}: {self.hash_texto}"
+
+
+class CoocorrenciaProduto(models.Model):
+    """
+    Quantos pedidos pagos tiveram os dois produtos juntos (produto_a <= produto_b).
+
+    A diagonal (produto_a == produto_b) guarda em quantos pedidos o produto
+    apareceu. Mantido por app.recommendations.
+    """
+    produto_a = models.ForeignKey(Produto, on_delete=models.CASCADE, related_name='+')
+    produto_b = models.ForeignKey(Produto, on_delete=models.CASCADE, related_name='+')
+    pedidos = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ['produto_a', 'produto_b']
+        verbose_name = 'Coocorrência de Produtos'
+        verbose_name_plural = 'Coocorrências de Produtos'
+
+    def __str__(self):
+        return f"{self.produto_a_id} + {self.produto_b_id}: {self.pedidos}"
+
+
+class ProdutoCompradoJunto(models.Model):
+    """Produtos mais comprados junto de cada produto (Jaccard sobre os pedidos pagos)"""
+    produto = models.ForeignKey(Produto, on_delete=models.CASCADE, related_name='comprados_juntos')
+    recomendado = models.ForeignKey(Produto, on_delete=models.CASCADE, related_name='comprado_junto_de')
+    pontuacao = models.FloatField()
+    pedidos = models.PositiveIntegerField()
+
+    class Meta:
+        ordering = ['produto', '-pontuacao']
+        unique_together = ['produto', 'recomendado']
+        indexes = [
+            models.Index(fields=['produto', '-pontuacao'], name='produto_comprado_junto_idx'),
+        ]
+        verbose_name = 'Produto Comprado Junto'
+        verbose_name_plural = 'Produtos Comprados Juntos'
+
+    def __str__(self):
+        return f"{self.produto_id} -> {self.recomendado_id} ({self.pontuacao:.3f})"
+
+
+class EstadoCompradosJuntos(models.Model):
+    """Marca d'água (Order.created) do último processamento incremental"""
+    processado_ate = models.DateTimeField(null=True, blank=True)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Estado de Comprados Juntos'
+        verbose_name_plural = 'Estado de Comprados Juntos'
+
+    def __str__(self):
+        return f"Processado até {self.processado_ate}"
+
+
+# ==========================
+# HISTÓRICO DE BUSCAS
+# ==========================
+
+class BuscaRegistrada(models.Model):
+    """
+    Uma busca feita no catálogo (termo já normalizado). Gravadas em lote
+    por app.search_log e consolidadas por dia em ``BuscaDiaria``.
+    """
+    termo = models.CharField(max_length=200)
+    categoria = models.ForeignKey(
+        Categoria, on_delete=models.SET_NULL, null=True, blank=True, db_constraint=False, related_name='+'
+    )
+    filtros = models.JSONField(default=dict, blank=True)  # facetas e ordem
+    resultados = models.PositiveIntegerField(null=True, blank=True)  # None: desconhecido (304)
+    latencia_ms = models.PositiveIntegerField(default=0)
+    # Momento da busca (não o da gravação, que é feita depois, em lote)
+    criado_em = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['criado_em', 'termo'], name='busca_registrada_idx'),
+        ]
+        verbose_name = 'Busca Registrada'
+        verbose_name_plural = 'Buscas Registradas'
+
+    def __str__(self):
+        return self.termo
+
+
+class BuscaDiaria(models.Model):
+    """Buscas consolidadas por dia, termo e categoria (``consolidar_buscas``)"""
+    dia = models.DateField()
+    termo = models.CharField(max_length=200)
+    categoria_id = models.BigIntegerField(null=True, blank=True)
+    buscas = models.PositiveIntegerField(default=0)
+    sem_resultado = models.PositiveIntegerField(default=0)
+    lentas = models.PositiveIntegerField(default=0)  # acima de BUSCA_LENTA_MS
+    latencia_total_ms = models.PositiveBigIntegerField(default=0)
+    latencia_maxima_ms = models.PositiveIntegerField(default=0)
+    resultados = models.PositiveIntegerField(null=True, blank=True)  # da busca mais recente com contagem
+
+    class Meta:
+        unique_together = ['dia', 'termo', 'categoria_id']
+        indexes = [
+            models.Index(fields=['dia', 'termo'], name='busca_diaria_idx'),
+        ]
+        verbose_name = 'Buscas do Dia'
+        verbose_name_plural = 'Buscas por Dia'
+
+    def __str__(self):
+        return f"{self.dia} {self.termo}: {self.buscas}"
+
+    @property
+    def latencia_media_ms(self):
+        return self.latencia_total_ms / self.buscas if self.buscas else 0
+
+
+class EstadoBuscas(models.Model):
+    """Marca d'água (maior id de ``BuscaRegistrada`` já consolidado)"""
+    consolidado_ate = models.BigIntegerField(default=0)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Estado das Buscas'
+        verbose_name_plural = 'Estado das Buscas'
+
+    def __str__(self):
+        return f"Consolidado até {self.consolidado_ate}"
+
 
 # ==========================
 # MODELOS DE CARRINHO
@@ -0,0 +1,128 @@
+"""
+Paginação por cursor (keyset) para listagens ordenadas.
+
+Em vez de OFFSET, cada página filtra pelos valores de ordenação do último
+item da página anterior, então a página N custa o mesmo que a primeira
+(desde que exista um índice na mesma ordem). O cursor é assinado com
+``django.core.signing`` e não expõe os valores para o cliente.
+
+Os campos de ordenação não podem ser nulos e o último deve ser único
+(normalmente ``id``). Anotações do queryset também podem ser usadas,
+como a ``relevancia`` da busca.
+"""
+
+from django.core import signing
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Q
+
+TAMANHO_PAGINA = 24
+
+_SALT = 'app.pagination.cursor'
+
+
+class CursorInvalido(Exception):
+    """Cursor adulterado ou gerado para outra ordenação"""
+
+
+class Pagina:
+    """Itens de uma página e o cursor da página seguinte"""
+
+    def __init__(self, itens, proximo_cursor):
+        self.itens = itens
+        self.proximo_cursor = proximo_cursor
+
+    def __iter__(self):
+        return iter(self.itens)
+
+    def __len__(self):
+        return len(self.itens)
+
+    def __bool__(self):
+        return bool(self.itens)
+
+    @property
+    def tem_proxima(self):
+        return self.proximo_cursor is not None
+
+
+class PaginadorKeyset:
+    """
+    Pagina um queryset por cursor.
+
+    Exemplo:
+        paginador = PaginadorKeyset(produtos, ('-em_destaque', '-criado_em', 'id'))
+        pagina = paginador.pagina(request.GET.get('cursor'))
+    """
+
+    def __init__(self, queryset, ordenacao, tamanho=TAMANHO_PAGINA):
+        self.ordenacao = tuple(ordenacao)
+        self.tamanho = tamanho
+        self.queryset = queryset.order_by(*self.ordenacao)
+        self._campos = [
+            (campo.lstrip('-'), campo.startswith('-')) for campo in self.ordenacao
+        ]
+
+    def codificar(self, item):
+        """Cursor que aponta para depois de ``item``"""
+        valores = [
+            str(item[nome] if isinstance(item, dict) else getattr(item, nome))
+            for nome, _ in self._campos
+        ]
+        return signing.dumps({'o': list(self.ordenacao), 'v': valores}, salt=_SALT, compress=True)
+
+    def decodificar(self, cursor):
+        """Valores de ordenação contidos no cursor"""
+        try:
+            dados = signing.loads(cursor, salt=_SALT)
+        except signing.BadSignature:
+            raise CursorInvalido('Cursor inválido.')
+        if dados.get('o') != list(self.ordenacao) or len(dados.get('v', [])) != len(self._campos):
+            raise CursorInvalido('Cursor gerado para outra ordenação.')
+
+        valores = []
+        for (nome, _), valor in zip(self._campos, dados['v']):
+            try:
+                field = self.queryset.model._meta.get_field(nome)
+            except FieldDoesNotExist:
+                field = self.queryset.query.annotations[nome].output_field
+            valores.append(field.to_python(valor))
+        return valores
+
+    def _filtro_apos(self, valores):
+        filtro = Q()
+        iguais = {}
+        for (nome, decrescente), valor in zip(self._campos, valores):
+            operador = 'lt' if decrescente else 'gt'
+            filtro |= Q(**iguais, **{f'{nome}__{operador}': valor})
+            iguais[nome] = valor
+        if len(self._campos) > 1:
+            # Limite no primeiro campo fora do OR: o banco começa a leitura do
+            # índice no cursor em vez de percorrer as páginas anteriores
+            nome, decrescente = self._campos[0]
+            filtro = Q(**{f'{nome}__{"lte" if decrescente else "gte"}': valores[0]}) & filtro
+        return filtro
+
+    def apos(self, cursor=None):
+        """
+        Queryset ordenado a partir do item seguinte a ``cursor``.
+
+        Raises:
+            CursorInvalido: se o cursor não puder ser decodificado
+        """
+        if not cursor:
+            return self.queryset
+        return self.queryset.filter(self._filtro_apos(self.decodificar(cursor)))
+
+    def pagina(self, cursor=None):
+        """
+        Retorna a página que começa depois de ``cursor``.
+
+        Raises:
+            CursorInvalido: se o cursor não puder ser decodificado
+        """
+        itens = list(self.apos(cursor)[:self.tamanho + 1])
+        proximo_cursor = None
+        if len(itens) > self.tamanho:
+            itens = itens[:self.tamanho]
+            proximo_cursor = self.codificar(itens[-1])
+        return Pagina(itens, proximo_cursor)
@@ -0,0 +1,120 @@
+"""
+Modelo de leitura do catálogo (``ProdutoCatalogo``).
+
+Cada produto vira uma linha plana com o nome da categoria, preço efetivo,
+desconto, situação do estoque, URL da foto e um resumo da descrição. A
+listagem do catálogo e a API leem só essa tabela, sem joins nem cálculos
+por linha.
+
+Nada aqui lê a descrição completa: o resumo vem de ``Produto.resumo``.
+
+A tabela é mantida pelos signals de ``Produto`` e ``Categoria`` (na mesma
+transação da escrita). Quem altera produtos com ``queryset.update()``
+deve chamar ``sincronizar``; ``reconstruir`` refaz a tabela inteira.
+"""
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Produto, ProdutoCatalogo
+
+_CAMPOS_ATUALIZADOS = [
+    campo.name for campo in ProdutoCatalogo._meta.concrete_fields if not campo.primary_key
+]
+
+
+def situacao_estoque(estoque, estoque_minimo):
+    if estoque <= 0:
+        return 'esgotado'
+    if estoque <= estoque_minimo:
+        return 'baixo'
+    return 'disponivel'
+
+
+def linha(produto, agora=None):
+    """
+    ``ProdutoCatalogo`` (não salvo) de um produto com a categoria carregada.
+
+    Preço e desconto são copiados das colunas geradas (mesmo arredondamento
+    do banco), que precisam estar em dia: releia-as depois de um save().
+    """
+    categoria = produto.categoria
+    return ProdutoCatalogo(
+        id=produto.id,
+        categoria_id=categoria.id,
+        categoria_nome=categoria.nome,
+        categoria_ativa=categoria.ativa,
+        nome=produto.nome,
+        resumo=produto.resumo,
+        preco=produto.preco,
+        preco_promocional=produto.preco_promocional,
+        preco_efetivo=produto.preco_efetivo,
+        desconto_pct=produto.desconto_pct,
+        estoque=produto.estoque,
+        situacao_estoque=situacao_estoque(produto.estoque, produto.estoque_minimo),
+        foto_url=produto.foto.url if produto.foto else '',
+        foto_derivados=produto.foto_derivados,
+        em_destaque=produto.em_destaque,
+        forma_pagamento=produto.forma_pagamento,
+        ativo=produto.ativo,
+        criado_em=produto.criado_em,
+        atualizado_em=agora or timezone.now(),
+    )
+
+
+def _produtos():
+    return Produto.objects.select_related('categoria').defer('descricao')
+
+
+def atualizar_produtos(produtos):
+    """Insere ou regrava as linhas dos produtos informados"""
+    agora = timezone.now()
+    linhas = [linha(p, agora) for p in produtos]
+    if linhas:
+        ProdutoCatalogo.objects.bulk_create(
+            linhas, batch_size=500,
+            update_conflicts=True, unique_fields=['id'], update_fields=_CAMPOS_ATUALIZADOS,
+        )
+
+
+def remover_produtos(ids):
+    ProdutoCatalogo.objects.filter(id__in=list(ids)).delete()
+
+
+def atualizar_categoria(categoria):
+    """Propaga nome e situação da categoria para as linhas dos seus produtos"""
+    ProdutoCatalogo.objects.filter(categoria_id=categoria.id).update(
+        categoria_nome=categoria.nome,
+        categoria_ativa=categoria.ativa,
+        atualizado_em=timezone.now(),
+    )
+
+
+def sincronizar(ids):
+    """Relê os produtos informados (após um ``queryset.update()``)"""
+    atualizar_produtos(_produtos().filter(id__in=list(ids)))
+
+
+def reconstruir(tamanho_lote=1000):
+    """
+    Refaz a tabela inteira a partir dos produtos.
+
+    Returns:
+        Quantidade de linhas gravadas
+    """
+    total = 0
+    agora = timezone.now()
+    with transaction.atomic():
+        ProdutoCatalogo.objects.all().delete()
+        lote = []
+        produtos = _produtos().order_by('id').iterator(chunk_size=tamanho_lote)
+        for produto in produtos:
+            lote.append(linha(produto, agora))
+            if len(lote) >= tamanho_lote:
+                ProdutoCatalogo.objects.bulk_create(lote)
+                total += len(lote)
+                lote = []
+        if lote:
+            ProdutoCatalogo.objects.bulk_create(lote)
+            total += len(lote)
+    return total
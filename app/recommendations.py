@@ -0,0 +1,235 @@
+"""
+"Comprados juntos com frequência" a partir dos pedidos pagos.
+
+Job em lote (comando ``calcular_comprados_juntos``) que:
+
+    1. percorre ``orders.OrderItem`` dos pedidos pagos em streaming,
+       agrupado por pedido, e acumula a matriz esparsa produto x produto
+       de coocorrências (só o triângulo superior; a diagonal conta em
+       quantos pedidos cada produto apareceu). Os pares são somados em
+       blocos, então a memória fica limitada aos pares distintos;
+    2. soma o bloco novo às contagens guardadas em ``CoocorrenciaProduto``;
+    3. pontua cada par por Jaccard (pedidos com os dois / pedidos com
+       qualquer um dos dois) e grava os ``vizinhos`` melhores de cada
+       produto em ``ProdutoCompradoJunto``.
+
+O processamento incremental usa uma marca d'água em ``Order.created``.
+Pedidos costumam ser pagos depois de criados, então só entram pedidos
+criados há mais de ``atraso``; o que ainda não foi pago até lá é tratado
+como abandonado. Jaccard não depende do total de pedidos, por isso só as
+listas dos produtos com pedidos novos e dos seus parceiros são regravadas.
+"""
+
+import heapq
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F, Max, Sum
+from django.utils import timezone
+
+from .models import Produto, CoocorrenciaProduto, ProdutoCompradoJunto, EstadoCompradosJuntos
+
+logger = logging.getLogger(__name__)
+
+VIZINHOS_PADRAO = 8
+MINIMO_PEDIDOS = 2
+ATRASO_PAGAMENTO = timedelta(hours=24)
+ITENS_POR_LOTE = 5000
+PARES_POR_BLOCO = 1_000_000
+MAXIMO_ITENS_POR_PEDIDO = 50  # pedidos maiores (atacado) distorcem os pares
+IDS_POR_LOTE = 500
+
+
+def _cestas(itens, itens_por_lote):
+    """Produtos de cada pedido, em streaming (um pedido por vez)"""
+    atual, produtos = None, []
+    linhas = itens.order_by('order_id').values_list('order_id', 'product_id').iterator(chunk_size=itens_por_lote)
+    for order_id, product_id in linhas:
+        if order_id != atual:
+            if produtos:
+                yield produtos
+            atual, produtos = order_id, []
+        produtos.append(product_id)
+    if produtos:
+        yield produtos
+
+
+def acumular_coocorrencias(cestas, dimensao, pares_por_bloco=PARES_POR_BLOCO):
+    """
+    Matriz esparsa de coocorrências (triângulo superior com diagonal).
+
+    Args:
+        cestas: iterável de listas de ids de produtos (uma por pedido)
+        dimensao: maior id de produto + 1
+
+    Returns:
+        (scipy.sparse.csr_matrix, pedidos considerados)
+    """
+    import numpy as np
+    from scipy import sparse
+
+    total = sparse.csr_matrix((dimensao, dimensao), dtype=np.int64)
+    linhas, colunas, pendentes = [], [], 0
+    pedidos = ignorados = 0
+
+    def somar_bloco():
+        bloco = sparse.coo_matrix(
+            (np.ones(pendentes, dtype=np.int64), (np.concatenate(linhas), np.concatenate(colunas))),
+            shape=(dimensao, dimensao),
+        )
+        return total + bloco.tocsr()  # tocsr() soma os pares repetidos
+
+    for cesta in cestas:
+        ids = np.unique(np.asarray(cesta, dtype=np.int64))
+        if len(ids) > MAXIMO_ITENS_POR_PEDIDO:
+            ignorados += 1
+            continue
+        i, j = np.triu_indices(len(ids))
+        linhas.append(ids[i])
+        colunas.append(ids[j])
+        pendentes += len(i)
+        pedidos += 1
+        if pendentes >= pares_por_bloco:
+            total = somar_bloco()
+            linhas, colunas, pendentes = [], [], 0
+
+    if pendentes:
+        total = somar_bloco()
+    if ignorados:
+        logger.info(f"{ignorados} pedido(s) com mais de {MAXIMO_ITENS_POR_PEDIDO} produtos ignorado(s)")
+    return total, pedidos
+
+
+def _somar_coocorrencias(delta):
+    """Soma a matriz nova às contagens guardadas; devolve os produtos com pedidos novos"""
+    import numpy as np
+
+    tocados = set()
+    linhas = np.flatnonzero(np.diff(delta.indptr))
+    for inicio in range(0, len(linhas), IDS_POR_LOTE):
+        bloco = [int(a) for a in linhas[inicio:inicio + IDS_POR_LOTE]]
+        existentes = {
+            (a, b): pedidos
+            for a, b, pedidos in CoocorrenciaProduto.objects.filter(produto_a_id__in=bloco)
+            .values_list('produto_a_id', 'produto_b_id', 'pedidos').iterator()
+        }
+        objetos = []
+        for a in bloco:
+            tocados.add(a)
+            inicio_linha, fim_linha = delta.indptr[a], delta.indptr[a + 1]
+            for b, pedidos in zip(delta.indices[inicio_linha:fim_linha], delta.data[inicio_linha:fim_linha]):
+                b = int(b)
+                objetos.append(CoocorrenciaProduto(
+                    produto_a_id=a, produto_b_id=b, pedidos=existentes.get((a, b), 0) + int(pedidos)
+                ))
+        CoocorrenciaProduto.objects.bulk_create(
+            objetos, batch_size=1000,
+            update_conflicts=True, unique_fields=['produto_a', 'produto_b'], update_fields=['pedidos'],
+        )
+    return tocados
+
+
+def _gravar_listas(tocados, vizinhos, minimo_pedidos):
+    """
+    Regrava as listas dos produtos afetados (todos, se ``tocados`` for None).
+
+    Uma passada em streaming pelos pares, com um heap de ``vizinhos``
+    itens por produto.
+    """
+    contagens = dict(
+        CoocorrenciaProduto.objects.filter(produto_a=F('produto_b')).values_list('produto_a_id', 'pedidos')
+    )
+    melhores = defaultdict(list)
+    afetados = None if tocados is None else set(tocados)
+
+    pares = (
+        CoocorrenciaProduto.objects.filter(produto_a__lt=F('produto_b'), pedidos__gte=minimo_pedidos)
+        .values_list('produto_a_id', 'produto_b_id', 'pedidos').iterator(chunk_size=ITENS_POR_LOTE)
+    )
+    for a, b, juntos in pares:
+        pontuacao = juntos / (contagens[a] + contagens[b] - juntos)
+        for produto_id, outro_id in ((a, b), (b, a)):
+            heap = melhores[produto_id]
+            item = (pontuacao, juntos, outro_id)
+            if len(heap) < vizinhos:
+                heapq.heappush(heap, item)
+            else:
+                heapq.heappushpop(heap, item)
+        if afetados is not None and (a in tocados or b in tocados):
+            afetados.update((a, b))
+
+    if afetados is None:
+        ProdutoCompradoJunto.objects.all().delete()
+        afetados = set(melhores)
+    else:
+        lista = list(afetados)
+        for inicio in range(0, len(lista), IDS_POR_LOTE):
+            ProdutoCompradoJunto.objects.filter(produto_id__in=lista[inicio:inicio + IDS_POR_LOTE]).delete()
+
+    ProdutoCompradoJunto.objects.bulk_create([
+        ProdutoCompradoJunto(produto_id=produto_id, recomendado_id=outro_id, pontuacao=pontuacao, pedidos=juntos)
+        for produto_id in afetados
+        for pontuacao, juntos, outro_id in melhores.get(produto_id, ())
+    ], batch_size=1000)
+    return len(afetados)
+
+
+def calcular_comprados_juntos(completo=False, vizinhos=VIZINHOS_PADRAO, minimo_pedidos=MINIMO_PEDIDOS,
+                              atraso=ATRASO_PAGAMENTO, itens_por_lote=ITENS_POR_LOTE):
+    """
+    Processa os pedidos pagos desde a marca d'água e atualiza as recomendações.
+
+    Returns:
+        Quantidade de pedidos processados
+    """
+    from orders.models import OrderItem
+
+    estado, _ = EstadoCompradosJuntos.objects.get_or_create(pk=1)
+    limite = timezone.now() - atraso
+    desde = None if completo else estado.processado_ate
+    if desde is not None and desde >= limite:
+        return 0
+
+    itens = OrderItem.objects.filter(order__paid=True, order__created__lte=limite)
+    if desde is not None:
+        itens = itens.filter(order__created__gt=desde)
+
+    dimensao = (Produto.objects.aggregate(maximo=Max('id'))['maximo'] or 0) + 1
+    delta, pedidos = acumular_coocorrencias(_cestas(itens, itens_por_lote), dimensao)
+
+    # Contagens, listas e marca d'água mudam juntas: uma falha não conta pedidos duas vezes
+    with transaction.atomic():
+        if desde is None:
+            CoocorrenciaProduto.objects.all().delete()
+        tocados = _somar_coocorrencias(delta)
+        listas = _gravar_listas(None if desde is None else tocados, vizinhos, minimo_pedidos)
+        estado.processado_ate = limite
+        estado.save()
+
+    logger.info(f"Comprados juntos: {pedidos} pedido(s) processado(s), {listas} lista(s) gravada(s)")
+    return pedidos
+
+
+def produtos_comprados_juntos(produto, limite=4):
+    """Produtos ativos mais comprados junto de ``produto``"""
+    return list(
+        Produto.objects.filter(ativo=True, comprado_junto_de__produto_id=produto.id)
+        .only(*Produto.CAMPOS_LISTAGEM)
+        .order_by('-comprado_junto_de__pontuacao')[:limite]
+    )
+
+
+def recomendacoes_carrinho(produto_ids, limite=4):
+    """Produtos ativos mais comprados junto dos itens do carrinho (pontuações somadas)"""
+    produto_ids = list(produto_ids)
+    if not produto_ids:
+        return []
+    return list(
+        Produto.objects.filter(ativo=True, comprado_junto_de__produto_id__in=produto_ids)
+        .exclude(id__in=produto_ids)
+        .only(*Produto.CAMPOS_LISTAGEM)
+        .annotate(relevancia=Sum('comprado_junto_de__pontuacao'))
+        .order_by('-relevancia', 'id')[:limite]
+    )
@@ -0,0 +1,454 @@
+"""
+Índice de busca textual do catálogo de produtos.
+
+O índice fica numa tabela separada (``app_produto_fts``) mantida pelos
+signals de ``Produto``:
+
+    - SQLite: tabela virtual FTS5 com o texto já normalizado e reduzido
+      ao radical pelo stemmer em Python deste módulo;
+    - PostgreSQL: coluna ``tsvector`` com índice GIN, usando a configuração
+      ``pt_unaccent`` (stemmer ``portuguese`` + ``unaccent``).
+
+Em outros bancos a busca volta para ``icontains``.
+
+``ordenar_por_relevancia`` ordena os resultados por BM25 (``bm25()`` do
+FTS5; ``ts_rank`` no PostgreSQL), com o nome pesando mais que a descrição
+e um bônus opcional para produtos em estoque e em destaque.
+
+Quando a busca exata encontra poucos produtos, ``filtrar_busca_tolerante``
+completa com nomes parecidos por trigramas (``pg_trgm`` no PostgreSQL,
+``app.trigrams`` em memória no SQLite).
+"""
+
+import re
+import unicodedata
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, ExpressionWrapper, FloatField, Q, Value, When
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce
+
+TABELA_INDICE = 'app_produto_fts'
+
+_PALAVRA_RE = re.compile(r'\w+')
+
+# Sufixos de plural: (sufixo, substituição)
+_SUFIXOS_PLURAL = (
+    ('oes', 'ao'),
+    ('aes', 'ao'),
+    ('ais', 'al'),
+    ('eis', 'el'),
+    ('ois', 'ol'),
+    ('res', 'r'),
+    ('zes', 'z'),
+    ('les', 'l'),
+    ('ns', 'm'),
+    ('s', ''),
+)
+
+# Sufixos de grau e de advérbio
+_SUFIXOS_DERIVACAO = (
+    'issimo', 'issima', 'zinho', 'zinha', 'inho', 'inha', 'mente',
+)
+
+_TAMANHO_MINIMO_RADICAL = 3
+
+
+def normalizar_texto(texto):
+    """Converte para minúsculas, remove acentos e colapsa espaços"""
+    if not texto:
+        return ''
+    texto = unicodedata.normalize('NFKD', str(texto))
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return ' '.join(texto.lower().split())
+
+
+def _remover_sufixo(palavra, sufixo, substituicao=''):
+    if palavra.endswith(sufixo) and len(palavra) - len(sufixo) >= _TAMANHO_MINIMO_RADICAL:
+        return palavra[:-len(sufixo)] + substituicao
+    return None
+
+
+def radical(palavra):
+    """
+    Stemmer leve para português (plural, grau, advérbio e vogal temática).
+
+    Espera uma palavra já normalizada por ``normalizar_texto``.
+    """
+    for sufixo, substituicao in _SUFIXOS_PLURAL:
+        if sufixo == 's' and palavra.endswith(('ss', 'us')):
+            continue
+        reduzida = _remover_sufixo(palavra, sufixo, substituicao)
+        if reduzida is not None:
+            palavra = reduzida
+            break
+
+    for sufixo in _SUFIXOS_DERIVACAO:
+        reduzida = _remover_sufixo(palavra, sufixo)
+        if reduzida is not None:
+            palavra = reduzida
+            break
+
+    if palavra[-1:] in ('a', 'e', 'o') and len(palavra) > _TAMANHO_MINIMO_RADICAL:
+        palavra = palavra[:-1]
+    return palavra
+
+
+def tokenizar(texto):
+    """Lista de radicais de um texto livre"""
+    return [radical(p) for p in _PALAVRA_RE.findall(normalizar_texto(texto))]
+
+
+# ==========================
+# BACKENDS
+# ==========================
+
+class _IndiceSQLite:
+    """Tabela virtual FTS5 com o texto pré-processado em Python"""
+
+    def criar(self, cursor):
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABELA_INDICE} "
+            f"USING fts5(nome, descricao, tokenize='unicode61 remove_diacritics 2')"
+        )
+
+    def remover_tabela(self, cursor):
+        cursor.execute(f"DROP TABLE IF EXISTS {TABELA_INDICE}")
+
+    def indexar(self, cursor, produtos):
+        ids = [p.id for p in produtos]
+        self.remover(cursor, ids)
+        cursor.executemany(
+            f"INSERT INTO {TABELA_INDICE} (rowid, nome, descricao) VALUES (%s, %s, %s)",
+            [(p.id, ' '.join(tokenizar(p.nome)), ' '.join(tokenizar(p.descricao))) for p in produtos]
+        )
+
+    def remover(self, cursor, ids):
+        cursor.executemany(
+            f"DELETE FROM {TABELA_INDICE} WHERE rowid = %s",
+            [(i,) for i in ids]
+        )
+
+    def limpar(self, cursor):
+        cursor.execute(f"DELETE FROM {TABELA_INDICE}")
+
+    def criar_aproximada(self, cursor):
+        """Sem pg_trgm: a busca aproximada usa o índice em memória de app.trigrams"""
+
+    def remover_aproximada(self, cursor):
+        pass
+
+    def buscar_aproximado(self, termo, limiar, limite):
+        from .trigrams import indice
+        return indice.buscar(termo, limiar, limite)
+
+    def _expressao(self, termo):
+        radicais = tokenizar(termo)
+        if not radicais:
+            return None
+        return ' '.join(f'"{r}"*' for r in radicais)
+
+    def consulta_ids(self, termo):
+        expressao = self._expressao(termo)
+        if expressao is None:
+            return None
+        return (
+            f"SELECT rowid FROM {TABELA_INDICE} WHERE {TABELA_INDICE} MATCH %s",
+            [expressao],
+        )
+
+    def consulta_relevancia(self, termo, peso_nome, peso_descricao, coluna_id, limite):
+        """
+        BM25 do FTS5 (negativo: quanto menor, melhor) com peso por coluna.
+
+        O MATCH roda uma vez numa tabela derivada (não depende da linha de
+        fora, então o SQLite a materializa e indexa por ``id``); cada linha
+        só procura a sua nota nela.
+        """
+        expressao = self._expressao(termo)
+        if expressao is None:
+            return None
+        return (
+            f"SELECT notas.nota FROM ("
+            f"SELECT rowid AS id, -bm25({TABELA_INDICE}, %s, %s) AS nota FROM {TABELA_INDICE} "
+            f"WHERE {TABELA_INDICE} MATCH %s ORDER BY nota DESC LIMIT %s"
+            f") AS notas WHERE notas.id = {coluna_id}",
+            [peso_nome, peso_descricao, expressao, limite],
+        )
+
+
+class _IndicePostgres:
+    """Coluna tsvector com índice GIN e dicionário português sem acentos"""
+
+    CONFIGURACAO = 'pt_unaccent'
+
+    def criar(self, cursor):
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS unaccent")
+        cursor.execute(
+            "DO $$ BEGIN "
+            f"CREATE TEXT SEARCH CONFIGURATION {self.CONFIGURACAO} (COPY = portuguese); "
+            f"ALTER TEXT SEARCH CONFIGURATION {self.CONFIGURACAO} "
+            "ALTER MAPPING FOR hword, hword_part, word WITH unaccent, portuguese_stem; "
+            "EXCEPTION WHEN unique_violation THEN NULL; END $$"
+        )
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {TABELA_INDICE} ("
+            "produto_id bigint PRIMARY KEY REFERENCES app_produto (id) "
+            "ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+            "documento tsvector NOT NULL)"
+        )
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS {TABELA_INDICE}_documento_gin "
+            f"ON {TABELA_INDICE} USING GIN (documento)"
+        )
+
+    def remover_tabela(self, cursor):
+        cursor.execute(f"DROP TABLE IF EXISTS {TABELA_INDICE}")
+        cursor.execute(f"DROP TEXT SEARCH CONFIGURATION IF EXISTS {self.CONFIGURACAO}")
+
+    def indexar(self, cursor, produtos):
+        cursor.executemany(
+            f"INSERT INTO {TABELA_INDICE} (produto_id, documento) VALUES (%s, "
+            f"setweight(to_tsvector('{self.CONFIGURACAO}', %s), 'A') || "
+            f"setweight(to_tsvector('{self.CONFIGURACAO}', %s), 'B')) "
+            "ON CONFLICT (produto_id) DO UPDATE SET documento = EXCLUDED.documento",
+            [(p.id, p.nome or '', p.descricao or '') for p in produtos]
+        )
+
+    def remover(self, cursor, ids):
+        cursor.execute(f"DELETE FROM {TABELA_INDICE} WHERE produto_id = ANY(%s)", [list(ids)])
+
+    def limpar(self, cursor):
+        cursor.execute(f"TRUNCATE {TABELA_INDICE}")
+
+    def criar_aproximada(self, cursor):
+        """pg_trgm com índice GIN sobre o nome sem acentos e em minúsculas"""
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS unaccent")
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        # unaccent() não é IMMUTABLE e não pode ser usado direto num índice
+        cursor.execute(
+            "CREATE OR REPLACE FUNCTION app_unaccent(text) RETURNS text "
+            "LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT AS "
+            "$$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$"
+        )
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS app_produto_nome_trgm "
+            "ON app_produto USING GIN (app_unaccent(lower(nome)) gin_trgm_ops)"
+        )
+
+    def remover_aproximada(self, cursor):
+        cursor.execute("DROP INDEX IF EXISTS app_produto_nome_trgm")
+        cursor.execute("DROP FUNCTION IF EXISTS app_unaccent(text)")
+
+    def buscar_aproximado(self, termo, limiar, limite):
+        termo = normalizar_texto(termo)
+        if not termo:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT set_config('pg_trgm.word_similarity_threshold', %s, false)",
+                [str(limiar)]
+            )
+            cursor.execute(
+                "SELECT id FROM app_produto "
+                "WHERE ativo AND %s <%% app_unaccent(lower(nome)) "
+                "ORDER BY word_similarity(%s, app_unaccent(lower(nome))) DESC, id "
+                "LIMIT %s",
+                [termo, termo, limite]
+            )
+            return [linha[0] for linha in cursor.fetchall()]
+
+    def consulta_ids(self, termo):
+        if not normalizar_texto(termo):
+            return None
+        return (
+            f"SELECT produto_id FROM {TABELA_INDICE} "
+            f"WHERE documento @@ plainto_tsquery('{self.CONFIGURACAO}', %s)",
+            [termo],
+        )
+
+    def consulta_relevancia(self, termo, peso_nome, peso_descricao, coluna_id, limite):
+        """
+        ts_rank com pesos {D, C, B, A}: nome é A e descrição é B, relativos
+        ao nome. Normalização 1 divide pelo log do tamanho do documento,
+        como o ajuste de tamanho do BM25.
+
+        Como no SQLite, a busca no GIN e o ranking rodam uma vez numa
+        tabela derivada; cada linha só procura a sua nota nela.
+        """
+        if not normalizar_texto(termo):
+            return None
+        pesos = [0.0, 0.0, peso_descricao / peso_nome, 1.0]
+        return (
+            f"SELECT notas.nota FROM ("
+            f"SELECT produto_id AS id, ts_rank(%s::float4[], documento, plainto_tsquery('{self.CONFIGURACAO}', %s), 1) AS nota "
+            f"FROM {TABELA_INDICE} WHERE documento @@ plainto_tsquery('{self.CONFIGURACAO}', %s) "
+            f"ORDER BY nota DESC LIMIT %s"
+            f") AS notas WHERE notas.id = {coluna_id}",
+            [pesos, termo, termo, limite],
+        )
+
+
+_BACKENDS = {
+    'sqlite': _IndiceSQLite,
+    'postgresql': _IndicePostgres,
+}
+
+
+def obter_backend(conn=None):
+    """Backend de índice para o banco da conexão, ou None se não suportado"""
+    backend = _BACKENDS.get((conn or connection).vendor)
+    return backend() if backend else None
+
+
+# ==========================
+# API PÚBLICA
+# ==========================
+
+def indexar_produtos(produtos):
+    """Insere ou atualiza os produtos informados no índice"""
+    backend = obter_backend()
+    produtos = list(produtos)
+    if backend is None or not produtos:
+        return
+    with connection.cursor() as cursor:
+        backend.indexar(cursor, produtos)
+
+
+def remover_produtos(ids):
+    """Remove os produtos informados do índice"""
+    backend = obter_backend()
+    ids = list(ids)
+    if backend is None or not ids:
+        return
+    with connection.cursor() as cursor:
+        backend.remover(cursor, ids)
+
+
+def reconstruir_indice(tamanho_lote=1000):
+    """
+    Reconstrói o índice inteiro a partir da tabela de produtos.
+
+    Returns:
+        Quantidade de produtos indexados
+    """
+    from .models import Produto
+
+    backend = obter_backend()
+    if backend is None:
+        return 0
+
+    total = 0
+    lote = []
+    with connection.cursor() as cursor:
+        backend.limpar(cursor)
+        for produto in Produto.objects.only('id', 'nome', 'descricao').order_by('id').iterator(chunk_size=tamanho_lote):
+            lote.append(produto)
+            if len(lote) >= tamanho_lote:
+                backend.indexar(cursor, lote)
+                total += len(lote)
+                lote = []
+        if lote:
+            backend.indexar(cursor, lote)
+            total += len(lote)
+    return total
+
+
+def _sem_indice(termo):
+    """Ids dos produtos que contêm ``termo`` (bancos sem busca textual)"""
+    from .models import Produto
+    return Produto.objects.filter(Q(nome__icontains=termo) | Q(descricao__icontains=termo)).values('pk')
+
+
+def filtrar_busca(queryset, termo):
+    """
+    Restringe um queryset de ``Produto`` (ou de ``ProdutoCatalogo``, que usa
+    o mesmo id) aos produtos que casam com ``termo``.
+
+    A consulta ao índice entra como subquery, então só as linhas
+    encontradas são carregadas.
+    """
+    backend = obter_backend()
+    if backend is None:
+        return queryset.filter(pk__in=_sem_indice(termo))
+
+    consulta = backend.consulta_ids(termo)
+    if consulta is None:
+        return queryset.none()
+    sql, params = consulta
+    return queryset.filter(pk__in=RawSQL(sql, params))
+
+
+def filtrar_busca_tolerante(queryset, termo):
+    """
+    Como ``filtrar_busca``, mas quando a busca exata traz menos de
+    ``BUSCA_APROXIMADA_MINIMO_RESULTADOS`` produtos acrescenta os nomes
+    parecidos por trigramas (similaridade >= ``BUSCA_APROXIMADA_LIMIAR``).
+
+    Returns:
+        Tupla (queryset, usou_busca_aproximada)
+    """
+    exatos = filtrar_busca(queryset, termo)
+    minimo = getattr(settings, 'BUSCA_APROXIMADA_MINIMO_RESULTADOS', 3)
+    backend = obter_backend()
+    if backend is None or minimo <= 0 or exatos[:minimo].count() >= minimo:
+        return exatos, False
+
+    ids = backend.buscar_aproximado(
+        termo,
+        getattr(settings, 'BUSCA_APROXIMADA_LIMIAR', 0.4),
+        getattr(settings, 'BUSCA_APROXIMADA_LIMITE', 50),
+    )
+    if not ids:
+        return exatos, False
+    return queryset.filter(Q(pk__in=exatos.values('pk')) | Q(pk__in=ids)), True
+
+
+def ordenar_por_relevancia(queryset, termo):
+    """
+    Anota ``relevancia`` (maior é melhor) nos produtos de uma busca
+    (queryset de ``Produto`` ou ``ProdutoCatalogo``).
+
+    A nota vem do próprio índice: a busca roda uma vez e ranqueia no
+    máximo ``BUSCA_RELEVANCIA_CANDIDATOS`` produtos, e cada linha só
+    procura a sua nota nesse resultado, então nada é reordenado em Python.
+    Produtos fora desse limite ou trazidos só pela busca aproximada ficam
+    com nota zero e vêm depois.
+
+    Configuração (settings):
+        BUSCA_PESO_NOME, BUSCA_PESO_DESCRICAO: peso de cada campo
+        BUSCA_BONUS_ESTOQUE, BUSCA_BONUS_DESTAQUE: fração somada à nota
+        BUSCA_RELEVANCIA_CANDIDATOS: produtos ranqueados pelo índice
+    """
+    peso_nome = float(getattr(settings, 'BUSCA_PESO_NOME', 10.0))
+    peso_descricao = float(getattr(settings, 'BUSCA_PESO_DESCRICAO', 1.0))
+    bonus_estoque = float(getattr(settings, 'BUSCA_BONUS_ESTOQUE', 0.2))
+    bonus_destaque = float(getattr(settings, 'BUSCA_BONUS_DESTAQUE', 0.1))
+
+    backend = obter_backend()
+    if backend is None:
+        from .models import Produto
+        nota = (
+            Case(When(nome__icontains=termo, then=Value(peso_nome)), default=Value(0.0))
+            + Case(
+                When(pk__in=Produto.objects.filter(descricao__icontains=termo).values('pk'), then=Value(peso_descricao)),
+                default=Value(0.0),
+            )
+        )
+    else:
+        meta = queryset.model._meta
+        coluna_id = f'{connection.ops.quote_name(meta.db_table)}.{connection.ops.quote_name(meta.pk.column)}'
+        limite = int(getattr(settings, 'BUSCA_RELEVANCIA_CANDIDATOS', 1000))
+        consulta = backend.consulta_relevancia(termo, peso_nome, peso_descricao, coluna_id, limite)
+        if consulta is None:
+            return queryset.annotate(relevancia=Value(0.0, output_field=FloatField()))
+        sql, params = consulta
+        nota = Coalesce(RawSQL(sql, params, output_field=FloatField()), Value(0.0))
+
+    bonus = (
+        Value(1.0)
+        + Case(When(estoque__gt=0, then=Value(bonus_estoque)), default=Value(0.0))
+        + Case(When(em_destaque=True, then=Value(bonus_destaque)), default=Value(0.0))
+    )
+    return queryset.annotate(relevancia=ExpressionWrapper(nota * bonus, output_field=FloatField()))
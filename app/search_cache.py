@@ -0,0 +1,164 @@
+"""
+Cache dos resultados da busca do catálogo.
+
+A chave é o termo normalizado (``normalizar_texto``: minúsculas, sem
+acentos, espaços colapsados) mais a categoria, na geração atual do
+catálogo; o valor é a lista de ids dos produtos encontrados e se a busca
+aproximada foi usada. Facetas, ordenação e paginação continuam no banco,
+sobre ``id__in`` desses ids.
+
+Dois níveis:
+
+    - LRU em memória por processo, para as buscas mais frequentes, limitado
+      a ``BUSCA_CACHE_IDS_MEMORIA`` ids guardados no total (não a um número
+      de consultas: uma busca ampla pesa milhares de vezes mais que uma rara);
+    - o cache compartilhado (``catalog_cache``), que o comando
+      ``aquecer_busca`` preenche com as buscas mais populares depois de
+      um deploy.
+
+Qualquer escrita no catálogo muda a geração e, com ela, todas as chaves;
+as entradas antigas saem do LRU por idade. Buscas com mais de
+``BUSCA_CACHE_MAXIMO_IDS`` resultados não são guardadas.
+"""
+
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum
+from django.utils import timezone
+
+from . import catalog_cache
+from .search import filtrar_busca_tolerante, normalizar_texto
+
+_NAO_GUARDADA = 'muitos'  # marcador: resultado grande demais para o cache
+
+
+class CacheLRU:
+    """
+    Dict limitado a ``maximo`` unidades de ``peso(valor)`` somadas (por
+    padrão, uma por entrada); descarta as usadas há mais tempo.
+    """
+
+    def __init__(self, maximo, peso=lambda valor: 1):
+        self.maximo = maximo
+        self.peso = peso
+        self.total = 0
+        self._lock = threading.Lock()
+        self._entradas = OrderedDict()  # chave -> (valor, peso)
+
+    def obter(self, chave):
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is None:
+                return None
+            self._entradas.move_to_end(chave)
+            return entrada[0]
+
+    def guardar(self, chave, valor):
+        peso = self.peso(valor)
+        if peso > self.maximo:
+            return  # sozinho já passaria do limite
+        with self._lock:
+            anterior = self._entradas.pop(chave, None)
+            if anterior is not None:
+                self.total -= anterior[1]
+            self._entradas[chave] = (valor, peso)
+            self.total += peso
+            while self.total > self.maximo:
+                _, (_, descartado) = self._entradas.popitem(last=False)
+                self.total -= descartado
+
+    def limpar(self):
+        with self._lock:
+            self._entradas.clear()
+            self.total = 0
+
+    def __len__(self):
+        return len(self._entradas)
+
+
+def _peso(valor):
+    """Ids guardados numa entrada ``(ids, aproximada)`` (ao menos 1)"""
+    ids = valor[0]
+    return 1 + (len(ids) if isinstance(ids, list) else 0)
+
+
+lru = CacheLRU(getattr(settings, 'BUSCA_CACHE_IDS_MEMORIA', 200000), peso=_peso)
+
+
+def _chave(termo, categoria_id):
+    return catalog_cache.chave('busca', termo, categoria_id)
+
+
+def _calcular(termo, categoria_id):
+    from .models import ProdutoCatalogo
+
+    produtos = ProdutoCatalogo.visiveis()
+    if categoria_id is not None:
+        produtos = produtos.filter(categoria_id=categoria_id)
+    encontrados, aproximada = filtrar_busca_tolerante(produtos, termo)
+
+    maximo = getattr(settings, 'BUSCA_CACHE_MAXIMO_IDS', 5000)
+    ids = list(encontrados.order_by('id').values_list('id', flat=True)[:maximo + 1])
+    if len(ids) > maximo:
+        return (_NAO_GUARDADA, aproximada)
+    return (ids, aproximada)
+
+
+def resultado(termo, categoria_id=None):
+    """
+    ``(ids, usou_busca_aproximada)`` da busca, do cache ou calculado;
+    ``ids`` é None se houver resultados demais para guardar.
+    """
+    termo = normalizar_texto(termo)
+    chave = _chave(termo, categoria_id)
+    valor = lru.obter(chave)
+    if valor is None:
+        valor = cache.get(chave)
+        if valor is None:
+            valor = _calcular(termo, categoria_id)
+            cache.set(chave, valor, catalog_cache.TTL_CATALOGO)
+        lru.guardar(chave, valor)
+    ids, aproximada = valor
+    return (None if ids == _NAO_GUARDADA else ids, aproximada)
+
+
+def filtrar(queryset, termo, categoria_id=None):
+    """
+    Como ``filtrar_busca_tolerante``, com os ids encontrados vindos do cache.
+
+    ``queryset`` deve ser de ``ProdutoCatalogo`` e já estar restrito a
+    ``categoria_id``, se houver.
+
+    Returns:
+        Tupla (queryset, usou_busca_aproximada)
+    """
+    ids, aproximada = resultado(termo, categoria_id)
+    if ids is None:
+        return filtrar_busca_tolerante(queryset, termo)
+    return queryset.filter(id__in=ids), aproximada
+
+
+def aquecer(termo, categoria_id=None):
+    """Guarda a busca no cache compartilhado, se ainda não estiver; True se calculou"""
+    termo = normalizar_texto(termo)
+    chave = _chave(termo, categoria_id)
+    if cache.get(chave) is not None:
+        return False
+    cache.set(chave, _calcular(termo, categoria_id), catalog_cache.TTL_CATALOGO)
+    return True
+
+
+def consultas_populares(limite, dias):
+    """``(termo, categoria_id, buscas)`` mais frequentes nas buscas consolidadas dos últimos ``dias``"""
+    from .models import BuscaDiaria
+
+    return list(
+        BuscaDiaria.objects.filter(dia__gte=timezone.localdate() - timedelta(days=dias - 1))
+        .values_list('termo', 'categoria_id')
+        .annotate(total=Sum('buscas'))
+        .order_by('-total', 'termo')[:limite]
+    )
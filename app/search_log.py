@@ -0,0 +1,254 @@
+"""
+Registro e análise das buscas feitas no catálogo.
+
+Cada busca (primeira página) vira uma ``BuscaRegistrada`` com o termo
+normalizado, a categoria, as facetas e a ordem, a quantidade de
+resultados e a latência. O registro fica fora do cache de página, então
+buscas servidas do cache também contam; a quantidade de resultados vem
+do cabeçalho ``X-Total-Resultados`` da página (guardado junto com ela).
+
+A requisição só acrescenta a busca a um buffer em memória; uma thread de
+fundo grava o buffer em lote a cada ``BUSCA_LOG_INTERVALO`` segundos ou
+quando ele chega a ``BUSCA_LOG_LOTE`` buscas. Se o banco ficar fora do ar,
+o buffer guarda no máximo ``BUSCA_LOG_MAXIMO`` buscas e descarta as mais
+antigas: é estatística, não pode atrasar nem derrubar o catálogo. Com
+``BUSCA_LOG_EM_SEGUNDO_PLANO = False`` cada busca é gravada na hora.
+
+``consolidar`` soma as buscas novas em ``BuscaDiaria`` (por dia, termo e
+categoria) e apaga as já consolidadas com mais de ``BUSCA_LOG_RETENCAO_DIAS``;
+o relatório (``relatorio_buscas``) e o aquecimento do cache de busca
+leem só a tabela consolidada.
+"""
+
+import atexit
+import logging
+import threading
+import time
+from collections import deque
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Max, Sum
+from django.utils import timezone
+
+from . import facets
+from .models import BuscaDiaria, BuscaRegistrada, EstadoBuscas
+from .search import normalizar_texto
+
+logger = logging.getLogger(__name__)
+
+CABECALHO_RESULTADOS = 'X-Total-Resultados'
+
+
+def _configuracao(nome, padrao):
+    return getattr(settings, nome, padrao)
+
+
+# ==========================
+# GRAVAÇÃO EM LOTE
+# ==========================
+
+class EscritorBuscas:
+    """Buffer de ``BuscaRegistrada`` gravado em lote por uma thread de fundo"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._acordar = threading.Event()
+        self._pendentes = deque(maxlen=_configuracao('BUSCA_LOG_MAXIMO', 10000))
+        self._thread = None
+        self.descartadas = 0
+
+    def registrar(self, busca):
+        """Acrescenta a busca ao buffer, sem acessar o banco (ou grava na hora, se configurado)"""
+        if not _configuracao('BUSCA_LOG_EM_SEGUNDO_PLANO', True):
+            BuscaRegistrada.objects.bulk_create([busca])
+            return
+        with self._lock:
+            if len(self._pendentes) == self._pendentes.maxlen:
+                self.descartadas += 1
+            self._pendentes.append(busca)
+            cheio = len(self._pendentes) >= _configuracao('BUSCA_LOG_LOTE', 200)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._executar, name='buscas', daemon=True)
+                self._thread.start()
+                atexit.register(self.descarregar)
+        if cheio:
+            self._acordar.set()
+
+    def descarregar(self):
+        """Grava o que estiver no buffer; devolve quantas buscas foram gravadas"""
+        with self._lock:
+            lote = list(self._pendentes)
+            self._pendentes.clear()
+        if lote:
+            BuscaRegistrada.objects.bulk_create(lote, batch_size=500)
+        return len(lote)
+
+    def _executar(self):
+        while True:
+            self._acordar.wait(_configuracao('BUSCA_LOG_INTERVALO', 5))
+            self._acordar.clear()
+            close_old_connections()
+            try:
+                self.descarregar()
+            except Exception:
+                logger.exception("Falha ao gravar o lote de buscas")
+            finally:
+                close_old_connections()
+            if self.descartadas:
+                logger.warning(f"{self.descartadas} busca(s) descartada(s) com o buffer cheio")
+                self.descartadas = 0
+
+
+escritor = EscritorBuscas()
+
+
+def registrar_buscas(view):
+    """Registra a busca de ``?busca=`` (com latência e resultados) depois que a view responder"""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        inicio = time.perf_counter()
+        resposta = view(request, *args, **kwargs)
+        termo = normalizar_texto(request.GET.get('busca', ''))
+        if termo and not request.GET.get('cursor') and resposta.status_code in (200, 304):
+            categoria_id = request.GET.get('categoria', '')
+            filtros = facets.facetas_selecionadas(request.GET)
+            if request.GET.get('ordem'):
+                filtros['ordem'] = request.GET['ordem']
+            resultados = resposta.get(CABECALHO_RESULTADOS)
+            escritor.registrar(BuscaRegistrada(
+                termo=termo[:200],
+                categoria_id=int(categoria_id) if categoria_id.isdigit() else None,
+                filtros=filtros,
+                resultados=int(resultados) if resultados is not None else None,
+                latencia_ms=round((time.perf_counter() - inicio) * 1000),
+            ))
+        return resposta
+    return wrapper
+
+
+# ==========================
+# CONSOLIDAÇÃO
+# ==========================
+
+TERMOS_POR_CONSULTA = 500
+
+
+def _somar(grupo, outro):
+    grupo.buscas += outro.buscas
+    grupo.sem_resultado += outro.sem_resultado
+    grupo.lentas += outro.lentas
+    grupo.latencia_total_ms += outro.latencia_total_ms
+    grupo.latencia_maxima_ms = max(grupo.latencia_maxima_ms, outro.latencia_maxima_ms)
+
+
+def _somar_existentes(grupos):
+    """Acrescenta aos grupos novos o que já estava consolidado para as mesmas chaves"""
+    dias = {dia for dia, _, _ in grupos}
+    termos = sorted({termo for _, termo, _ in grupos})
+    for inicio in range(0, len(termos), TERMOS_POR_CONSULTA):
+        existentes = BuscaDiaria.objects.filter(dia__in=dias, termo__in=termos[inicio:inicio + TERMOS_POR_CONSULTA])
+        for existente in existentes:
+            grupo = grupos.get((existente.dia, existente.termo, existente.categoria_id))
+            if grupo is not None:
+                grupo.pk = existente.pk
+                _somar(grupo, existente)
+                if grupo.resultados is None:
+                    grupo.resultados = existente.resultados
+
+
+def consolidar():
+    """
+    Soma as buscas registradas desde a última consolidação em ``BuscaDiaria``
+    e apaga as antigas já consolidadas.
+
+    Returns:
+        Quantidade de buscas consolidadas
+    """
+    estado, _ = EstadoBuscas.objects.get_or_create(pk=1)
+    limite = BuscaRegistrada.objects.aggregate(maximo=Max('id'))['maximo'] or 0
+    novas = BuscaRegistrada.objects.filter(id__gt=estado.consolidado_ate, id__lte=limite)
+    lenta_ms = _configuracao('BUSCA_LENTA_MS', 500)
+
+    grupos = {}
+    total = 0
+    linhas = (
+        novas.order_by('id').values_list('termo', 'categoria_id', 'criado_em', 'resultados', 'latencia_ms')
+        .iterator(chunk_size=2000)
+    )
+    for termo, categoria_id, criado_em, resultados, latencia in linhas:
+        chave = (timezone.localdate(criado_em), termo, categoria_id)
+        grupo = grupos.get(chave)
+        if grupo is None:
+            grupo = grupos[chave] = BuscaDiaria(dia=chave[0], termo=termo, categoria_id=categoria_id)
+        _somar(grupo, BuscaDiaria(
+            buscas=1, sem_resultado=int(resultados == 0), lentas=int(latencia > lenta_ms),
+            latencia_total_ms=latencia, latencia_maxima_ms=latencia,
+        ))
+        if resultados is not None:
+            grupo.resultados = resultados  # a mais recente
+        total += 1
+
+    # Somas, marca d'água e limpeza juntas: uma falha não conta buscas duas vezes
+    with transaction.atomic():
+        travado = EstadoBuscas.objects.select_for_update().get(pk=1)
+        if travado.consolidado_ate != estado.consolidado_ate:
+            return 0  # outra consolidação rodou ao mesmo tempo e já somou estas buscas
+        _somar_existentes(grupos)
+        # Sem upsert: a categoria é NULL nas buscas sem filtro, e NULLs não conflitam no índice único
+        BuscaDiaria.objects.bulk_update(
+            [grupo for grupo in grupos.values() if grupo.pk], batch_size=500,
+            fields=['buscas', 'sem_resultado', 'lentas', 'latencia_total_ms', 'latencia_maxima_ms', 'resultados'],
+        )
+        BuscaDiaria.objects.bulk_create([grupo for grupo in grupos.values() if not grupo.pk], batch_size=500)
+        estado.consolidado_ate = limite
+        estado.save()
+        retencao = timezone.now() - timedelta(days=_configuracao('BUSCA_LOG_RETENCAO_DIAS', 30))
+        BuscaRegistrada.objects.filter(id__lte=limite, criado_em__lt=retencao).delete()
+
+    if total:
+        logger.info(f"Buscas: {total} consolidada(s) em {len(grupos)} linha(s) diária(s)")
+    return total
+
+
+# ==========================
+# RELATÓRIOS
+# ==========================
+
+def _periodo(dias):
+    return BuscaDiaria.objects.filter(dia__gte=timezone.localdate() - timedelta(days=dias - 1))
+
+
+def mais_buscadas(dias=7, limite=20):
+    """Termos mais buscados: [{termo, buscas, sem_resultado, latencia_media_ms}]"""
+    return list(
+        _periodo(dias).values('termo')
+        .annotate(
+            total=Sum('buscas'), zeradas=Sum('sem_resultado'),
+            latencia_media_ms=Sum('latencia_total_ms') * 1.0 / Sum('buscas'),
+        )
+        .order_by('-total', 'termo')[:limite]
+    )
+
+
+def sem_resultado(dias=7, limite=20):
+    """Termos que mais voltaram sem nenhum produto"""
+    return list(
+        _periodo(dias).filter(sem_resultado__gt=0).values('termo')
+        .annotate(zeradas=Sum('sem_resultado'), total=Sum('buscas'))
+        .order_by('-zeradas', 'termo')[:limite]
+    )
+
+
+def mais_lentas(dias=7, limite=20):
+    """Termos com maior latência média (e a máxima) no período"""
+    return list(
+        _periodo(dias).values('termo')
+        .annotate(
+            total=Sum('buscas'), lentas=Sum('lentas'), latencia_maxima_ms=Max('latencia_maxima_ms'),
+            latencia_media_ms=Sum('latencia_total_ms') * 1.0 / Sum('buscas'),
+        )
+        .order_by('-latencia_media_ms', 'termo')[:limite]
+    )
@@ -0,0 +1,80 @@
+"""
+Signals que mantêm as estruturas derivadas do catálogo em dia com as
+escritas nos modelos.
+"""
+
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.db import transaction
+from django.dispatch import receiver
+
+from . import autocomplete, catalog_cache, counters, read_model, search, trigrams
+from .models import Categoria, Produto, ImagemProduto
+
+
+@receiver(pre_save, sender=Produto)
+def produto_antes_de_salvar(sender, instance, raw=False, **kwargs):
+    """Guarda o estado anterior usado pelos contadores da categoria"""
+    if raw or instance.pk is None:
+        instance._estado_contadores = None
+        return
+    instance._estado_contadores = (
+        Produto.objects.filter(pk=instance.pk)
+        .values_list('categoria_id', 'ativo', 'estoque')
+        .first()
+    )
+
+
+@receiver(post_save, sender=Produto)
+def produto_salvo(sender, instance, raw=False, **kwargs):
+    """Reindexa o produto (busca, autocompletar, catálogo) e atualiza os contadores"""
+    if raw:
+        return
+    search.indexar_produtos([instance])
+    # Colunas geradas não voltam do UPDATE: relidas antes de ir para o catálogo
+    instance.refresh_from_db(fields=['preco_efetivo', 'desconto_pct'])
+    read_model.atualizar_produtos([instance])
+    counters.registrar_escrita(getattr(instance, '_estado_contadores', None), instance)
+    transaction.on_commit(lambda: autocomplete.indice.atualizar(instance))
+    transaction.on_commit(lambda: trigrams.indice.atualizar(instance))
+
+
+@receiver(post_delete, sender=Produto)
+def produto_removido(sender, instance, **kwargs):
+    """Remove o produto dos índices de busca, do catálogo e dos contadores"""
+    search.remover_produtos([instance.id])
+    read_model.remover_produtos([instance.id])
+    counters.registrar_remocao(instance)
+    produto_id = instance.id
+    transaction.on_commit(lambda: autocomplete.indice.remover(produto_id))
+    transaction.on_commit(lambda: trigrams.indice.remover(produto_id))
+
+
+@receiver(post_save, sender=Categoria)
+def categoria_salva(sender, instance, raw=False, **kwargs):
+    """Propaga nome e situação da categoria para o catálogo"""
+    if raw:
+        return
+    read_model.atualizar_categoria(instance)
+
+
+@receiver(post_save, sender=Categoria)
+@receiver(post_delete, sender=Categoria)
+def categoria_alterada(sender, raw=False, **kwargs):
+    """Reconstrói o autocompletar: a categoria decide quais produtos aparecem"""
+    if raw:
+        return
+    transaction.on_commit(autocomplete.indice.descartar)
+
+
+@receiver(post_save, sender=Produto)
+@receiver(post_delete, sender=Produto)
+@receiver(post_save, sender=Categoria)
+@receiver(post_delete, sender=Categoria)
+@receiver(post_save, sender=ImagemProduto)
+@receiver(post_delete, sender=ImagemProduto)
+def catalogo_alterado(sender, raw=False, **kwargs):
+    """Invalida o cache do catálogo"""
+    if raw:
+        return
+    catalog_cache.incrementar_geracao_apos_commit()
+
@@ -0,0 +1,215 @@
+"""
+Produtos similares por conteúdo (TF-IDF + cosseno).
+
+Job em lote (comando ``calcular_similares``) que:
+
+    1. monta a matriz TF-IDF esparsa (SciPy CSR) de nome + descrição,
+       com os mesmos radicais da busca textual e o nome com peso dobrado;
+    2. calcula, em blocos de linhas, os ``vizinhos`` produtos mais
+       parecidos de cada produto (produto escalar de linhas L2-normalizadas);
+    3. grava o resultado em ``ProdutoSimilar``.
+
+No modo incremental só os produtos cujo texto mudou (hash em
+``EstadoSimilaridade``) têm os vizinhos recalculados. Como o cosseno é
+simétrico, as mesmas linhas também atualizam as listas dos produtos não
+alterados que passaram a ter (ou deixaram de ter) um alterado entre os
+mais parecidos. O IDF de quem não mudou não é revisto: rode com
+``completo=True`` de tempos em tempos.
+
+NumPy e SciPy só são importados quando o job roda.
+"""
+
+import hashlib
+import heapq
+import logging
+import math
+from collections import defaultdict
+
+from django.db import transaction
+
+from .models import Produto, ProdutoSimilar, EstadoSimilaridade
+from .search import radical, tokenizar
+
+logger = logging.getLogger(__name__)
+
+VIZINHOS_PADRAO = 12
+LINHAS_POR_BLOCO = 500
+
+_STOPWORDS = {
+    'a', 'o', 'as', 'os', 'um', 'uma', 'uns', 'umas', 'de', 'do', 'da', 'dos', 'das',
+    'em', 'no', 'na', 'nos', 'nas', 'por', 'para', 'com', 'sem', 'e', 'ou', 'que',
+    'se', 'ao', 'aos', 'pelo', 'pela', 'seu', 'sua', 'mais', 'muito', 'ate',
+}
+_STOPWORDS_RADICAIS = {radical(p) for p in _STOPWORDS}
+
+
+def hash_texto(nome, descricao):
+    return hashlib.md5(f'{nome}\n{descricao}'.encode('utf-8')).hexdigest()
+
+
+def termos(nome, descricao):
+    """Radicais do produto; o nome conta em dobro"""
+    nome = [t for t in tokenizar(nome) if t not in _STOPWORDS_RADICAIS]
+    descricao = [t for t in tokenizar(descricao) if t not in _STOPWORDS_RADICAIS]
+    return nome + nome + descricao
+
+
+def matriz_tfidf(documentos):
+    """
+    Matriz TF-IDF L2-normalizada (uma linha por documento).
+
+    Args:
+        documentos: lista de listas de termos
+
+    Returns:
+        scipy.sparse.csr_matrix (n_documentos x n_termos)
+    """
+    import numpy as np
+    from scipy import sparse
+
+    vocabulario = {}
+    linhas, colunas, valores = [], [], []
+    for linha, documento in enumerate(documentos):
+        frequencias = defaultdict(int)
+        for termo in documento:
+            frequencias[vocabulario.setdefault(termo, len(vocabulario))] += 1
+        for coluna, quantidade in frequencias.items():
+            linhas.append(linha)
+            colunas.append(coluna)
+            valores.append(1.0 + math.log(quantidade))
+
+    matriz = sparse.csr_matrix(
+        (np.array(valores, dtype=np.float32), (linhas, colunas)),
+        shape=(len(documentos), max(len(vocabulario), 1)),
+    )
+
+    # IDF suavizado, como no scikit-learn
+    df = np.bincount(matriz.indices, minlength=matriz.shape[1])
+    idf = np.log((1.0 + matriz.shape[0]) / (1.0 + df)) + 1.0
+    matriz = matriz @ sparse.diags(idf.astype(np.float32))
+
+    normas = np.sqrt(np.asarray(matriz.multiply(matriz).sum(axis=1)).ravel())
+    normas[normas == 0] = 1.0
+    return sparse.csr_matrix(sparse.diags(1.0 / normas) @ matriz)
+
+
+def _top_por_linha(similaridades, ids, ids_linhas, vizinhos):
+    """[(produto_id, [(pontuacao, similar_id), ...])] de um bloco de similaridades"""
+    resultado = []
+    for posicao, produto_id in enumerate(ids_linhas):
+        inicio, fim = similaridades.indptr[posicao], similaridades.indptr[posicao + 1]
+        pares = (
+            (float(valor), ids[coluna])
+            for coluna, valor in zip(similaridades.indices[inicio:fim], similaridades.data[inicio:fim])
+            if ids[coluna] != produto_id and valor > 0
+        )
+        resultado.append((produto_id, heapq.nlargest(vizinhos, pares)))
+    return resultado
+
+
+def _gravar(listas):
+    """Substitui os vizinhos dos produtos informados"""
+    if not listas:
+        return
+    ProdutoSimilar.objects.filter(produto_id__in=list(listas)).delete()
+    ProdutoSimilar.objects.bulk_create([
+        ProdutoSimilar(produto_id=produto_id, similar_id=similar_id, pontuacao=pontuacao)
+        for produto_id, pares in listas.items()
+        for pontuacao, similar_id in pares
+    ], batch_size=1000)
+
+
+def calcular_similares(completo=False, vizinhos=VIZINHOS_PADRAO, linhas_por_bloco=LINHAS_POR_BLOCO):
+    """
+    Calcula os produtos similares.
+
+    Returns:
+        Quantidade de produtos cujo texto foi (re)processado
+    """
+    ids, documentos, hashes = [], [], {}
+    for produto_id, nome, descricao in Produto.objects.order_by('id').values_list('id', 'nome', 'descricao').iterator():
+        ids.append(produto_id)
+        documentos.append(termos(nome, descricao or ''))
+        hashes[produto_id] = hash_texto(nome, descricao or '')
+
+    if not ids:
+        return 0
+
+    anteriores = dict(EstadoSimilaridade.objects.values_list('produto_id', 'hash_texto'))
+    if completo or not anteriores:
+        completo = True
+        alterados = list(ids)
+    else:
+        alterados = [i for i in ids if anteriores.get(i) != hashes[i]]
+    if not alterados:
+        return 0
+
+    matriz = matriz_tfidf(documentos)
+    transposta = matriz.T.tocsr()
+    posicao = {produto_id: n for n, produto_id in enumerate(ids)}
+    conjunto_alterados = set(alterados)
+
+    novas_listas = {}
+    # similar não alterado -> melhores (pontuacao, alterado) vindos das linhas recalculadas
+    candidatos = defaultdict(list)
+
+    for inicio in range(0, len(alterados), linhas_por_bloco):
+        bloco = alterados[inicio:inicio + linhas_por_bloco]
+        similaridades = (matriz[[posicao[i] for i in bloco]] @ transposta).tocsr()
+        for produto_id, pares in _top_por_linha(similaridades, ids, bloco, vizinhos):
+            novas_listas[produto_id] = pares
+
+        if not completo:
+            coo = similaridades.tocoo()
+            for linha, coluna, valor in zip(coo.row, coo.col, coo.data):
+                similar_id = ids[coluna]
+                if similar_id in conjunto_alterados or valor <= 0:
+                    continue
+                heap = candidatos[similar_id]
+                item = (float(valor), bloco[linha])
+                if len(heap) < vizinhos:
+                    heapq.heappush(heap, item)
+                else:
+                    heapq.heappushpop(heap, item)
+
+    if not completo:
+        # Listas de não alterados que citam um alterado ou receberam candidatos
+        afetados = set(candidatos)
+        afetados.update(
+            ProdutoSimilar.objects.filter(similar_id__in=alterados)
+            .exclude(produto_id__in=alterados)
+            .values_list('produto_id', flat=True)
+        )
+        atuais = defaultdict(list)
+        for produto_id, similar_id, pontuacao in (
+            ProdutoSimilar.objects.filter(produto_id__in=afetados)
+            .values_list('produto_id', 'similar_id', 'pontuacao').iterator()
+        ):
+            if similar_id not in conjunto_alterados:
+                atuais[produto_id].append((pontuacao, similar_id))
+        for produto_id in afetados:
+            novas_listas[produto_id] = heapq.nlargest(
+                vizinhos, atuais.get(produto_id, []) + candidatos.get(produto_id, [])
+            )
+
+    with transaction.atomic():
+        if completo:
+            ProdutoSimilar.objects.all().delete()
+        _gravar(novas_listas)
+        EstadoSimilaridade.objects.filter(produto_id__in=alterados).delete()
+        EstadoSimilaridade.objects.bulk_create([
+            EstadoSimilaridade(produto_id=produto_id, hash_texto=hashes[produto_id])
+            for produto_id in alterados
+        ], batch_size=1000)
+
+    logger.info(f"Similares calculados para {len(alterados)} produto(s) ({len(novas_listas)} lista(s) gravada(s))")
+    return len(alterados)
+
+
+def produtos_similares(produto, limite=4):
+    """Produtos ativos mais parecidos com ``produto`` (uma query indexada)"""
+    return list(
+        Produto.objects.filter(ativo=True, similar_de__produto_id=produto.id)
+        .only(*Produto.CAMPOS_LISTAGEM)
+        .order_by('-similar_de__pontuacao')[:limite]
+    )
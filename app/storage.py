@@ -0,0 +1,63 @@
+"""
+Armazenamento endereçado por conteúdo para as fotos dos produtos.
+
+O nome do arquivo é o SHA-256 do conteúdo (``produtos/ab/ab12...ef.jpg``):
+o mesmo arquivo enviado para vários produtos ou galerias é gravado uma
+vez só e todos os registros apontam para ele. Como a URL muda sempre que
+o conteúdo muda, esses arquivos (e os derivados de app.images, cujo
+caminho inclui o hash do original) podem ser servidos com cache
+``immutable`` de longo prazo (ver ``servir_midia``).
+
+Arquivos são compartilhados entre registros: nunca apague o arquivo ao
+apagar ou trocar a imagem de um registro.
+"""
+
+import hashlib
+import os
+import re
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+from django.views.static import serve
+
+CACHE_IMUTAVEL = 'public, max-age=31536000, immutable'
+
+_IMUTAVEL = re.compile(r'^(?:derivados/.+|.+/[0-9a-f]{2}/[0-9a-f]{64}\.\w+)$')
+
+
+def eh_imutavel(nome):
+    """O arquivo tem nome derivado do próprio conteúdo?"""
+    return bool(_IMUTAVEL.match(nome))
+
+
+@deconstructible(path='app.storage.ArmazenamentoPorConteudo')
+class ArmazenamentoPorConteudo(FileSystemStorage):
+    """``FileSystemStorage`` que grava cada conteúdo uma única vez, nomeado pelo hash"""
+
+    def nome_por_conteudo(self, nome, conteudo):
+        """``<pasta do upload_to>/<2 primeiros>/<sha256><extensão>``"""
+        sha256 = hashlib.sha256()
+        for bloco in conteudo.chunks():
+            sha256.update(bloco)
+        if hasattr(conteudo, 'seek'):
+            conteudo.seek(0)
+        digest = sha256.hexdigest()
+        pasta = os.path.dirname(nome)
+        extensao = os.path.splitext(nome)[1].lower()
+        return f'{pasta}/{digest[:2]}/{digest}{extensao}' if pasta else f'{digest[:2]}/{digest}{extensao}'
+
+    def _save(self, name, content):
+        nome = self.nome_por_conteudo(name, content)
+        if self.exists(nome):
+            return nome  # conteúdo já armazenado
+        # Numa corrida com outro upload do mesmo conteúdo, o FileSystemStorage
+        # grava uma cópia com sufixo: desperdício raro, nunca um arquivo errado
+        return super()._save(nome, content)
+
+
+def servir_midia(request, path, document_root=None):
+    """``django.views.static.serve`` com cache imutável para arquivos endereçados por conteúdo"""
+    resposta = serve(request, path, document_root=document_root)
+    if eh_imutavel(path):
+        resposta['Cache-Control'] = CACHE_IMUTAVEL
+    return resposta
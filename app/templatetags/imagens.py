@@ -0,0 +1,71 @@
+"""
+Tag ``imagem_responsiva``: ``<picture>`` com WebP e JPEG em todos os
+tamanhos gerados (ver app.images), ``srcset``/``sizes``, dimensões
+intrínsecas e carregamento preguiçoso.
+
+    {% load imagens %}
+    {% imagem_responsiva produto alt=produto.nome sizes="(max-width: 600px) 100vw, 300px" classe="product-image" %}
+
+A origem pode ser um ``Produto``, ``ProdutoCatalogo``, ``ImagemProduto``,
+``Cliente``, o campo de imagem de um deles (``usuario.foto_perfil``) ou
+um ``Derivados``. As dimensões vêm dos derivados guardados no banco:
+nenhum arquivo é aberto durante a renderização.
+"""
+
+from django import template
+from django.db.models.fields.files import FieldFile
+from django.utils.html import format_html
+
+from app.images import Derivados
+
+register = template.Library()
+
+
+def _derivados(origem):
+    if isinstance(origem, Derivados):
+        return origem
+    if isinstance(origem, FieldFile):
+        origem = origem.instance
+    return getattr(origem, 'fotos', None)
+
+
+def _srcset(variantes):
+    return ', '.join(f'{url} {largura}w' for url, largura in variantes)
+
+
+@register.simple_tag
+def imagem_responsiva(origem, alt='', sizes='100vw', tamanho='card', classe='', prioridade=False):
+    """
+    Args:
+        tamanho: derivado usado no ``src`` e nas dimensões do ``<img>``
+            (define a proporção reservada no layout)
+        prioridade: imagem principal acima da dobra; carrega já, com
+            ``fetchpriority="high"``, em vez de ``loading="lazy"``
+    """
+    fotos = _derivados(origem)
+    if not fotos:
+        return ''
+
+    carregamento = format_html(
+        'loading="{}" decoding="async"{}',
+        'eager' if prioridade else 'lazy',
+        format_html(' fetchpriority="high"') if prioridade else '',
+    )
+    jpeg = fotos.variantes('jpeg')
+    if not jpeg:
+        # Ainda sem derivados: o original, sem dimensões conhecidas
+        return format_html(
+            '<img src="{}" alt="{}" class="{}" {}>', fotos.url_original, alt, classe, carregamento
+        )
+
+    # Tamanho de outro conjunto (ex.: 'card' num avatar): usa o maior
+    principal = fotos[tamanho if tamanho in fotos.tamanhos else list(fotos.tamanhos)[-1]]
+    return format_html(
+        '<picture>'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" alt="{}" class="{}" {}>'
+        '</picture>',
+        _srcset(fotos.variantes('webp')), sizes,
+        principal['jpeg'], _srcset(jpeg), sizes, principal['largura'], principal['altura'], alt, classe,
+        carregamento,
+    )
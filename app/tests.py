@@ -1,7 +1,29 @@
-from django.test import TestCase, Client
+import io
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.test import TestCase, Client, RequestFactory, override_settings
 from django.urls import reverse
 from django.contrib.auth import get_user_model
-from .models import Categoria, Produto, PessoaFisica
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from .models import Categoria, EstadoCatalogo, Produto, ProdutoCatalogo, PessoaFisica, Carrinho, ItemCarrinho
+from . import (
+    autocomplete, catalog_cache, facets, images, read_model, recommendations, search_cache, search_log, similarity, trigrams,
+)
+from .counters import recalcular_contadores
+from .pagination import PaginadorKeyset, CursorInvalido
+from .search import (
+    filtrar_busca, filtrar_busca_tolerante, normalizar_texto, ordenar_por_relevancia, radical,
+    reconstruir_indice,
+)
+from .views import ORDENACAO_BUSCA, ORDENACAO_CATALOGO
 
 User = get_user_model()
 
@@ -51,11 +73,14 @@ class AuthenticationTests(TestCase):
         self.assertRedirects(response, reverse('login_usuario'))
 
 
+@override_settings(BUSCA_LOG_EM_SEGUNDO_PLANO=False)
 class CatalogoTests(TestCase):
     """Testes do catálogo de produtos"""
 
     def setUp(self):
         """Configuração inicial para testes"""
+        cache.clear()
+        search_cache.lru.limpar()
         self.client = Client()
         self.user = User.objects.create_user(
             username='test@example.com',
@@ -103,6 +128,542 @@ class CatalogoTests(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, self.produto.nome)
 
+    def test_catalogo_ordenacao_por_preco(self):
+        """?ordem=menor_preco ordena pelo preço efetivo (promoção incluída)"""
+        barato = Produto.objects.create(
+            categoria=self.categoria, nome='Em promoção', descricao='x',
+            preco=500.00, preco_promocional=50.00, estoque=1
+        )
+        self.client.login(username='test@example.com', password='testpass123')
+        response = self.client.get(reverse('catalogo_produtos'), {'ordem': 'menor_preco'})
+        self.assertEqual([p.id for p in response.context['produtos']], [barato.id, self.produto.id])
+        self.assertTrue(response.context['ordenacoes'][1]['selecionada'])
+
+    def test_catalogo_estatisticas(self):
+        """Estatísticas do catálogo e contagens por categoria"""
+        Produto.objects.create(
+            categoria=self.categoria, nome='Sem estoque', descricao='x',
+            preco=10.00, estoque=0, em_destaque=True
+        )
+        self.client.login(username='test@example.com', password='testpass123')
+        response = self.client.get(reverse('catalogo_produtos'))
+        self.assertEqual(response.context['total_produtos'], 2)
+        self.assertEqual(response.context['produtos_em_estoque'], 1)
+        self.assertEqual(response.context['produtos_destaque'], 1)
+        categoria = response.context['categorias'][0]
+        self.assertEqual((categoria.total_produtos(), categoria.produtos_em_estoque()), (2, 1))
+
+    @override_settings(CATALOGO_GERACAO_INTERVALO=60)
+    def test_catalogo_queries_nao_crescem_com_categorias(self):
+        """Número de queries independe da quantidade de categorias"""
+        self.client.login(username='test@example.com', password='testpass123')
+        catalog_cache.obter_geracao()  # fora da contagem: geração lida uma vez por intervalo
+
+        def contar_queries():
+            cache.clear()
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.get(reverse('catalogo_produtos'))
+            return len(ctx.captured_queries)
+
+        antes = contar_queries()
+        for i in range(3):
+            Categoria.objects.create(nome=f'Extra {i}', ativa=True)
+        self.assertEqual(contar_queries(), antes)
+
+
+class ContadoresCategoriaTests(TestCase):
+    """Testes dos contadores desnormalizados de Categoria"""
+
+    def setUp(self):
+        self.categoria = Categoria.objects.create(nome='Livros', ativa=True)
+        self.outra = Categoria.objects.create(nome='Jogos', ativa=True)
+        self.produto = Produto.objects.create(
+            categoria=self.categoria, nome='Romance', descricao='x',
+            preco=30.00, estoque=2
+        )
+
+    def _contadores(self, categoria):
+        categoria.refresh_from_db()
+        return (categoria.qtd_produtos_ativos, categoria.qtd_produtos_em_estoque)
+
+    def test_criacao_e_estoque_cruzando_zero(self):
+        """Criação soma; estoque chegando a zero tira de 'em estoque'"""
+        self.assertEqual(self._contadores(self.categoria), (1, 1))
+        self.produto.estoque = 0
+        self.produto.save()
+        self.assertEqual(self._contadores(self.categoria), (1, 0))
+        self.produto.estoque = 5
+        self.produto.save()
+        self.assertEqual(self._contadores(self.categoria), (1, 1))
+
+    def test_desativar_trocar_categoria_e_excluir(self):
+        """Desativação, troca de categoria e exclusão"""
+        self.produto.ativo = False
+        self.produto.save()
+        self.assertEqual(self._contadores(self.categoria), (0, 0))
+
+        self.produto.ativo = True
+        self.produto.categoria = self.outra
+        self.produto.save()
+        self.assertEqual(self._contadores(self.categoria), (0, 0))
+        self.assertEqual(self._contadores(self.outra), (1, 1))
+
+        self.produto.delete()
+        self.assertEqual(self._contadores(self.outra), (0, 0))
+
+    def test_save_de_instancia_antiga_preserva_contadores(self):
+        """Editar a categoria carregada antes de um novo produto não desfaz a contagem"""
+        antiga = Categoria.objects.get(pk=self.outra.pk)
+        Produto.objects.create(categoria=self.outra, nome='Xadrez', descricao='x', preco=50.00, estoque=1)
+        antiga.nome = 'Jogos de tabuleiro'
+        antiga.save()
+        self.assertEqual(self._contadores(self.outra), (1, 1))
+        self.assertEqual(self.outra.nome, 'Jogos de tabuleiro')
+
+    def test_recalcular_contadores(self):
+        """Recalcula após update() em massa, que não dispara signals"""
+        Produto.objects.filter(id=self.produto.id).update(estoque=0)
+        Categoria.objects.update(qtd_produtos_ativos=99)
+        self.assertEqual(recalcular_contadores(), 2)
+        self.assertEqual(self._contadores(self.categoria), (1, 0))
+        self.assertEqual(self._contadores(self.outra), (0, 0))
+
+
+@override_settings(BUSCA_LOG_EM_SEGUNDO_PLANO=False)
+class ModeloLeituraCatalogoTests(TestCase):
+    """Testes da tabela plana do catálogo (ProdutoCatalogo)"""
+
+    def setUp(self):
+        self.categoria = Categoria.objects.create(nome='Games', ativa=True)
+        self.produto = Produto.objects.create(
+            categoria=self.categoria, nome='Controle', descricao='Sem fio  ' + 'bateria longa ' * 30,
+            preco=200.00, preco_promocional=150.00, estoque=3, estoque_minimo=5
+        )
+
+    def test_linha_acompanha_escritas(self):
+        """Produto e categoria salvos regravam a linha; exclusão a remove"""
+        linha = ProdutoCatalogo.objects.get(id=self.produto.id)
+        self.assertEqual(
+            (linha.categoria_nome, linha.preco_efetivo, linha.desconto_pct, linha.situacao_estoque),
+            ('Games', 150, 25, 'baixo'),
+        )
+        self.assertLessEqual(len(linha.resumo), Produto.TAMANHO_RESUMO)
+        self.assertTrue(linha.resumo.startswith('Sem fio bateria'))
+
+        self.categoria.nome = 'Jogos'
+        self.categoria.save()
+        self.produto.estoque = 0
+        self.produto.save()
+        linha = ProdutoCatalogo.objects.get(id=self.produto.id)
+        self.assertEqual((linha.categoria_nome, linha.situacao_estoque), ('Jogos', 'esgotado'))
+
+        self.produto.delete()
+        self.assertFalse(ProdutoCatalogo.objects.exists())
+
+    def test_desconto_igual_ao_da_coluna_gerada(self):
+        """12,5% de desconto arredonda para 13 no Produto, no método e na tabela plana"""
+        produto = Produto.objects.create(
+            categoria=self.categoria, nome='Cabo', descricao='x', preco=8.00, preco_promocional=7.00
+        )
+        self.assertEqual(ProdutoCatalogo.objects.get(id=produto.id).desconto_pct, 13)
+        produto.refresh_from_db()
+        self.assertEqual((produto.desconto_pct, produto.porcentagem_desconto()), (13, 13))
+
+        produto.preco_promocional = 6  # save() de um produto existente relê as colunas geradas
+        produto.save()
+        self.assertEqual(ProdutoCatalogo.objects.get(id=produto.id).desconto_pct, 25)
+
+    def test_sincronizar_e_reconstruir(self):
+        """update() precisa de sincronizar; reconstruir refaz a tabela inteira"""
+        Produto.objects.filter(pk=self.produto.pk).update(em_destaque=True)
+        self.assertFalse(ProdutoCatalogo.objects.get(id=self.produto.id).em_destaque)
+        read_model.sincronizar([self.produto.id])
+        self.assertTrue(ProdutoCatalogo.objects.get(id=self.produto.id).em_destaque)
+
+        ProdutoCatalogo.objects.all().delete()
+        self.assertEqual(read_model.reconstruir(tamanho_lote=1), 1)
+        self.assertEqual(ProdutoCatalogo.objects.get(id=self.produto.id).nome, 'Controle')
+
+    def test_categoria_inativa_some_do_site_e_da_api(self):
+        """Site e API usam a mesma regra de visibilidade (ProdutoCatalogo.visiveis)"""
+        User.objects.create_user(username='v@example.com', email='v@example.com', password='x', tipo_cliente='pf')
+        self.client.login(username='v@example.com', password='x')
+        self.categoria.ativa = False
+        self.categoria.save()
+
+        self.assertNotContains(self.client.get(reverse('catalogo_produtos')), 'Controle')
+        dados = json.loads(b''.join(self.client.get(reverse('api_produtos')).streaming_content))
+        self.assertEqual(dados['resultados'], [])
+
+    def test_listagem_sem_joins(self):
+        """Catálogo lê só a tabela plana"""
+        User.objects.create_user(username='g@example.com', email='g@example.com', password='x', tipo_cliente='pf')
+        self.client.login(username='g@example.com', password='x')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('catalogo_produtos'), {'busca': 'controle'})
+        self.assertContains(response, 'Controle')
+        consultas = [q['sql'] for q in ctx.captured_queries if 'app_produtocatalogo' in q['sql']]
+        self.assertTrue(consultas)
+        self.assertFalse([sql for sql in consultas if 'JOIN' in sql])
+
+
+class DerivadosImagemTests(TestCase):
+    """Testes dos tamanhos redimensionados das fotos"""
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        configuracao = override_settings(MEDIA_ROOT=self.media)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        self.categoria = Categoria.objects.create(nome='Fotos', ativa=True)
+
+    def _upload(self, tamanho=(1200, 900), modo='RGB', formato='PNG'):
+        from PIL import Image
+        saida = io.BytesIO()
+        Image.new(modo, tamanho, (200, 30, 30, 128) if modo == 'RGBA' else (200, 30, 30)).save(saida, formato)
+        return SimpleUploadedFile(f'foto.{formato.lower()}', saida.getvalue())
+
+    def test_gera_tamanhos_em_webp_e_jpeg(self):
+        produto = Produto.objects.create(
+            categoria=self.categoria, nome='Com foto', descricao='x', preco=10, foto=self._upload(modo='RGBA'),
+        )
+        derivados = produto.foto_derivados
+        self.assertEqual((derivados['largura'], derivados['altura']), (1200, 900))
+        self.assertEqual(set(derivados['tamanhos']), set(images.TAMANHOS))
+        card = derivados['tamanhos']['card']
+        self.assertEqual((card['largura'], card['altura']), (400, 300))
+        # Nunca amplia
+        self.assertEqual(derivados['tamanhos']['zoom']['largura'], 1200)
+        for formato in images.FORMATOS:
+            self.assertTrue(produto.foto.storage.exists(card[formato]))
+
+        self.assertTrue(produto.fotos['card']['webp'].endswith('/card.webp'))
+        linha = ProdutoCatalogo.objects.get(id=produto.id)
+        self.assertEqual(linha.fotos['miniatura'], produto.fotos['miniatura'])
+
+        # Salvar sem trocar a foto não reprocessa; remover a foto limpa os derivados
+        produto.nome = 'Renomeado'
+        produto.save()
+        self.assertEqual(produto.foto_derivados, derivados)
+        produto.foto = None
+        produto.save()
+        self.assertEqual(produto.foto_derivados, {})
+
+    def test_sem_derivados_usa_original(self):
+        produto = Produto.objects.create(categoria=self.categoria, nome='Sem', descricao='x', preco=10)
+        self.assertFalse(produto.fotos)
+        Produto.objects.filter(id=produto.id).update(foto='produtos/antiga.jpg')
+        produto.refresh_from_db()
+        self.assertEqual(produto.fotos['detalhe']['jpeg'], produto.foto.url)
+        self.assertIsNone(produto.fotos['detalhe']['largura'])
+
+    def test_comando_processar_imagens(self):
+        from django.core.management import call_command
+        from .models import ImagemProduto
+
+        produto = Produto.objects.create(
+            categoria=self.categoria, nome='Com foto', descricao='x', preco=10, foto=self._upload(),
+        )
+        gerados = produto.foto_derivados
+        cliente = User.objects.create_user(username='avatar@example.com', password='x')
+        cliente.foto_perfil = self._upload(tamanho=(300, 200))
+        cliente.save()
+        Produto.objects.filter(id=produto.id).update(foto_derivados={})
+
+        saida = io.StringIO()
+        call_command('processar_imagens', processos=2, stdout=saida)
+        self.assertIn('2 processado(s), 0 já em dia', saida.getvalue())
+        produto.refresh_from_db()
+        cliente.refresh_from_db()
+        self.assertEqual(produto.foto_derivados, gerados)
+        self.assertEqual(ProdutoCatalogo.objects.get(id=produto.id).foto_derivados, gerados)
+        grande = cliente.foto_perfil_derivados['tamanhos']['grande']
+        self.assertEqual((grande['largura'], grande['altura']), (200, 200))
+
+        # Segunda execução: nada a fazer
+        saida = io.StringIO()
+        call_command('processar_imagens', processos=1, stdout=saida)
+        self.assertIn('0 processado(s), 2 já em dia', saida.getvalue())
+
+        # Mesmo arquivo na galeria: cada registro é conferido, não só o primeiro
+        imagem = ImagemProduto.objects.create(produto=produto, imagem=produto.foto.name, derivados={})
+        saida = io.StringIO()
+        call_command('processar_imagens', processos=1, stdout=saida)
+        self.assertIn('1 processado(s), 1 já em dia', saida.getvalue())
+        imagem.refresh_from_db()
+        self.assertEqual(imagem.derivados, gerados)
+
+    @override_settings(AVATAR_EM_SEGUNDO_PLANO=False)
+    def test_foto_perfil_normalizada_apos_commit(self):
+        from PIL import Image
+
+        saida = io.BytesIO()
+        exif = Image.Exif()
+        exif[0x0112] = 6  # girada 90°
+        exif[0x010F] = 'Camera'
+        Image.new('RGB', (2000, 1000), (10, 120, 200)).save(saida, 'JPEG', exif=exif)
+        cliente = User.objects.create_user(username='avatar@example.com', password='x')
+        self.assertEqual(cliente.obter_foto_perfil(), '/static/images/default_avatar.png')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            cliente.foto_perfil = SimpleUploadedFile('celular.jpg', saida.getvalue())
+            cliente.save()
+            enviada = cliente.foto_perfil.name
+            # Até o commit, o próprio arquivo enviado
+            self.assertEqual(cliente.obter_foto_perfil(), cliente.foto_perfil.url)
+
+        cliente.refresh_from_db()
+        self.assertNotEqual(cliente.foto_perfil.name, enviada)
+        self.assertFalse(cliente.foto_perfil.storage.exists(enviada))
+        with cliente.foto_perfil.open('rb') as arquivo, Image.open(arquivo) as normalizada:
+            self.assertEqual(normalizada.size, (512, 1024))  # orientada e reduzida
+            self.assertFalse(normalizada.getexif())
+
+        self.assertTrue(cliente.obter_foto_perfil('pequeno').endswith('/pequeno.jpg'))
+        self.assertTrue(cliente.obter_foto_perfil(100).endswith('/medio.jpg'))
+        self.assertTrue(cliente.obter_foto_perfil(1000).endswith('/grande.jpg'))
+
+    @override_settings(AVATAR_EM_SEGUNDO_PLANO=False)
+    def test_nova_foto_de_perfil_apaga_a_anterior(self):
+        cliente = User.objects.create_user(username='avatar@example.com', password='x')
+        for tamanho in ((300, 200), (400, 300), (400, 300), (500, 400)):
+            with self.captureOnCommitCallbacks(execute=True):
+                cliente.foto_perfil = self._upload(tamanho=tamanho)
+                cliente.save()
+            cliente.refresh_from_db()
+
+        arquivos = {
+            os.path.relpath(os.path.join(pasta, nome), self.media).replace(os.sep, '/')
+            for pasta, _, nomes in os.walk(self.media) for nome in nomes
+        }
+        esperado = {cliente.foto_perfil.name, *images.nomes_derivados(cliente.foto_perfil_derivados)}
+        self.assertEqual(arquivos, esperado)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            cliente.foto_perfil = None
+            cliente.save()
+        self.assertFalse([nome for _, _, nomes in os.walk(self.media) for nome in nomes])
+
+    def test_upload_repetido_grava_um_arquivo(self):
+        from .models import ImagemProduto
+        from .storage import eh_imutavel
+
+        conteudo = self._upload().read()
+        produto = Produto.objects.create(
+            categoria=self.categoria, nome='A', descricao='x', preco=10,
+            foto=SimpleUploadedFile('fornecedor.PNG', conteudo),
+        )
+        outro = Produto.objects.create(
+            categoria=self.categoria, nome='B', descricao='x', preco=10,
+            foto=SimpleUploadedFile('copia.png', conteudo),
+        )
+        galeria = ImagemProduto.objects.create(produto=outro, imagem=SimpleUploadedFile('g.png', conteudo))
+
+        self.assertRegex(produto.foto.name, r'^produtos/[0-9a-f]{2}/[0-9a-f]{64}\.png$')
+        self.assertEqual({produto.foto.name, outro.foto.name, galeria.imagem.name}, {produto.foto.name})
+        pasta = f'{self.media}/produtos/{produto.foto.name.split("/")[1]}'
+        self.assertEqual(len(os.listdir(pasta)), 1)
+        self.assertTrue(eh_imutavel(produto.foto.name))
+        self.assertTrue(eh_imutavel(produto.foto_derivados['tamanhos']['card']['webp']))
+        self.assertFalse(eh_imutavel('perfil/avatar.png'))
+
+    @override_settings(DEBUG=True)
+    def test_midia_imutavel_servida_com_cache_longo(self):
+        from .storage import servir_midia
+
+        produto = Produto.objects.create(
+            categoria=self.categoria, nome='A', descricao='x', preco=10, foto=self._upload(),
+        )
+        request = RequestFactory().get('/')
+        resposta = servir_midia(request, produto.foto.name, document_root=self.media)
+        self.assertEqual(resposta['Cache-Control'], 'public, max-age=31536000, immutable')
+
+    def test_card_usa_derivado(self):
+        cache.clear()
+        produto = Produto.objects.create(
+            categoria=self.categoria, nome='Com foto', descricao='x', preco=10, foto=self._upload(formato='JPEG'),
+        )
+        [html] = catalog_cache.renderizar_cards([ProdutoCatalogo.objects.get(id=produto.id)])
+        self.assertIn('card.webp 400w', html)
+        self.assertIn('width="400" height="300"', html)
+        self.assertIn('loading="lazy" decoding="async"', html)
+
+    def test_tag_imagem_responsiva(self):
+        from django.template import Context, Template
+
+        modelo = Template('{% load imagens %}{% imagem_responsiva origem alt="Foto" tamanho="detalhe" %}')
+        produto = Produto.objects.create(
+            categoria=self.categoria, nome='Pequena', descricao='x', preco=10, foto=self._upload(tamanho=(500, 250)),
+        )
+        html = modelo.render(Context({'origem': produto}))
+        # Larguras repetidas (detalhe e zoom não ampliam) aparecem uma vez só
+        self.assertIn('miniatura.jpg 150w', html)
+        self.assertIn('card.jpg 400w', html)
+        self.assertIn('detalhe.jpg 500w', html)
+        self.assertNotIn('zoom.jpg', html)
+        self.assertIn('width="500" height="250"', html)
+
+        # Sem derivados: original, sem dimensões; campo de imagem também é aceito
+        Produto.objects.filter(id=produto.id).update(foto_derivados={})
+        produto.refresh_from_db()
+        html = modelo.render(Context({'origem': produto.foto}))
+        self.assertIn(f'src="{produto.foto.url}"', html)
+        self.assertNotIn('width=', html)
+        self.assertEqual(modelo.render(Context({'origem': Produto(nome='x')})), '')
+
+
+class PaginacaoKeysetTests(TestCase):
+    """Testes da paginação por cursor"""
+
+    def setUp(self):
+        categoria = Categoria.objects.create(nome='Casa', ativa=True)
+        for i in range(7):
+            Produto.objects.create(
+                categoria=categoria, nome=f'Item {i}', descricao='x',
+                preco=10.00, estoque=1, em_destaque=(i % 3 == 0)
+            )
+        # Empates em criado_em são desempatados por id
+        Produto.objects.filter(nome__in=['Item 1', 'Item 2']).update(
+            criado_em=Produto.objects.get(nome='Item 4').criado_em
+        )
+
+    def test_percorre_todas_as_paginas_na_ordem(self):
+        """Concatenação das páginas reproduz a ordenação completa"""
+        esperado = list(Produto.objects.order_by(*ORDENACAO_CATALOGO))
+        paginador = PaginadorKeyset(Produto.objects.all(), ORDENACAO_CATALOGO, tamanho=3)
+
+        obtido, cursor = [], None
+        while True:
+            pagina = paginador.pagina(cursor)
+            obtido.extend(pagina)
+            if not pagina.tem_proxima:
+                break
+            cursor = pagina.proximo_cursor
+        self.assertEqual(obtido, esperado)
+
+    def test_ordenacao_por_preco_efetivo_e_desconto(self):
+        """Ordens de preço e desconto usam as colunas geradas e paginam por cursor"""
+        from .views import ORDENACOES
+
+        for i, produto in enumerate(Produto.objects.order_by('id')):
+            Produto.objects.filter(pk=produto.pk).update(
+                preco=100 - i * 10, preco_promocional=(50 - i * 5) if i % 2 else None
+            )
+
+        for ordem in ('menor_preco', 'maior_preco', 'maior_desconto'):
+            ordenacao = ORDENACOES[ordem][1]
+            paginador = PaginadorKeyset(Produto.objects.all(), ordenacao, tamanho=2)
+            obtido, cursor = [], None
+            while True:
+                pagina = paginador.pagina(cursor)
+                obtido.extend(pagina)
+                if not pagina.tem_proxima:
+                    break
+                cursor = pagina.proximo_cursor
+            self.assertEqual(obtido, list(Produto.objects.order_by(*ordenacao)), ordem)
+
+        precos = [p.preco_final() for p in Produto.objects.order_by(*ORDENACOES['menor_preco'][1])]
+        self.assertEqual(precos, sorted(precos))
+        self.assertEqual(Produto.objects.order_by(*ORDENACOES['maior_desconto'][1]).first().desconto_pct, 50)
+
+    def test_paginas_do_catalogo_usam_indice(self):
+        """Primeira página e páginas seguintes leem um índice parcial, sem ordenar em tabela temporária"""
+        from .views import ORDENACOES
+
+        if connection.vendor != 'sqlite':
+            self.skipTest('plano de execução do SQLite')
+        categoria_id = Categoria.objects.get().id
+        for ordenacao in [ORDENACAO_CATALOGO] + [o for _, o in ORDENACOES.values()]:
+            for produtos in (ProdutoCatalogo.visiveis(), ProdutoCatalogo.visiveis().filter(categoria_id=categoria_id)):
+                paginador = PaginadorKeyset(produtos, ordenacao, tamanho=2)
+                for queryset in (paginador.apos(), paginador.apos(paginador.pagina().proximo_cursor)):
+                    plano = queryset[:3].explain()
+                    self.assertIn('USING INDEX catalogo_', plano, (ordenacao, plano))
+                    self.assertNotIn('TEMP B-TREE', plano, (ordenacao, plano))
+
+    def test_cursor_invalido(self):
+        """Cursor adulterado ou de outra ordenação é rejeitado"""
+        paginador = PaginadorKeyset(Produto.objects.all(), ORDENACAO_CATALOGO, tamanho=3)
+        outro = PaginadorKeyset(Produto.objects.all(), ('id',), tamanho=3)
+        with self.assertRaises(CursorInvalido):
+            paginador.pagina('abc')
+        with self.assertRaises(CursorInvalido):
+            paginador.pagina(outro.pagina().proximo_cursor)
+
+
+class CacheCatalogoTests(TestCase):
+    """Testes do cache do catálogo versionado por geração"""
+
+    def setUp(self):
+        cache.clear()
+        search_cache.lru.limpar()
+        self.categoria = Categoria.objects.create(nome='Esportes', ativa=True)
+
+    def test_escritas_incrementam_geracao_apos_commit(self):
+        """Salvar ou excluir produto/categoria invalida o cache"""
+        geracao = catalog_cache.obter_geracao()
+        with self.captureOnCommitCallbacks(execute=True):
+            produto = Produto.objects.create(
+                categoria=self.categoria, nome='Bola', descricao='x', preco=50.00
+            )
+        self.assertGreater(catalog_cache.obter_geracao(), geracao)
+
+        geracao = catalog_cache.obter_geracao()
+        with self.captureOnCommitCallbacks(execute=True):
+            produto.delete()
+        self.assertGreater(catalog_cache.obter_geracao(), geracao)
+
+    def test_valor_recalculado_apos_invalidacao(self):
+        """Nova geração ignora os valores antigos"""
+        calcular = lambda: [c.nome for c in Categoria.objects.all()]
+        self.assertEqual(catalog_cache.obter_ou_calcular('nomes', calcular), ['Esportes'])
+
+        Categoria.objects.create(nome='Música', ativa=True)
+        self.assertEqual(catalog_cache.obter_ou_calcular('nomes', calcular), ['Esportes'])
+
+        catalog_cache.incrementar_geracao()
+        self.assertEqual(catalog_cache.obter_ou_calcular('nomes', calcular), ['Esportes', 'Música'])
+
+    @override_settings(CATALOGO_GERACAO_INTERVALO=0)
+    def test_geracao_compartilhada_entre_processos(self):
+        """Incremento feito por outro processo invalida o cache deste"""
+        calcular = lambda: [c.nome for c in Categoria.objects.all()]
+        self.assertEqual(catalog_cache.obter_ou_calcular('nomes', calcular), ['Esportes'])
+
+        # Geração não mora no cache local: sobrevive a ele ser limpo
+        geracao = catalog_cache.obter_geracao()
+        cache.clear()
+        self.assertEqual(catalog_cache.obter_geracao(), geracao)
+        self.assertEqual(catalog_cache.obter_ou_calcular('nomes', calcular), ['Esportes'])
+
+        # Escrita em outro worker: só a linha do banco muda neste processo
+        Categoria.objects.create(nome='Música', ativa=True)
+        EstadoCatalogo.objects.filter(pk=1).update(geracao=geracao + 1)
+        self.assertEqual(catalog_cache.obter_ou_calcular('nomes', calcular), ['Esportes', 'Música'])
+
+    def test_cards_em_cache_por_versao_do_produto(self):
+        """Card é reaproveitado até o produto ser salvo de novo"""
+        produto = Produto.objects.create(
+            categoria=self.categoria, nome='Raquete', descricao='x', preco=90.00, estoque=1
+        )
+        produto = Produto.objects.select_related('categoria').get(id=produto.id)
+        [html] = catalog_cache.renderizar_cards([produto])
+        self.assertIn('Raquete', html)
+        self.assertEqual(cache.get(catalog_cache.chave_card(produto)), str(html))
+
+        produto.nome = 'Raquete Pro'
+        self.assertEqual(catalog_cache.renderizar_cards([produto]), [html])
+
+        produto.save()
+        [html] = catalog_cache.renderizar_cards([produto])
+        self.assertIn('Raquete Pro', html)
+
+    def test_queryset_nao_pode_ser_guardado(self):
+        """Só valores avaliados vão para o cache"""
+        with self.assertRaises(TypeError):
+            catalog_cache.obter_ou_calcular('categorias', Categoria.objects.all)
+
 
 class ModelTests(TestCase):
     """Testes dos modelos"""
@@ -134,6 +695,21 @@ class ModelTests(TestCase):
         self.assertEqual(str(produto), f'Produto Teste - {categoria.nome}')
         self.assertTrue(produto.tem_estoque())
 
+    def test_produto_resumo(self):
+        """Resumo é texto puro, numa linha, limitado e atualizado no save()"""
+        categoria = Categoria.objects.create(nome='Teste', ativa=True)
+        produto = Produto.objects.create(
+            categoria=categoria, nome='Teste', preco=10.00,
+            descricao='<p>Tinta &amp; pincel</p>\n\n' + 'muito texto ' * 100,
+        )
+        self.assertTrue(produto.resumo.startswith('Tinta & pincel muito texto'))
+        self.assertLessEqual(len(produto.resumo), Produto.TAMANHO_RESUMO)
+
+        produto.descricao = 'Curta'
+        produto.save(update_fields=['descricao'])
+        produto.refresh_from_db()
+        self.assertEqual(produto.resumo, 'Curta')
+
     def test_produto_price_calculation(self):
         """Testa cálculo de preço com promoção"""
         categoria = Categoria.objects.create(nome='Teste', ativa=True)
@@ -149,6 +725,13 @@ class ModelTests(TestCase):
         self.assertEqual(produto.preco_final(), 80.00)
         self.assertEqual(produto.porcentagem_desconto(), 20)
 
+        # Colunas geradas seguem as mesmas regras, inclusive após update()
+        produto.refresh_from_db()
+        self.assertEqual((produto.preco_efetivo, produto.desconto_pct), (80, 20))
+        Produto.objects.filter(pk=produto.pk).update(preco_promocional=None)
+        produto.refresh_from_db()
+        self.assertEqual((produto.preco_efetivo, produto.desconto_pct), (100, 0))
+
     def test_user_creation(self):
         """Testa criação de usuário"""
         user = User.objects.create_user(
@@ -160,3 +743,687 @@ class ModelTests(TestCase):
         self.assertEqual(user.email, 'test@test.com')
         self.assertEqual(user.tipo_cliente, 'pf')
         self.assertTrue(user.check_password('password123'))
+
+
+@override_settings(CATALOGO_GERACAO_INTERVALO=0)
+class GetCondicionalTests(TestCase):
+    """Testes de ETag no catálogo e no detalhe"""
+
+    def setUp(self):
+        cache.clear()
+        search_cache.lru.limpar()
+        self.user = User.objects.create_user(
+            username='test@example.com', email='test@example.com',
+            password='testpass123', tipo_cliente='pf'
+        )
+        self.client.login(username='test@example.com', password='testpass123')
+        self.categoria = Categoria.objects.create(nome='Papelaria', ativa=True)
+        self.produto = Produto.objects.create(
+            categoria=self.categoria, nome='Caderno', descricao='x', preco=20.00, estoque=5
+        )
+
+    def _revalidar(self, url):
+        primeira = self.client.get(url)
+        self.assertEqual(primeira.status_code, 200)
+        self.assertTrue(primeira.has_header('ETag'))
+        return self.client.get(url, HTTP_IF_NONE_MATCH=primeira['ETag'])
+
+    def test_catalogo_responde_304_sem_alteracoes(self):
+        """Repetição com If-None-Match recebe 304"""
+        url = reverse('catalogo_produtos')
+        self.assertEqual(self._revalidar(url).status_code, 304)
+
+    def test_detalhe_responde_304_sem_alteracoes(self):
+        """Detalhe do produto também é revalidado"""
+        url = reverse('detalhe_produto', args=[self.produto.id])
+        self.assertEqual(self._revalidar(url).status_code, 304)
+
+    def test_alteracao_no_catalogo_invalida_etag(self):
+        """Escrita no catálogo gera nova ETag"""
+        url = reverse('catalogo_produtos')
+        etag = self.client.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.produto.estoque = 0
+            self.produto.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_produto_removido_nao_gera_304_por_data(self):
+        """Sem Last-Modified: If-Modified-Since não esconde um produto que saiu da página"""
+        url = reverse('catalogo_produtos')
+        primeira = self.client.get(url)
+        self.assertContains(primeira, 'Caderno')
+        self.assertFalse(primeira.has_header('Last-Modified'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.produto.ativo = False
+            self.produto.save()
+        resposta = self.client.get(url, HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT')
+        self.assertEqual(resposta.status_code, 200)
+        self.assertNotContains(resposta, 'Caderno')
+
+    def test_etag_compartilhada_entre_usuarios(self):
+        """Página não depende do usuário nem do carrinho: mesma ETag para todos"""
+        url = reverse('detalhe_produto', args=[self.produto.id])
+        etag = self.client.get(url)['ETag']
+        carrinho = Carrinho.objects.create(cliente=self.user)
+        ItemCarrinho.objects.create(
+            carrinho=carrinho, produto=self.produto, quantidade=1, preco_unitario=20.00
+        )
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        User.objects.create_user(username='outro@example.com', email='outro@example.com', password='x', tipo_cliente='pf')
+        outro = Client()
+        outro.login(username='outro@example.com', password='x')
+        self.assertEqual(outro.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+
+@override_settings(CATALOGO_GERACAO_INTERVALO=0)
+class PaginaCompartilhadaTests(TestCase):
+    """Testes do cache de página inteira e do fragmento por usuário"""
+
+    def setUp(self):
+        cache.clear()
+        search_cache.lru.limpar()
+        for email in ('a@example.com', 'b@example.com'):
+            User.objects.create_user(username=email, email=email, password='x', tipo_cliente='pf')
+        self.categoria = Categoria.objects.create(nome='Jardim', ativa=True)
+        self.produto = Produto.objects.create(
+            categoria=self.categoria, nome='Regador', descricao='x', preco=30.00, estoque=2
+        )
+
+    def _cliente(self, email):
+        cliente = Client()
+        cliente.login(username=email, password='x')
+        return cliente
+
+    def test_mesmo_html_para_todos_sem_dados_pessoais(self):
+        """Segundo usuário recebe o HTML do cache, sem consultar o catálogo"""
+        url = reverse('detalhe_produto', args=[self.produto.id])
+        primeira = self._cliente('a@example.com').get(url)
+        self.assertNotContains(primeira, 'a@example.com')
+
+        cliente_b = self._cliente('b@example.com')
+        with CaptureQueriesContext(connection) as ctx:
+            segunda = cliente_b.get(url)
+        self.assertEqual(segunda.content, primeira.content)
+        self.assertFalse([q for q in ctx.captured_queries if 'app_produto' in q['sql']])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.produto.nome = 'Regador Grande'
+            self.produto.save()
+        self.assertContains(cliente_b.get(url), 'Regador Grande')
+
+    def test_escrita_em_outro_processo_invalida_pagina(self):
+        """Página guardada deixa de ser servida quando outro worker incrementa a geração"""
+        url = reverse('detalhe_produto', args=[self.produto.id])
+        cliente = self._cliente('a@example.com')
+        self.assertContains(cliente.get(url), 'Regador')
+
+        # Outro worker: escreve sem passar pelos signals deste processo
+        Produto.objects.filter(id=self.produto.id).update(nome='Regador Grande')
+        self.assertNotContains(cliente.get(url), 'Regador Grande')
+        EstadoCatalogo.objects.filter(pk=1).update(geracao=catalog_cache.obter_geracao() + 1)
+        self.assertContains(cliente.get(url), 'Regador Grande')
+
+    def test_fragmento_usuario(self):
+        """Fragmento traz e-mail, carrinho, token CSRF e mensagens do próprio usuário"""
+        cliente = self._cliente('a@example.com')
+        cliente.post(reverse('adicionar_carrinho', args=[self.produto.id]), {'quantidade': 1})
+
+        dados = cliente.get(reverse('fragmento_usuario')).json()
+        self.assertEqual(dados['email'], 'a@example.com')
+        self.assertEqual(dados['carrinho_total_itens'], 1)
+        self.assertTrue(dados['csrf_token'])
+        self.assertEqual(len(dados['mensagens']), 1)
+        self.assertEqual(cliente.get(reverse('fragmento_usuario')).json()['mensagens'], [])
+
+
+class ApiCatalogoTests(TestCase):
+    """Testes da API JSON do catálogo"""
+
+    def setUp(self):
+        cache.clear()
+        search_cache.lru.limpar()
+        self.categoria = Categoria.objects.create(nome='Brinquedos', ativa=True)
+        for i in range(5):
+            Produto.objects.create(
+                categoria=self.categoria, nome=f'Boneco {i}', descricao='Brinquedo de plástico',
+                preco=40.00, preco_promocional=30.00 if i == 0 else None, estoque=i
+            )
+        Produto.objects.create(
+            categoria=self.categoria, nome='Inativo', descricao='x', preco=1.00, ativo=False
+        )
+
+    def _get(self, **params):
+        response = self.client.get(reverse('api_produtos'), params)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(b''.join(response.streaming_content))
+
+    def test_sparse_fieldsets(self):
+        """Somente os campos pedidos são devolvidos"""
+        with self.settings(BUSCA_APROXIMADA_MINIMO_RESULTADOS=0):
+            dados = self._get(fields='nome,preco_final', busca='boneco 0')
+        self.assertEqual(dados['resultados'], [{'nome': 'Boneco 0', 'preco_final': '30.00'}])
+
+    def test_paginacao_por_cursor(self):
+        """Páginas encadeadas cobrem todos os produtos ativos uma única vez"""
+        ids, cursor = [], None
+        while True:
+            params = {'fields': 'id', 'limite': 2}
+            if cursor:
+                params['cursor'] = cursor
+            dados = self._get(**params)
+            ids.extend(p['id'] for p in dados['resultados'])
+            cursor = dados['proximo_cursor']
+            if not cursor:
+                break
+        esperado = list(Produto.objects.filter(ativo=True).order_by(*ORDENACAO_CATALOGO).values_list('id', flat=True))
+        self.assertEqual(ids, esperado)
+
+    def test_parametros_invalidos(self):
+        """Campos, limite e cursor inválidos retornam 400"""
+        url = reverse('api_produtos')
+        self.assertEqual(self.client.get(url, {'fields': 'senha'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'fields': 'descricao'}).status_code, 400)  # use 'resumo'
+        self.assertEqual(self.client.get(url, {'limite': 0}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'cursor': 'x'}).status_code, 400)
+
+    def test_categorias(self):
+        """Lista de categorias com contadores"""
+        dados = self.client.get(reverse('api_categorias')).json()
+        self.assertEqual(dados['resultados'][0]['total_produtos'], 5)
+
+
+class AutocompletarTests(TestCase):
+    """Testes do índice de prefixos do autocompletar"""
+
+    def setUp(self):
+        cache.clear()
+        search_cache.lru.limpar()
+        categoria = Categoria.objects.create(nome='Celulares', ativa=True)
+        self.comum = Produto.objects.create(
+            categoria=categoria, nome='Smartphone Básico', descricao='x', preco=900.00
+        )
+        self.destaque = Produto.objects.create(
+            categoria=categoria, nome='Smartphone Ômega', descricao='x', preco=2000.00, em_destaque=True
+        )
+        Produto.objects.create(
+            categoria=categoria, nome='Smartwatch', descricao='x', preco=500.00, ativo=False
+        )
+        self.indice = autocomplete.IndicePrefixos()
+        self.indice.construir()
+
+    def test_prefixo_ranqueado_por_destaque(self):
+        """Prefixo sem acento; destaque primeiro; inativos fora"""
+        nomes = [s['nome'] for s in self.indice.sugerir('SMART')]
+        self.assertEqual(nomes, ['Smartphone Ômega', 'Smartphone Básico'])
+
+    def test_todas_as_palavras_devem_casar(self):
+        """Cada palavra do termo é prefixo de alguma palavra do nome"""
+        self.assertEqual(self.indice.sugerir('smart bas'), [{'id': self.comum.id, 'nome': 'Smartphone Básico'}])
+        self.assertEqual(self.indice.sugerir('xyz'), [])
+
+    def test_atualizacao_incremental(self):
+        """Inclusão, desativação e exclusão refletem sem reconstruir"""
+        self.comum.nome = 'Tablet Básico'
+        self.indice.atualizar(self.comum)
+        self.assertEqual([s['id'] for s in self.indice.sugerir('tab')], [self.comum.id])
+
+        self.destaque.ativo = False
+        self.indice.atualizar(self.destaque)
+        self.assertEqual(self.indice.sugerir('omega'), [])
+
+        self.indice.remover(self.comum.id)
+        self.assertEqual(self.indice.sugerir('tab'), [])
+
+    def test_categoria_desativada_sai_das_sugestoes(self):
+        """Produtos de categoria inativa não são sugeridos, como no catálogo"""
+        autocomplete.indice.construir()
+        self.assertEqual(len(autocomplete.indice.sugerir('smart')), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.comum.categoria.ativa = False
+            self.comum.categoria.save()
+        self.assertEqual(autocomplete.indice.sugerir('smart'), [])
+
+        self.indice.construir()
+        self.assertEqual(self.indice.sugerir('smart'), [])
+        self.indice.atualizar(self.destaque)
+        self.assertEqual(self.indice.sugerir('omega'), [])
+
+    def test_prefixo_comum_usa_lista_pre_calculada(self):
+        """Prefixos com mais produtos que TOPO_POR_PREFIXO guardam os melhores; escritas os descartam"""
+        topo_original = autocomplete.TOPO_POR_PREFIXO
+        autocomplete.TOPO_POR_PREFIXO = 1
+        self.addCleanup(setattr, autocomplete, 'TOPO_POR_PREFIXO', topo_original)
+        self.indice.construir()
+        self.assertEqual(self.indice._topo['smart'], [self.destaque.id])
+
+        self.assertEqual([s['id'] for s in self.indice.sugerir('smart', limite=1)], [self.destaque.id])
+        self.assertEqual([s['id'] for s in self.indice.sugerir('smart', limite=2)], [self.destaque.id, self.comum.id])
+        self.assertEqual([s['id'] for s in self.indice.sugerir('smart bas', limite=1)], [self.comum.id])
+
+        self.destaque.em_destaque = False
+        self.indice.atualizar(self.destaque)
+        self.assertNotIn('smart', self.indice._topo)
+        self.assertEqual([s['id'] for s in self.indice.sugerir('smart', limite=1)], [self.comum.id])
+        self.assertEqual(self.indice._topo['smart'], [self.comum.id])
+
+    def test_endpoint(self):
+        """Endpoint devolve nome e URL"""
+        autocomplete.indice.construir()
+        dados = self.client.get(reverse('api_autocompletar'), {'q': 'ome'}).json()
+        self.assertEqual(dados['resultados'][0]['url'], reverse('detalhe_produto', args=[self.destaque.id]))
+
+
+class FacetasTests(TestCase):
+    """Testes das facetas do catálogo"""
+
+    def setUp(self):
+        categoria = Categoria.objects.create(nome='Ferramentas', ativa=True)
+        criar = lambda **kw: Produto.objects.create(categoria=categoria, descricao='x', **kw)
+        criar(nome='Martelo', preco=40.00, estoque=3, forma_pagamento='vista')
+        criar(nome='Furadeira', preco=300.00, preco_promocional=90.00, estoque=0, forma_pagamento='parcelado')
+        criar(nome='Serra', preco=120.00, estoque=1, em_destaque=True, forma_pagamento='ambos')
+        self.produtos = Produto.objects.filter(ativo=True)
+
+    def test_contagens_numa_unica_query(self):
+        """Todas as opções contadas com uma query; preço usa o preço final"""
+        with self.assertNumQueries(1):
+            contagens = facets.contar_facetas(self.produtos, {})
+        self.assertEqual(contagens['preco'], {
+            '0-50': 1, '50-100': 1, '100-250': 1, '250-500': 0, '500-1000': 0, '1000+': 0,
+        })
+        self.assertEqual(contagens['pagamento'], {'vista': 2, 'parcelado': 2})
+        self.assertEqual(contagens['estoque']['1'], 2)
+        self.assertEqual(contagens['promocao']['1'], 1)
+        self.assertEqual(contagens['destaque']['1'], 1)
+
+    def test_faceta_selecionada_nao_zera_as_irmas(self):
+        """Cada faceta é contada com as demais aplicadas, menos ela mesma"""
+        selecionadas = facets.facetas_selecionadas({'estoque': '1', 'preco': '0-50', 'pagamento': 'xx'})
+        self.assertEqual(selecionadas, {'preco': '0-50', 'estoque': '1'})
+
+        contagens = facets.contar_facetas(self.produtos, selecionadas)
+        self.assertEqual(contagens['preco']['100-250'], 1)  # Serra, em estoque
+        self.assertEqual(contagens['preco']['50-100'], 0)   # Furadeira sem estoque
+        self.assertEqual(contagens['estoque']['1'], 1)      # só o Martelo custa até 50
+        self.assertEqual(
+            [p.nome for p in facets.aplicar_facetas(self.produtos, selecionadas)], ['Martelo']
+        )
+
+
+class BuscaTextualTests(TestCase):
+    """Testes do índice de busca textual"""
+
+    def setUp(self):
+        self.categoria = Categoria.objects.create(nome='Eletrônicos', ativa=True)
+        self.celular = Produto.objects.create(
+            categoria=self.categoria,
+            nome='Celular Básico',
+            descricao='Aparelho com câmera e bateria de longa duração',
+            preco=500.00,
+            estoque=3,
+        )
+        self.fone = Produto.objects.create(
+            categoria=self.categoria,
+            nome='Fone de Ouvido',
+            descricao='Som estéreo',
+            preco=80.00,
+            estoque=10,
+        )
+
+    def _buscar(self, termo):
+        return set(filtrar_busca(Produto.objects.all(), termo))
+
+    def test_normalizar_texto(self):
+        """Remove acentos, caixa e espaços repetidos"""
+        self.assertEqual(normalizar_texto('  Câmera   DIGITAL '), 'camera digital')
+
+    def test_radical_plural_e_feminino(self):
+        """Plural e gênero caem no mesmo radical"""
+        self.assertEqual(radical('eletronicos'), radical('eletronica'))
+        self.assertEqual(radical('celulares'), radical('celular'))
+
+    def test_busca_sem_acento_e_no_plural(self):
+        """Busca ignora acentos e flexões"""
+        self.assertEqual(self._buscar('cameras'), {self.celular})
+        self.assertEqual(self._buscar('CELULAR basico'), {self.celular})
+
+    def test_indice_acompanha_escritas(self):
+        """Alterações e exclusões refletem no índice"""
+        self.fone.nome = 'Headset Gamer'
+        self.fone.save()
+        self.assertEqual(self._buscar('headset'), {self.fone})
+        self.assertEqual(self._buscar('fone'), set())
+
+        self.fone.delete()
+        self.assertEqual(self._buscar('headset'), set())
+
+    def test_indice_trigramas_tolera_erros(self):
+        """Nomes com letras trocadas ou faltando ainda casam"""
+        indice = trigrams.IndiceTrigramas()
+        self.assertEqual(indice.buscar('celuar', 0.4, 10), [self.celular.id])
+        self.assertEqual(indice.buscar('fonne ouvdo', 0.4, 10), [self.fone.id])
+        self.assertEqual(indice.buscar('geladeira', 0.4, 10), [])
+
+    def test_busca_aproximada_so_com_poucos_resultados(self):
+        """Fallback por trigramas entra apenas quando a busca exata é fraca"""
+        trigrams.indice.construir()
+        produtos, aproximada = filtrar_busca_tolerante(Produto.objects.all(), 'celuar')
+        self.assertTrue(aproximada)
+        self.assertEqual(set(produtos), {self.celular})
+
+        with self.settings(BUSCA_APROXIMADA_MINIMO_RESULTADOS=1):
+            produtos, aproximada = filtrar_busca_tolerante(Produto.objects.all(), 'celular')
+        self.assertFalse(aproximada)
+        self.assertEqual(set(produtos), {self.celular})
+
+    def test_relevancia_nome_pesa_mais_que_descricao(self):
+        """Acerto no nome vence acerto na descrição, mesmo sem estoque"""
+        bateria = Produto.objects.create(
+            categoria=self.categoria, nome='Bateria Extra', descricao='Reposição', preco=90.00, estoque=0
+        )
+        produtos = ordenar_por_relevancia(filtrar_busca(Produto.objects.all(), 'bateria'), 'bateria')
+        paginador = PaginadorKeyset(produtos, ORDENACAO_BUSCA, tamanho=1)
+
+        primeira = paginador.pagina()
+        self.assertEqual(primeira.itens, [bateria])
+        segunda = paginador.pagina(primeira.proximo_cursor)
+        self.assertEqual(segunda.itens, [self.celular])
+        self.assertFalse(segunda.tem_proxima)
+
+    def test_bonus_estoque_desempata(self):
+        """Com a mesma nota textual, o produto em estoque vem primeiro"""
+        sem_estoque = Produto.objects.create(
+            categoria=self.categoria, nome='Fone de Ouvido', descricao='Som estéreo', preco=80.00, estoque=0
+        )
+        produtos = ordenar_por_relevancia(filtrar_busca(Produto.objects.all(), 'fone'), 'fone')
+        self.assertEqual(list(produtos.order_by(*ORDENACAO_BUSCA)), [self.fone, sem_estoque])
+
+    def test_relevancia_limitada_aos_melhores_candidatos(self):
+        """Só os BUSCA_RELEVANCIA_CANDIDATOS melhores recebem nota; os demais vêm depois, com zero"""
+        bateria = Produto.objects.create(
+            categoria=self.categoria, nome='Bateria Extra', descricao='Reposição', preco=90.00, estoque=0
+        )
+        with self.settings(BUSCA_RELEVANCIA_CANDIDATOS=1):
+            produtos = ordenar_por_relevancia(filtrar_busca(Produto.objects.all(), 'bateria'), 'bateria')
+            notas = dict(produtos.values_list('id', 'relevancia'))
+        self.assertGreater(notas[bateria.id], 0)
+        self.assertEqual(notas[self.celular.id], 0)
+
+    def test_reconstruir_indice(self):
+        """Reconstrução completa reindexa todos os produtos"""
+        self.assertEqual(reconstruir_indice(tamanho_lote=1), 2)
+        self.assertEqual(self._buscar('estereo'), {self.fone})
+
+
+@override_settings(BUSCA_APROXIMADA_MINIMO_RESULTADOS=0, BUSCA_LOG_EM_SEGUNDO_PLANO=False, CATALOGO_GERACAO_INTERVALO=60)
+class BuscaCacheTests(TestCase):
+    """Testes do cache de resultados da busca e do histórico de buscas"""
+
+    def setUp(self):
+        cache.clear()
+        search_cache.lru.limpar()
+        self.categoria = Categoria.objects.create(nome='Eletrônicos', ativa=True)
+        self.celular = Produto.objects.create(
+            categoria=self.categoria, nome='Celular Básico', descricao='Aparelho simples', preco=500, estoque=3,
+        )
+
+    def test_termos_equivalentes_usam_a_mesma_entrada(self):
+        ids, aproximada = search_cache.resultado('  CELULAR   basico ')
+        self.assertEqual((ids, aproximada), ([self.celular.id], False))
+        with self.assertNumQueries(0):
+            self.assertEqual(search_cache.resultado('Celular Básico')[0], [self.celular.id])
+        # Categoria faz parte da chave
+        outra = Categoria.objects.create(nome='Outra', ativa=True)
+        self.assertEqual(search_cache.resultado('celular basico', outra.id)[0], [])
+
+    def test_invalidado_pela_geracao(self):
+        self.assertEqual(search_cache.resultado('celular')[0], [self.celular.id])
+        with self.captureOnCommitCallbacks(execute=True):
+            novo = Produto.objects.create(categoria=self.categoria, nome='Celular Pro', descricao='x', preco=900)
+        self.assertEqual(sorted(search_cache.resultado('celular')[0]), [self.celular.id, novo.id])
+
+    def test_lru_descarta_o_menos_usado(self):
+        lru = search_cache.CacheLRU(2)
+        lru.guardar('a', 1)
+        lru.guardar('b', 2)
+        lru.obter('a')
+        lru.guardar('c', 3)
+        self.assertEqual((lru.obter('a'), lru.obter('b'), lru.obter('c')), (1, None, 3))
+
+    def test_lru_limitado_pelos_ids_guardados(self):
+        lru = search_cache.CacheLRU(10, peso=search_cache._peso)
+        lru.guardar('pequena', ([1, 2], False))
+        lru.guardar('grande', (list(range(6)), False))
+        self.assertEqual(lru.total, 10)
+        lru.guardar('outra', ([3], False))  # passa do limite: sai a mais antiga
+        self.assertEqual((lru.obter('pequena'), lru.total), (None, 9))
+        lru.guardar('enorme', (list(range(20)), False))  # maior que o limite: não entra
+        self.assertIsNone(lru.obter('enorme'))
+
+    def test_reindexar_invalida_resultados(self):
+        from django.core.management import call_command
+
+        self.assertEqual(search_cache.resultado('celular')[0], [self.celular.id])
+        with self.assertNumQueries(0):
+            search_cache.resultado('celular')
+        call_command('reindexar_busca', stdout=io.StringIO())
+        with CaptureQueriesContext(connection) as ctx:
+            search_cache.resultado('celular')
+        self.assertTrue(ctx.captured_queries)
+
+    @override_settings(BUSCA_CACHE_MAXIMO_IDS=0)
+    def test_resultado_grande_nao_e_guardado(self):
+        self.assertEqual(search_cache.resultado('celular'), (None, False))
+        produtos, _ = search_cache.filtrar(ProdutoCatalogo.objects.all(), 'celular')
+        self.assertEqual([p.id for p in produtos], [self.celular.id])
+
+    def test_historico_e_aquecimento(self):
+        from django.core.management import CommandError, call_command
+        from .models import BuscaRegistrada
+
+        User.objects.create_user(username='busca@example.com', email='busca@example.com', password='x')
+        self.client.login(username='busca@example.com', password='x')
+        for termo in ('Celular', ' celular ', 'fone'):
+            self.client.get(reverse('catalogo_produtos'), {'busca': termo})
+        self.client.get(reverse('catalogo_produtos'), {'busca': 'celular', 'cursor': 'x'})  # paginação não conta
+        self.assertEqual(BuscaRegistrada.objects.filter(termo='celular').count(), 2)
+        search_log.consolidar()
+        self.assertEqual(search_cache.consultas_populares(1, dias=1), [('celular', None, 2)])
+
+        # Memória local: aquecer não serviria a nenhum outro processo
+        with self.assertRaises(CommandError):
+            call_command('aquecer_busca', limite=10, stdout=io.StringIO())
+
+        pasta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, pasta, ignore_errors=True)
+        compartilhado = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': pasta}}
+        with self.settings(CACHES=compartilhado):
+            search_cache.lru.limpar()
+            saida = io.StringIO()
+            call_command('aquecer_busca', limite=10, stdout=saida)
+            self.assertIn('2 busca(s) calculada(s)', saida.getvalue())
+            with self.assertNumQueries(0):
+                search_cache.resultado('celular')
+
+
+@override_settings(BUSCA_APROXIMADA_MINIMO_RESULTADOS=0, BUSCA_LOG_EM_SEGUNDO_PLANO=False, BUSCA_LENTA_MS=10000)
+class AnaliseBuscasTests(TestCase):
+    """Testes do registro das buscas, da consolidação diária e do relatório"""
+
+    def setUp(self):
+        cache.clear()
+        search_cache.lru.limpar()
+        categoria = Categoria.objects.create(nome='Eletrônicos', ativa=True)
+        Produto.objects.create(categoria=categoria, nome='Celular Básico', descricao='x', preco=500, estoque=3)
+        User.objects.create_user(username='analise@example.com', email='analise@example.com', password='x')
+        self.client.login(username='analise@example.com', password='x')
+
+    def buscar(self, termo, **params):
+        return self.client.get(reverse('catalogo_produtos'), {'busca': termo, **params})
+
+    def test_registra_termo_filtros_e_resultados(self):
+        from .models import BuscaRegistrada
+
+        self.assertEqual(self.buscar(' Celular ', ordem='preco')[search_log.CABECALHO_RESULTADOS], '1')
+        self.buscar(' Celular ', ordem='preco')  # servida do cache de página: conta, com o mesmo total
+        self.buscar('geladeira')
+        self.client.get(reverse('catalogo_produtos'))  # sem busca: não conta
+
+        registradas = list(BuscaRegistrada.objects.order_by('id').values_list('termo', 'filtros', 'resultados'))
+        self.assertEqual(registradas, [
+            ('celular', {'ordem': 'preco'}, 1), ('celular', {'ordem': 'preco'}, 1), ('geladeira', {}, 0),
+        ])
+
+    def test_consolidacao_nao_conta_duas_vezes(self):
+        from .models import BuscaDiaria, BuscaRegistrada
+
+        self.buscar('celular')
+        self.buscar('geladeira')
+        self.assertEqual(search_log.consolidar(), 2)
+        self.buscar('celular')
+        self.assertEqual(search_log.consolidar(), 1)
+        self.assertEqual(search_log.consolidar(), 0)
+
+        celular = BuscaDiaria.objects.get(termo='celular')
+        self.assertEqual((celular.buscas, celular.sem_resultado, celular.resultados), (2, 0, 1))
+        self.assertEqual(search_log.sem_resultado(dias=1)[0]['termo'], 'geladeira')
+        self.assertEqual([linha['termo'] for linha in search_log.mais_buscadas(dias=1)], ['celular', 'geladeira'])
+
+        # Buscas antigas já consolidadas são apagadas; o resumo diário fica
+        BuscaRegistrada.objects.update(criado_em=timezone.now() - timedelta(days=31))
+        search_log.consolidar()
+        self.assertFalse(BuscaRegistrada.objects.exists())
+        self.assertEqual(BuscaDiaria.objects.get(termo='celular').buscas, 2)
+
+    @override_settings(BUSCA_LOG_EM_SEGUNDO_PLANO=True, BUSCA_LOG_MAXIMO=2)
+    def test_escritor_grava_em_lote(self):
+        from .models import BuscaRegistrada
+
+        escritor = search_log.EscritorBuscas()
+        escritor._thread = object()  # sem thread de fundo: o teste descarrega à mão
+        with self.assertNumQueries(0):
+            for termo in ('a', 'b', 'c'):
+                escritor.registrar(BuscaRegistrada(termo=termo))
+        self.assertEqual(escritor.descartadas, 1)
+        self.assertEqual(escritor.descarregar(), 2)
+        self.assertEqual(sorted(BuscaRegistrada.objects.values_list('termo', flat=True)), ['b', 'c'])
+
+    def test_relatorio(self):
+        from django.core.management import call_command
+
+        self.buscar('geladeira')
+        saida = io.StringIO()
+        call_command('relatorio_buscas', dias=1, stdout=saida)
+        self.assertIn('geladeira', saida.getvalue())
+        self.assertIn('Sem resultado', saida.getvalue())
+
+
+class ProdutosSimilaresTests(TestCase):
+    """Testes dos produtos similares pré-calculados (TF-IDF)"""
+
+    def setUp(self):
+        self.categoria = Categoria.objects.create(nome='Diversos', ativa=True)
+        criar = lambda nome, descricao: Produto.objects.create(
+            categoria=self.categoria, nome=nome, descricao=descricao, preco=10.00, estoque=1
+        )
+        self.tenis = criar('Tênis de corrida', 'Tênis leve para corrida de rua')
+        self.tenis_trilha = criar('Tênis de trilha', 'Tênis para corrida em trilha')
+        self.panela = criar('Panela de pressão', 'Panela de aço inox')
+        self.frigideira = criar('Frigideira', 'Frigideira antiaderente, par da panela')
+
+    def _similares(self, produto):
+        return [p.id for p in similarity.produtos_similares(produto, limite=10)]
+
+    def test_calculo_completo(self):
+        """Vizinhos por cosseno, sem o próprio produto e sem pares sem termos em comum"""
+        self.assertEqual(similarity.calcular_similares(), 4)
+        self.assertEqual(self._similares(self.tenis), [self.tenis_trilha.id])
+        self.assertEqual(self._similares(self.panela), [self.frigideira.id])
+        self.assertEqual(similarity.calcular_similares(), 0)
+
+    def test_incremental_atualiza_listas_dos_nao_alterados(self):
+        """Só o produto alterado é recalculado, mas os vizinhos dele são corrigidos"""
+        similarity.calcular_similares()
+        self.frigideira.nome = 'Tênis infantil'
+        self.frigideira.descricao = 'Tênis para corrida'
+        self.frigideira.save()
+
+        self.assertEqual(similarity.calcular_similares(), 1)
+        self.assertEqual(self._similares(self.panela), [])
+        self.assertIn(self.frigideira.id, self._similares(self.tenis))
+        self.assertEqual(set(self._similares(self.frigideira)), {self.tenis.id, self.tenis_trilha.id})
+
+    def test_detalhe_usa_similares_com_fallback(self):
+        """Sem cálculo, relacionados vêm da categoria; depois, dos similares"""
+        User.objects.create_user(username='s@example.com', email='s@example.com', password='x', tipo_cliente='pf')
+        self.client.login(username='s@example.com', password='x')
+        url = reverse('detalhe_produto', args=[self.panela.id])
+
+        self.assertEqual(len(self.client.get(url).context['produtos_relacionados']), 3)
+        similarity.calcular_similares()
+        cache.clear()
+        self.assertEqual(
+            [p.id for p in self.client.get(url).context['produtos_relacionados']], [self.frigideira.id]
+        )
+
+
+class CompradosJuntosTests(TestCase):
+    """Testes das recomendações por coocorrência nos pedidos pagos"""
+
+    def setUp(self):
+        categoria = Categoria.objects.create(nome='Papelaria', ativa=True)
+        criar = lambda nome: Produto.objects.create(
+            categoria=categoria, nome=nome, descricao='x', preco=5.00, estoque=10
+        )
+        self.caneta, self.caderno, self.borracha, self.mochila = (
+            criar('Caneta'), criar('Caderno'), criar('Borracha'), criar('Mochila')
+        )
+
+    def _pedido(self, *produtos, pago=True, dias=2):
+        from orders.models import Order, OrderItem
+
+        pedido = Order.objects.create(
+            first_name='A', last_name='B', email='a@b.com', address='Rua', postal_code='1', city='C', paid=pago
+        )
+        Order.objects.filter(pk=pedido.pk).update(created=timezone.now() - timedelta(days=dias))
+        for produto in produtos:
+            OrderItem.objects.create(order=pedido, product=produto, price=produto.preco)
+        return pedido
+
+    def _recomendados(self, produto):
+        return [p.id for p in recommendations.produtos_comprados_juntos(produto, limite=10)]
+
+    def test_jaccard_sobre_pedidos_pagos(self):
+        """Só pedidos pagos contam; pares abaixo do mínimo ficam de fora"""
+        self._pedido(self.caneta, self.caderno)
+        self._pedido(self.caneta, self.caderno, self.borracha)
+        self._pedido(self.caneta, self.borracha, pago=False)
+        self._pedido(self.caneta)
+
+        self.assertEqual(recommendations.calcular_comprados_juntos(minimo_pedidos=1), 3)
+        self.assertEqual(self._recomendados(self.caderno), [self.caneta.id, self.borracha.id])
+        melhor = self.caderno.comprados_juntos.first()
+        self.assertAlmostEqual(melhor.pontuacao, 2 / 3)  # 2 pedidos juntos / 3 com qualquer um
+
+        recommendations.calcular_comprados_juntos(completo=True, minimo_pedidos=2)
+        self.assertEqual(self._recomendados(self.borracha), [])
+
+    def test_incremental_pela_marca_dagua(self):
+        """Pedidos já processados não são somados de novo; recentes esperam o atraso"""
+        self._pedido(self.caneta, self.mochila, dias=3)
+        self.assertEqual(recommendations.calcular_comprados_juntos(minimo_pedidos=1), 1)
+
+        self._pedido(self.caneta, self.mochila, dias=0)
+        self.assertEqual(recommendations.calcular_comprados_juntos(minimo_pedidos=1), 0)
+        self.assertEqual(
+            recommendations.calcular_comprados_juntos(minimo_pedidos=1, atraso=timedelta(0)), 1
+        )
+        par = self.mochila.comprados_juntos.get()
+        self.assertEqual((par.recomendado_id, par.pedidos, par.pontuacao), (self.caneta.id, 2, 1.0))
+
+        self.assertEqual(
+            [p.id for p in recommendations.recomendacoes_carrinho([self.mochila.id])], [self.caneta.id]
+        )
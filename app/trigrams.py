@@ -0,0 +1,144 @@
+"""
+Índice invertido de trigramas em memória para busca tolerante a erros de
+digitação (usado quando o banco não tem ``pg_trgm``).
+
+Os trigramas seguem a regra do ``pg_trgm``: cada palavra normalizada recebe
+dois espaços antes e um depois, e a similaridade entre duas palavras é
+``|A ∩ B| / |A ∪ B|``. Como em ``word_similarity``, cada palavra da busca é
+comparada com a palavra mais parecida do nome do produto, e a nota do
+produto é a média dessas similaridades.
+
+Mesma política de atualização de ``app.autocomplete``: construído na
+primeira consulta, incremental pelos signals deste processo e reconstruído
+quando envelhece e a geração do catálogo mudou.
+"""
+
+import threading
+import time
+from collections import Counter, defaultdict
+
+from . import catalog_cache
+from .search import normalizar_texto
+
+IDADE_MAXIMA = 300  # segundos
+
+
+def trigramas(palavra):
+    """Conjunto de trigramas de uma palavra já normalizada, no formato do pg_trgm"""
+    palavra = f'  {palavra} '
+    return frozenset(palavra[i:i + 3] for i in range(len(palavra) - 2))
+
+
+def similaridade(a, b):
+    """Similaridade entre dois conjuntos de trigramas"""
+    if not a or not b:
+        return 0.0
+    comuns = len(a & b)
+    return comuns / (len(a) + len(b) - comuns)
+
+
+class IndiceTrigramas:
+    """trigrama -> palavras, palavra -> ids de produtos ativos"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = defaultdict(set)
+        self._palavras = {}  # palavra -> (trigramas, ids de produtos)
+        self._produtos = {}  # id -> palavras do nome
+        self._construido_em = None
+        self._geracao = None
+
+    def construir(self):
+        """Reconstrói o índice a partir dos produtos ativos"""
+        from .models import Produto
+
+        geracao = catalog_cache.obter_geracao()
+        novo = IndiceTrigramas()
+        for produto_id, nome in Produto.objects.filter(ativo=True).values_list('id', 'nome').iterator():
+            novo._incluir_sem_lock(produto_id, nome)
+
+        with self._lock:
+            self._postings = novo._postings
+            self._palavras = novo._palavras
+            self._produtos = novo._produtos
+            self._construido_em = time.monotonic()
+            self._geracao = geracao
+
+    def _incluir_sem_lock(self, produto_id, nome):
+        palavras = frozenset(normalizar_texto(nome).split())
+        self._produtos[produto_id] = palavras
+        for palavra in palavras:
+            if palavra not in self._palavras:
+                grams = trigramas(palavra)
+                self._palavras[palavra] = (grams, set())
+                for gram in grams:
+                    self._postings[gram].add(palavra)
+            self._palavras[palavra][1].add(produto_id)
+
+    def _remover_sem_lock(self, produto_id):
+        for palavra in self._produtos.pop(produto_id, ()):
+            grams, ids = self._palavras[palavra]
+            ids.discard(produto_id)
+            if ids:
+                continue
+            del self._palavras[palavra]
+            for gram in grams:
+                palavras = self._postings[gram]
+                palavras.discard(palavra)
+                if not palavras:
+                    del self._postings[gram]
+
+    def atualizar(self, produto):
+        """Reflete um produto salvo (inclui, altera ou remove se inativo)"""
+        with self._lock:
+            if self._construido_em is None:
+                return
+            self._remover_sem_lock(produto.id)
+            if produto.ativo:
+                self._incluir_sem_lock(produto.id, produto.nome)
+
+    def remover(self, produto_id):
+        """Retira um produto excluído"""
+        with self._lock:
+            self._remover_sem_lock(produto_id)
+
+    def _garantir_atualizado(self):
+        construido_em = self._construido_em
+        if construido_em is None:
+            self.construir()
+        elif time.monotonic() - construido_em > IDADE_MAXIMA and catalog_cache.obter_geracao() != self._geracao:
+            self.construir()
+
+    def buscar(self, termo, limiar, limite):
+        """
+        Ids dos produtos com nota >= ``limiar``, do mais para o menos parecido.
+        """
+        consulta = normalizar_texto(termo).split()
+        if not consulta:
+            return []
+        self._garantir_atualizado()
+
+        melhores = defaultdict(lambda: [0.0] * len(consulta))
+        with self._lock:
+            for posicao, palavra_busca in enumerate(consulta):
+                grams_busca = trigramas(palavra_busca)
+                comuns = Counter()
+                for gram in grams_busca:
+                    comuns.update(self._postings.get(gram, ()))
+                for palavra, quantidade in comuns.items():
+                    grams, ids = self._palavras[palavra]
+                    nota = quantidade / (len(grams_busca) + len(grams) - quantidade)
+                    for produto_id in ids:
+                        if nota > melhores[produto_id][posicao]:
+                            melhores[produto_id][posicao] = nota
+
+        pontuados = []
+        for produto_id, notas in melhores.items():
+            media = sum(notas) / len(notas)
+            if media >= limiar:
+                pontuados.append((media, -produto_id))
+        pontuados.sort(reverse=True)
+        return [-produto_id for _, produto_id in pontuados[:limite]]
+
+
+indice = IndiceTrigramas()
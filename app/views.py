@@ -1,3 +1,4 @@
+import hashlib
 import logging
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import authenticate, login, logout
@@ -6,12 +7,19 @@ from django.contrib.auth.hashers import make_password
 from django.contrib import messages
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.db.models import Q, Prefetch, Count
-from django.core.cache import cache
-from django.views.decorators.http import require_http_methods
-from django.http import Http404
+from django.views.decorators.cache import never_cache
+from django.views.decorators.http import require_http_methods, require_GET, condition
+from django.middleware.csrf import get_token
+from django.http import Http404, JsonResponse
 
-from .models import Cliente, PessoaFisica, PessoaJuridica, Categoria, Produto, Carrinho, ItemCarrinho
+from .models import Cliente, PessoaFisica, PessoaJuridica, Categoria, Produto, ProdutoCatalogo, Carrinho, ItemCarrinho
 from .forms import LoginForm, PessoaFisicaForm, PessoaJuridicaForm, EnderecoForm
+from .pagination import PaginadorKeyset, CursorInvalido
+from .search import normalizar_texto, ordenar_por_relevancia
+from .recommendations import produtos_comprados_juntos, recomendacoes_carrinho
+from .similarity import produtos_similares
+from . import catalog_cache, facets, search_cache
+from .search_log import CABECALHO_RESULTADOS, registrar_buscas
 
 logger = logging.getLogger(__name__)
 
@@ -296,7 +304,61 @@ def _cadastro_pessoa_juridica(request):
 # PRODUTOS E CATÁLOGO
 # ==========================
 
+ORDENACAO_CATALOGO = ('-em_destaque', '-criado_em', 'id')
+ORDENACAO_BUSCA = ('-relevancia', 'id')
+
+# ?ordem= -> (rótulo, ordenação); colunas copiadas para ProdutoCatalogo, com índices parciais
+ORDENACOES = {
+    'menor_preco': ('Menor preço', ('preco_efetivo', 'id')),
+    'maior_preco': ('Maior preço', ('-preco_efetivo', '-id')),
+    'maior_desconto': ('Maior desconto', ('-desconto_pct', '-id')),
+}
+
+
+def _opcoes_ordenacao(request, ordem, busca):
+    """Links de ordenação para o template (a padrão remove ``ordem`` da URL)"""
+    opcoes = [('', 'Relevância' if busca else 'Destaques')]
+    opcoes += [(valor, rotulo) for valor, (rotulo, _) in ORDENACOES.items()]
+    resultado = []
+    for valor, rotulo in opcoes:
+        query = request.GET.copy()
+        query.pop('cursor', None)
+        query.pop('ordem', None)
+        if valor:
+            query['ordem'] = valor
+        resultado.append({
+            'rotulo': rotulo,
+            'selecionada': valor == ordem,
+            'url': f'?{query.urlencode()}',
+        })
+    return resultado
+
+
+def _etag_pagina(*partes):
+    """
+    ETag de uma página do catálogo, a mesma para todos os usuários.
+    
+    Combina a geração do catálogo (muda a cada escrita, inclusive exclusões)
+    e o que identifica a página. As partes pessoais vêm de ``fragmento_usuario``.
+    Não há Last-Modified: o max(atualizado_em) das linhas exibidas não muda
+    quando um produto sai da página, o que daria um 304 errado.
+    """
+    dados = (catalog_cache.obter_geracao(),) + partes
+    return hashlib.md5(repr(dados).encode('utf-8')).hexdigest()
+
+
+def _etag_catalogo(request):
+    return _etag_pagina(request.GET.urlencode())
+
+
+def _etag_detalhe(request, produto_id):
+    return _etag_pagina(produto_id)
+
+
 @login_required(login_url='login_usuario')
+@registrar_buscas
+@condition(etag_func=_etag_catalogo)
+@catalog_cache.pagina_compartilhada
 def catalogo_produtos(request):
     """
     View do catálogo de produtos com filtros e busca.
@@ -304,81 +366,131 @@ def catalogo_produtos(request):
     Filtros:
         - categoria (ID)
         - busca (texto)
+        - facetas: preco, pagamento, estoque, promocao, destaque
+        - ordem: menor_preco, maior_preco, maior_desconto
+        - cursor (paginação)
     
-    Usa cache e otimização de queries.
+    Usa cache e otimização de queries. Responde 304 a GETs condicionais
+    (ETag) antes de qualquer consulta pesada, e a página
+    inteira fica em cache compartilhado entre os usuários.
     """
     categoria_id = request.GET.get('categoria')
     busca = request.GET.get('busca', '').strip()
     
-    # Cache de categorias
-    cache_key = 'categorias_ativas'
-    categorias = cache.get(cache_key)
-    if not categorias:
-        categorias = Categoria.objects.filter(ativa=True).prefetch_related('produtos').order_by('ordem', 'nome')
-        cache.set(cache_key, categorias, 3600)  # Cache por 1 hora
+    # Categorias (cache do catálogo; contadores já armazenados)
+    categorias = catalog_cache.obter_ou_calcular(
+        'categorias',
+        lambda: list(Categoria.objects.filter(ativa=True).order_by('ordem', 'nome')),
+    )
     
-    # Query de produtos com otimização
-    produtos = Produto.objects.filter(ativo=True).select_related('categoria')
+    # Produtos visíveis (mesma regra da API), lidos da tabela plana do catálogo (sem joins)
+    produtos = ProdutoCatalogo.visiveis()
     
     categoria_selecionada = None
     if categoria_id:
-        try:
-            categoria_selecionada = Categoria.objects.get(id=categoria_id, ativa=True)
-            produtos = produtos.filter(categoria=categoria_selecionada)
-        except Categoria.DoesNotExist:
+        categoria_selecionada = next((c for c in categorias if str(c.id) == categoria_id), None)
+        if categoria_selecionada is None:
             raise Http404("Categoria não encontrada.")
+        produtos = produtos.filter(categoria_id=categoria_selecionada.id)
     
-    # Busca
+    # Busca (índice textual, com busca aproximada se houver poucos resultados);
+    # os ids encontrados ficam em cache por termo normalizado e categoria
+    busca_aproximada = False
     if busca:
-        produtos = produtos.filter(
-            Q(nome__icontains=busca) | 
-            Q(descricao__icontains=busca)
-        )
-    
-    # Ordenação
-    produtos = produtos.order_by('-em_destaque', '-criado_em')
-    
-    # Estatísticas
-    total_produtos = produtos.count()
-    produtos_em_estoque = produtos.filter(estoque__gt=0).count()
-    produtos_destaque = produtos.filter(em_destaque=True).count()
-    
-    # Enriquecer categorias
-    for cat in categorias:
-        cat.total_ativos = cat.produtos.filter(ativo=True).count()
-        cat.em_estoque = cat.produtos.filter(ativo=True, estoque__gt=0).count()
+        categoria_busca = categoria_selecionada.id if categoria_selecionada else None
+        produtos, busca_aproximada = search_cache.filtrar(produtos, busca, categoria_busca)
+    
+    # Facetas (todas as contagens numa única query, em cache por filtro)
+    selecionadas = facets.facetas_selecionadas(request.GET)
+    chave_filtro = (categoria_id, normalizar_texto(busca), sorted(selecionadas.items()))
+    base_facetas = produtos
+    contagens_facetas = catalog_cache.obter_ou_calcular(
+        'facetas',
+        lambda: facets.contar_facetas(base_facetas, selecionadas),
+        *chave_filtro,
+    )
+    produtos = facets.aplicar_facetas(produtos, selecionadas)
+    
+    # Estatísticas (uma única query com agregação condicional, em cache por filtro)
+    estatisticas = catalog_cache.obter_ou_calcular(
+        'estatisticas',
+        lambda: produtos.aggregate(
+            total=Count('id'),
+            em_estoque=Count('id', filter=Q(estoque__gt=0)),
+            destaque=Count('id', filter=Q(em_destaque=True)),
+        ),
+        *chave_filtro,
+    )
+    
+    # Paginação por cursor: ordem escolhida, relevância quando há busca ou a padrão
+    ordem = request.GET.get('ordem', '')
+    if ordem not in ORDENACOES:
+        ordem = ''
+    if ordem:
+        paginador = PaginadorKeyset(produtos, ORDENACOES[ordem][1])
+    elif busca:
+        paginador = PaginadorKeyset(ordenar_por_relevancia(produtos, busca), ORDENACAO_BUSCA)
+    else:
+        paginador = PaginadorKeyset(produtos, ORDENACAO_CATALOGO)
+    try:
+        pagina = paginador.pagina(request.GET.get('cursor'))
+    except CursorInvalido:
+        pagina = paginador.pagina()
+    
+    params = request.GET.copy()
+    params.pop('cursor', None)
+    primeira_pagina_url = f"?{params.urlencode()}"
+    proxima_pagina_url = None
+    if pagina.tem_proxima:
+        params['cursor'] = pagina.proximo_cursor
+        proxima_pagina_url = f"?{params.urlencode()}"
     
     context = {
         'categorias': categorias,
-        'produtos': produtos,
+        'produtos': pagina,
+        'cards': catalog_cache.renderizar_cards(pagina.itens),
+        'primeira_pagina_url': primeira_pagina_url if request.GET.get('cursor') else None,
+        'proxima_pagina_url': proxima_pagina_url,
         'categoria_selecionada': categoria_selecionada,
         'busca': busca,
-        'total_produtos': total_produtos,
-        'produtos_em_estoque': produtos_em_estoque,
-        'produtos_destaque': produtos_destaque,
+        'busca_aproximada': busca_aproximada,
+        'ordenacoes': _opcoes_ordenacao(request, ordem, busca),
+        'facetas': facets.montar_facetas(contagens_facetas, selecionadas, request.GET),
+        'total_produtos': estatisticas['total'],
+        'produtos_em_estoque': estatisticas['em_estoque'],
+        'produtos_destaque': estatisticas['destaque'],
     }
     
-    return render(request, 'catalogo_produtos.html', context)
+    resposta = render(request, 'catalogo_produtos.html', context)
+    resposta[CABECALHO_RESULTADOS] = str(estatisticas['total'])  # lido por registrar_buscas
+    return resposta
 
 
 @login_required(login_url='login_usuario')
+@condition(etag_func=_etag_detalhe)
+@catalog_cache.pagina_compartilhada
 def detalhe_produto(request, produto_id):
     """
     Exibe detalhes de um produto específico.
     
-    Mostra também produtos relacionados da mesma categoria.
+    Mostra também produtos relacionados: os similares pré-calculados
+    (``calcular_similares``) ou, se ainda não houver, os da mesma categoria.
+    A página inteira fica em cache compartilhado entre os usuários.
     """
     produto = get_object_or_404(Produto, id=produto_id, ativo=True)
     
     # Produtos relacionados
-    produtos_relacionados = Produto.objects.filter(
-        categoria=produto.categoria,
-        ativo=True
-    ).exclude(id=produto.id).order_by('-em_destaque', '-criado_em')[:4]
+    produtos_relacionados = produtos_similares(produto, limite=4)
+    if not produtos_relacionados:
+        produtos_relacionados = Produto.objects.filter(
+            categoria=produto.categoria,
+            ativo=True
+        ).exclude(id=produto.id).only(*Produto.CAMPOS_LISTAGEM).order_by('-em_destaque', '-criado_em')[:4]
     
     context = {
         'produto': produto,
         'produtos_relacionados': produtos_relacionados,
+        'comprados_juntos': produtos_comprados_juntos(produto, limite=4),
     }
     
     return render(request, 'detalhe_produto.html', context)
@@ -524,15 +636,13 @@ def ver_carrinho(request):
     """Exibe o carrinho de compras do usuário"""
     try:
         carrinho = Carrinho.objects.get(cliente=request.user)
-        itens = carrinho.itens.select_related('produto').all()
+        itens = carrinho.itens.select_related('produto').defer('produto__descricao')
     except Carrinho.DoesNotExist:
         carrinho = None
         itens = []
     
-    # Obter categorias com contagem de produtos
-    categorias = Categoria.objects.filter(ativa=True).annotate(
-        total_produtos=Count('produtos')
-    ).order_by('nome')
+    # Obter categorias (contagem de produtos já armazenada na categoria)
+    categorias = Categoria.objects.filter(ativa=True).order_by('nome')
     
     context = {
         'carrinho': carrinho,
@@ -540,6 +650,7 @@ def ver_carrinho(request):
         'total_itens': sum(item.quantidade for item in itens),
         'total_preco': sum(item.subtotal() for item in itens),
         'categorias': categorias,
+        'recomendacoes': recomendacoes_carrinho(item.produto_id for item in itens),
     }
     
     return render(request, 'carrinho.html', context)
@@ -626,3 +737,24 @@ def carrinho_context(request):
         total_itens = 0
     
     return {'carrinho_total_itens': total_itens}
+
+
+@login_required(login_url='login_usuario')
+@never_cache
+@require_GET
+def fragmento_usuario(request):
+    """
+    Partes pessoais das páginas em cache compartilhado, em JSON.
+
+    O navegador preenche com isso o e-mail, o contador do carrinho, as
+    mensagens pendentes e o token CSRF dos formulários.
+    """
+    return JsonResponse({
+        'email': request.user.email,
+        'carrinho_total_itens': carrinho_context(request)['carrinho_total_itens'],
+        'csrf_token': get_token(request),
+        'mensagens': [
+            {'nivel': mensagem.tags, 'texto': str(mensagem)}
+            for mensagem in messages.get_messages(request)
+        ],
+    })
@@ -148,14 +148,57 @@ SESSION_EXPIRE_AT_BROWSER_CLOSE = True
 SESSION_COOKIE_SECURE = False  # True em produção com HTTPS
 SESSION_COOKIE_HTTPONLY = True
 
-# Cache (usando memória por padrão)
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'unique-snowflake',
-        'TIMEOUT': 3600,
+# Cache: Redis quando REDIS_URL estiver definida (obrigatório com vários
+# workers, senão cada processo tem o seu cache); memória local por padrão
+from decouple import config
+
+REDIS_URL = config('REDIS_URL', default='')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'TIMEOUT': 3600,
+        }
     }
-}
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'unique-snowflake',
+            'TIMEOUT': 3600,
+        }
+    }
+
+# Segundos entre releituras da geração do cache do catálogo em cada processo
+CATALOGO_GERACAO_INTERVALO = 1
+
+# Busca aproximada (trigramas) quando a busca exata encontra poucos produtos
+BUSCA_APROXIMADA_MINIMO_RESULTADOS = 3
+BUSCA_APROXIMADA_LIMIAR = 0.4  # similaridade mínima (0 a 1)
+BUSCA_APROXIMADA_LIMITE = 50
+
+# Ordenação da busca por relevância (BM25): peso de cada campo e bônus
+BUSCA_PESO_NOME = 10.0
+BUSCA_PESO_DESCRICAO = 1.0
+BUSCA_BONUS_ESTOQUE = 0.2  # +20% na nota de produtos em estoque
+BUSCA_BONUS_DESTAQUE = 0.1
+BUSCA_RELEVANCIA_CANDIDATOS = 1000  # produtos ranqueados pelo índice; os demais vêm depois
+
+# Cache dos resultados da busca (ids por termo normalizado e categoria)
+BUSCA_CACHE_IDS_MEMORIA = 200000  # ids somados no LRU em memória de cada processo (~8 MB)
+BUSCA_CACHE_MAXIMO_IDS = 5000  # buscas com mais resultados não são guardadas
+
+# Registro das buscas do catálogo (app.search_log)
+BUSCA_LOG_EM_SEGUNDO_PLANO = True  # False: grava cada busca na hora
+BUSCA_LOG_INTERVALO = 5  # segundos entre gravações em lote
+BUSCA_LOG_LOTE = 200  # grava antes do intervalo ao juntar este tanto
+BUSCA_LOG_MAXIMO = 10000  # buffer máximo; acima disso descarta as mais antigas
+BUSCA_LOG_RETENCAO_DIAS = 30  # buscas individuais mantidas após a consolidação
+BUSCA_LENTA_MS = 500
+
+# Fotos de perfil normalizadas numa thread de fundo (False: no próprio commit)
+AVATAR_EM_SEGUNDO_PLANO = True
 
 # Logging
 import logging.config
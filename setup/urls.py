@@ -18,7 +18,8 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
-from app import views
+from app import views, api
+from app.storage import servir_midia
 
 
 urlpatterns = [
@@ -36,6 +37,12 @@ urlpatterns = [
     # Produtos
     path('catalogo/', views.catalogo_produtos, name='catalogo_produtos'),
     path('produto/<int:produto_id>/', views.detalhe_produto, name='detalhe_produto'),
+    path('fragmento/usuario/', views.fragmento_usuario, name='fragmento_usuario'),
+    
+    # API do catálogo
+    path('api/produtos/', api.api_produtos, name='api_produtos'),
+    path('api/categorias/', api.api_categorias, name='api_categorias'),
+    path('api/autocompletar/', api.api_autocompletar, name='api_autocompletar'),
     
     # Carrinho
     path('carrinho/', views.ver_carrinho, name='ver_carrinho'),
@@ -53,4 +60,4 @@ urlpatterns = [
 
 # Servir arquivos de mídia durante desenvolvimento
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+    urlpatterns += static(settings.MEDIA_URL, view=servir_midia, document_root=settings.MEDIA_ROOT)
\ No newline at end of file